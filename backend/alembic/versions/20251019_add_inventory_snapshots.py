@@ -0,0 +1,33 @@
+"""Add daily inventory snapshots for point-in-time stock queries
+
+Revision ID: add_inventory_snapshots
+Revises: add_product_last_sold_at
+Create Date: 2025-10-19 15:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_inventory_snapshots'
+down_revision = 'add_product_last_sold_at'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'inventory_snapshots',
+        sa.Column('product_id', sa.Integer(), sa.ForeignKey('products.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('snapshot_date', sa.Date(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=True),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('taken_at', sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index('ix_inventory_snapshots_user_date', 'inventory_snapshots', ['user_id', 'snapshot_date'])
+    op.create_index('ix_stock_movements_user_created', 'stock_movements', ['user_id', 'created_at'])
+
+
+def downgrade():
+    op.drop_index('ix_stock_movements_user_created', table_name='stock_movements')
+    op.drop_index('ix_inventory_snapshots_user_date', table_name='inventory_snapshots')
+    op.drop_table('inventory_snapshots')
@@ -0,0 +1,38 @@
+"""Add stock-ledger reconciliation watermark and per-product ledger state
+
+Revision ID: add_ledger_reconciliation
+Revises: add_inventory_snapshots
+Create Date: 2025-10-19 16:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_ledger_reconciliation'
+down_revision = 'add_inventory_snapshots'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'ledger_watermarks',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('last_movement_id', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('discrepancies', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('checked_at', sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_table(
+        'product_ledger_states',
+        sa.Column('product_id', sa.Integer(), sa.ForeignKey('products.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=True),
+        sa.Column('last_movement_id', sa.Integer(), nullable=False),
+        sa.Column('last_quantity_after', sa.Integer(), nullable=False),
+    )
+    op.create_index('ix_product_ledger_states_user_id', 'product_ledger_states', ['user_id'])
+
+
+def downgrade():
+    op.drop_index('ix_product_ledger_states_user_id', table_name='product_ledger_states')
+    op.drop_table('product_ledger_states')
+    op.drop_table('ledger_watermarks')
@@ -0,0 +1,38 @@
+"""Store ABC/XYZ inventory classification per product
+
+Revision ID: add_product_classifications
+Revises: add_purchase_order_lines
+Create Date: 2025-10-19 13:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_product_classifications'
+down_revision = 'add_purchase_order_lines'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'product_classifications',
+        sa.Column('product_id', sa.Integer(), sa.ForeignKey('products.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=True),
+        sa.Column('abc_class', sa.String(length=1), nullable=False),
+        sa.Column('xyz_class', sa.String(length=1), nullable=False),
+        sa.Column('revenue', sa.Numeric(14, 2), nullable=False, server_default='0'),
+        sa.Column('revenue_share', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('cumulative_share', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('units_sold', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('demand_cv', sa.Float(), nullable=True),
+        sa.Column('computed_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index('ix_product_classifications_user_id', 'product_classifications', ['user_id'])
+    op.create_index('ix_product_classifications_user_classes', 'product_classifications', ['user_id', 'abc_class', 'xyz_class'])
+
+
+def downgrade():
+    op.drop_index('ix_product_classifications_user_classes', table_name='product_classifications')
+    op.drop_index('ix_product_classifications_user_id', table_name='product_classifications')
+    op.drop_table('product_classifications')
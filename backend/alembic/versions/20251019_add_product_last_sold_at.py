@@ -0,0 +1,35 @@
+"""Track each product's last sale date for the dead-stock report
+
+Revision ID: add_product_last_sold_at
+Revises: add_product_classifications
+Create Date: 2025-10-19 14:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_product_last_sold_at'
+down_revision = 'add_product_classifications'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('products', sa.Column('last_sold_at', sa.DateTime(timezone=True), nullable=True))
+    op.execute(
+        """
+        UPDATE products SET last_sold_at = (
+            SELECT MAX(ps.sale_date) FROM product_sales ps WHERE ps.product_id = products.id
+        )
+        """
+    )
+    op.create_index(
+        'ix_products_user_stock_value',
+        'products',
+        ['user_id', sa.text('(quantity * price) DESC'), sa.text('id DESC')],
+    )
+
+
+def downgrade():
+    op.drop_index('ix_products_user_stock_value', table_name='products')
+    op.drop_column('products', 'last_sold_at')
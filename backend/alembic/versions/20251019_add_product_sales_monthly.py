@@ -0,0 +1,32 @@
+"""Add monthly sales rollup for archived sales
+
+Revision ID: add_product_sales_monthly
+Revises: partition_sales_and_movements
+Create Date: 2025-10-19 18:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_product_sales_monthly'
+down_revision = 'partition_sales_and_movements'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'product_sales_monthly',
+        sa.Column('product_id', sa.Integer(), sa.ForeignKey('products.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('month', sa.Date(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=True),
+        sa.Column('sale_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('units_sold', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('revenue', sa.Numeric(14, 2), nullable=False, server_default='0'),
+    )
+    op.create_index('ix_product_sales_monthly_user_month', 'product_sales_monthly', ['user_id', 'month'])
+
+
+def downgrade():
+    op.drop_index('ix_product_sales_monthly_user_month', table_name='product_sales_monthly')
+    op.drop_table('product_sales_monthly')
@@ -0,0 +1,39 @@
+"""Add trigram search index on products
+
+Creates the pg_trgm and btree_gin extensions (the migration role needs CREATE on the
+database) and builds ix_products_search_trgm concurrently. Other databases search in
+process (app.search) and get no index.
+
+If the concurrent build fails it leaves an INVALID index behind; drop it and re-run.
+
+Revision ID: add_product_search_index
+Revises: add_query_indexes
+Create Date: 2025-10-19 20:00:00.000000
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'add_product_search_index'
+down_revision = 'add_query_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gin")
+    # CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_products_search_trgm ON products "
+            "USING gin (user_id, (name || ' ' || coalesce(sku, '') || ' ' || coalesce(description, '')) gin_trgm_ops)"
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_products_search_trgm")
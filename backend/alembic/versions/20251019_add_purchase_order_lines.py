@@ -0,0 +1,43 @@
+"""Add purchase order lines and supplier MOQ / pack size for consolidated reorders
+
+Revision ID: add_purchase_order_lines
+Revises: add_supplier_scorecards
+Create Date: 2025-10-19 11:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_purchase_order_lines'
+down_revision = 'add_supplier_scorecards'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('suppliers', sa.Column('min_order_quantity', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('suppliers', sa.Column('pack_size', sa.Integer(), nullable=False, server_default='1'))
+    op.alter_column('purchase_orders', 'product_id', existing_type=sa.Integer(), nullable=True)
+    op.create_table(
+        'purchase_order_lines',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('purchase_order_id', sa.Integer(), sa.ForeignKey('purchase_orders.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('product_id', sa.Integer(), sa.ForeignKey('products.id'), nullable=False),
+        sa.Column('quantity_ordered', sa.Integer(), nullable=False),
+        sa.Column('unit_price', sa.Integer(), nullable=True),
+    )
+    op.create_index('ix_purchase_order_lines_id', 'purchase_order_lines', ['id'])
+    op.create_index('ix_purchase_order_lines_purchase_order_id', 'purchase_order_lines', ['purchase_order_id'])
+    op.create_index('ix_purchase_order_lines_product_id', 'purchase_order_lines', ['product_id'])
+
+
+def downgrade():
+    op.drop_index('ix_purchase_order_lines_product_id', table_name='purchase_order_lines')
+    op.drop_index('ix_purchase_order_lines_purchase_order_id', table_name='purchase_order_lines')
+    op.drop_index('ix_purchase_order_lines_id', table_name='purchase_order_lines')
+    op.drop_table('purchase_order_lines')
+    # multi-line orders have no single product and cannot survive the NOT NULL constraint
+    op.execute('DELETE FROM purchase_orders WHERE product_id IS NULL')
+    op.alter_column('purchase_orders', 'product_id', existing_type=sa.Integer(), nullable=False)
+    op.drop_column('suppliers', 'pack_size')
+    op.drop_column('suppliers', 'min_order_quantity')
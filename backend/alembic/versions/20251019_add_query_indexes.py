@@ -0,0 +1,97 @@
+"""Add composite, partial, covering and BRIN indexes for the hot queries
+
+On Postgres every index is built with CREATE INDEX CONCURRENTLY so writes continue
+during the migration. Postgres cannot build an index concurrently on a partitioned
+table, so for product_sales / stock_movements (see partition_sales_and_movements) the
+parent index is created ON ONLY the parent (invalid until complete), each partition's
+index is built concurrently and attached, which makes the parent index valid.
+Partitions created later inherit the indexes automatically.
+
+If a concurrent build fails it leaves an INVALID index behind; drop it and re-run.
+
+Revision ID: add_query_indexes
+Revises: add_product_sales_monthly
+Create Date: 2025-10-19 19:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app import partitions
+
+# revision identifiers, used by Alembic.
+revision = 'add_query_indexes'
+down_revision = 'add_product_sales_monthly'
+branch_labels = None
+depends_on = None
+
+
+# name, table, columns, options (using / include / where)
+INDEXES = [
+    ('ix_products_user_low_stock', 'products', ['user_id', 'quantity', 'low_stock_threshold'], {'where': 'quantity <= low_stock_threshold OR quantity <= 0'}),
+    ('ix_purchase_orders_user_status_date', 'purchase_orders', ['user_id', 'status', 'order_date DESC'], {}),
+    ('ix_product_sales_product_user_date', 'product_sales', ['product_id', 'user_id', 'sale_date DESC'], {'include': ['id', 'quantity', 'sale_price']}),
+    ('ix_product_sales_user_date', 'product_sales', ['user_id', 'sale_date'], {'include': ['product_id', 'quantity', 'sale_price']}),
+    ('ix_product_sales_sale_date_brin', 'product_sales', ['sale_date'], {'using': 'brin'}),
+    ('ix_stock_movements_product_user_created', 'stock_movements', ['product_id', 'user_id', 'created_at DESC'], {}),
+    ('ix_stock_movements_created_brin', 'stock_movements', ['created_at'], {'using': 'brin'}),
+]
+
+
+def _index_body(table, columns, options):
+    sql = f"{table}"
+    if options.get('using'):
+        sql += f" USING {options['using']}"
+    sql += f" ({', '.join(columns)})"
+    if options.get('include'):
+        sql += f" INCLUDE ({', '.join(options['include'])})"
+    if options.get('where'):
+        sql += f" WHERE {options['where']}"
+    return sql
+
+
+def _partitions_of(bind, table):
+    stmt = sa.text("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = CAST(:table AS regclass) ORDER BY c.relname")
+    return bind.execute(stmt, {"table": table}).scalars().all()
+
+
+def _create_postgres(bind, name, table, columns, options):
+    if not partitions.is_partitioned(bind, table):
+        op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {_index_body(table, columns, options)}")
+        return
+    op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON ONLY {_index_body(table, columns, options)}")
+    for partition in _partitions_of(bind, table):
+        # e.g. ix_product_sales_user_date_y2025m10
+        child = f"{name}{partition[len(table):]}"
+        op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {child} ON {_index_body(partition, columns, options)}")
+        attached = bind.execute(
+            sa.text("SELECT 1 FROM pg_inherits WHERE inhrelid = CAST(:child AS regclass) AND inhparent = CAST(:name AS regclass)"),
+            {"child": child, "name": name},
+        ).first()
+        if attached is None:
+            op.execute(f"ALTER INDEX {name} ATTACH PARTITION {child}")
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        for name, table, columns, options in INDEXES:
+            kwargs = {'sqlite_where': sa.text(options['where'])} if options.get('where') else {}
+            op.create_index(name, table, [sa.text(c) for c in columns], **kwargs)
+        return
+    # CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        for name, table, columns, options in INDEXES:
+            _create_postgres(bind, name, table, columns, options)
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table)
+        return
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            # dropping a partitioned index also drops its partitions' indexes (not concurrently)
+            concurrently = '' if partitions.is_partitioned(bind, table) else 'CONCURRENTLY '
+            op.execute(f"DROP INDEX {concurrently}IF EXISTS {name}")
@@ -0,0 +1,37 @@
+"""Record purchase order receipt time and per-supplier lead-time statistics
+
+Revision ID: add_supplier_lead_times
+Revises: add_supplier_ratings
+Create Date: 2025-10-19 09:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_supplier_lead_times'
+down_revision = 'add_supplier_ratings'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('purchase_orders', sa.Column('received_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_table(
+        'supplier_lead_times',
+        sa.Column('supplier_id', sa.Integer(), sa.ForeignKey('suppliers.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=True),
+        sa.Column('order_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('mean_days', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('m2', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('p90_days', sa.Float(), nullable=True),
+        sa.Column('histogram', sa.JSON(), nullable=False, server_default='[]'),
+        sa.Column('last_received_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index('ix_supplier_lead_times_user_id', 'supplier_lead_times', ['user_id'])
+
+
+def downgrade():
+    op.drop_index('ix_supplier_lead_times_user_id', table_name='supplier_lead_times')
+    op.drop_table('supplier_lead_times')
+    op.drop_column('purchase_orders', 'received_at')
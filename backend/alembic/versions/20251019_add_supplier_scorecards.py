@@ -0,0 +1,46 @@
+"""Add precomputed supplier scorecards and backfill them from rated purchase orders
+
+Revision ID: add_supplier_scorecards
+Revises: add_supplier_lead_times
+Create Date: 2025-10-19 10:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_supplier_scorecards'
+down_revision = 'add_supplier_lead_times'
+branch_labels = None
+depends_on = None
+
+RATING_FIELDS = ('on_time_delivery', 'quality_score', 'cost_efficiency', 'overall_rating')
+
+
+def upgrade():
+    columns = [
+        sa.Column('supplier_id', sa.Integer(), sa.ForeignKey('suppliers.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=True),
+    ]
+    for field in RATING_FIELDS:
+        columns.append(sa.Column(f'{field}_sum', sa.Integer(), nullable=False, server_default='0'))
+        columns.append(sa.Column(f'{field}_count', sa.Integer(), nullable=False, server_default='0'))
+    columns.append(sa.Column('recent_overall_rating', sa.Float(), nullable=True))
+    columns.append(sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()))
+    op.create_table('supplier_scorecards', *columns)
+    op.create_index('ix_supplier_scorecards_user_id', 'supplier_scorecards', ['user_id'])
+
+    # one-time backfill from existing ratings; afterwards rows are maintained incrementally
+    targets = ', '.join(f'{f}_sum, {f}_count' for f in RATING_FIELDS)
+    aggregates = ', '.join(f'COALESCE(SUM({f}), 0), COUNT({f})' for f in RATING_FIELDS)
+    any_rated = ' OR '.join(f'{f} IS NOT NULL' for f in RATING_FIELDS)
+    op.execute(
+        f"INSERT INTO supplier_scorecards (supplier_id, user_id, {targets}, recent_overall_rating) "
+        f"SELECT supplier_id, MIN(user_id), {aggregates}, AVG(overall_rating) "
+        f"FROM purchase_orders WHERE supplier_id IS NOT NULL AND ({any_rated}) "
+        f"GROUP BY supplier_id"
+    )
+
+
+def downgrade():
+    op.drop_index('ix_supplier_scorecards_user_id', table_name='supplier_scorecards')
+    op.drop_table('supplier_scorecards')
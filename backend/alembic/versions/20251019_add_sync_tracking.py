@@ -0,0 +1,52 @@
+"""Add last_updated to suppliers / categories, delta-sync indexes and tombstones
+
+Existing suppliers and categories get the migration time as last_updated (a
+constant default on Postgres, so no table rewrite). The products index is built
+concurrently on Postgres.
+
+Revision ID: add_sync_tracking
+Revises: add_product_search_index
+Create Date: 2025-10-19 21:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_sync_tracking'
+down_revision = 'add_product_search_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('suppliers', 'product_categories'):
+        op.add_column(table, sa.Column('last_updated', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True))
+        op.create_index(f'ix_{table}_user_updated', table, ['user_id', 'last_updated', 'id'])
+    op.create_table(
+        'sync_tombstones',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=True),
+        sa.Column('entity', sa.String(length=32), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_index('ix_sync_tombstones_user_deleted', 'sync_tombstones', ['user_id', 'deleted_at', 'id'])
+    if op.get_bind().dialect.name != 'postgresql':
+        op.create_index('ix_products_user_updated', 'products', ['user_id', 'last_updated', 'id'])
+        return
+    # CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_products_user_updated ON products (user_id, last_updated, id)")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        op.drop_index('ix_products_user_updated', table_name='products')
+    else:
+        with op.get_context().autocommit_block():
+            op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_products_user_updated")
+    op.drop_index('ix_sync_tombstones_user_deleted', table_name='sync_tombstones')
+    op.drop_table('sync_tombstones')
+    for table in ('product_categories', 'suppliers'):
+        op.drop_index(f'ix_{table}_user_updated', table_name=table)
+        op.drop_column(table, 'last_updated')
@@ -0,0 +1,109 @@
+"""Partition product_sales and stock_movements by month (Postgres only)
+
+Each table is rebuilt as a range-partitioned table on its date column (sale_date,
+created_at) with one partition per month from the oldest row to a few months ahead,
+plus a DEFAULT partition. The primary key becomes (id, <date column>) as Postgres
+requires; ids keep coming from the existing sequence. Later partitions are created by
+app.partitions.ensure_partitions (run on startup).
+
+Revision ID: partition_sales_and_movements
+Revises: add_ledger_reconciliation
+Create Date: 2025-10-19 17:00:00.000000
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+from app import partitions
+
+# revision identifiers, used by Alembic.
+revision = 'partition_sales_and_movements'
+down_revision = 'add_ledger_reconciliation'
+branch_labels = None
+depends_on = None
+
+
+COLUMNS = {
+    'product_sales': """
+        id INTEGER NOT NULL DEFAULT nextval('product_sales_id_seq'),
+        product_id INTEGER NOT NULL REFERENCES products (id),
+        user_id INTEGER REFERENCES users (id),
+        quantity INTEGER NOT NULL,
+        sale_price NUMERIC(12, 2) NOT NULL,
+        sale_date TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+    """,
+    'stock_movements': """
+        id INTEGER NOT NULL DEFAULT nextval('stock_movements_id_seq'),
+        product_id INTEGER NOT NULL REFERENCES products (id),
+        user_id INTEGER REFERENCES users (id),
+        movement_type VARCHAR(50) NOT NULL,
+        quantity_change INTEGER NOT NULL,
+        quantity_before INTEGER NOT NULL,
+        quantity_after INTEGER NOT NULL,
+        reference_id INTEGER,
+        reference_type VARCHAR(50),
+        notes TEXT,
+        transaction_date TIMESTAMP WITH TIME ZONE,
+        created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+    """,
+}
+COLUMN_NAMES = {
+    'product_sales': ['id', 'product_id', 'user_id', 'quantity', 'sale_price', 'sale_date'],
+    'stock_movements': [
+        'id', 'product_id', 'user_id', 'movement_type', 'quantity_change', 'quantity_before',
+        'quantity_after', 'reference_id', 'reference_type', 'notes', 'transaction_date', 'created_at',
+    ],
+}
+INDEXES = {
+    'product_sales': [('ix_product_sales_id', ['id']), ('ix_product_sales_product_id', ['product_id']), ('ix_product_sales_user_id', ['user_id'])],
+    'stock_movements': [
+        ('ix_stock_movements_id', ['id']),
+        ('ix_stock_movements_product_id', ['product_id']),
+        ('ix_stock_movements_user_id', ['user_id']),
+        ('ix_stock_movements_user_created', ['user_id', 'created_at']),
+    ],
+}
+
+
+def _rebuild(table, partitioned):
+    """Copy `table` into a new (partitioned or plain) table of the same name and swap it in."""
+    key = partitions.PARTITIONED_TABLES[table]
+    old = f"{table}_old"
+    columns = ', '.join(COLUMN_NAMES[table])
+    op.execute(f"ALTER TABLE {table} RENAME TO {old}")
+    op.execute(f"ALTER TABLE {old} RENAME CONSTRAINT {table}_pkey TO {old}_pkey")
+    for name, _ in INDEXES[table]:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+    # keep the id sequence alive when the old table is dropped
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY NONE")
+
+    if partitioned:
+        op.execute(f"CREATE TABLE {table} ({COLUMNS[table]}, PRIMARY KEY (id, {key})) PARTITION BY RANGE ({key})")
+        op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+        bind = op.get_bind()
+        oldest = bind.execute(sa.text(f"SELECT min({key}) FROM {old}")).scalar()
+        partitions.ensure_partitions(bind, start=oldest.date() if oldest else date.today())
+        select_columns = columns.replace(key, f"COALESCE({key}, now())")
+    else:
+        op.execute(f"CREATE TABLE {table} ({COLUMNS[table]}, PRIMARY KEY (id))")
+        select_columns = columns
+    op.execute(f"INSERT INTO {table} ({columns}) SELECT {select_columns} FROM {old}")
+    op.execute(f"DROP TABLE {old}")
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+    for name, cols in INDEXES[table]:
+        op.create_index(name, table, cols)
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in partitions.PARTITIONED_TABLES:
+        _rebuild(table, partitioned=True)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in partitions.PARTITIONED_TABLES:
+        _rebuild(table, partitioned=False)
@@ -0,0 +1,33 @@
+"""Record when each product was created
+
+Stock as of a past time leaves out products created after it. Existing products are
+dated by their earliest stock movement still in the database (movements moved to
+the archive are not read); those without any keep a null created_at and are treated
+as always existing.
+
+Revision ID: add_product_created_at
+Revises: add_snapshot_movement_watermark
+Create Date: 2025-10-20 11:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_product_created_at'
+down_revision = 'add_snapshot_movement_watermark'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('products', sa.Column('created_at', sa.DateTime(timezone=True), nullable=True))
+    op.execute(
+        "UPDATE products SET created_at = ("
+        "SELECT min(m.created_at) FROM stock_movements m WHERE m.product_id = products.id)"
+    )
+    # set after the backfill, so existing rows are not all dated to the migration
+    op.alter_column('products', 'created_at', server_default=sa.func.now())
+
+
+def downgrade():
+    op.drop_column('products', 'created_at')
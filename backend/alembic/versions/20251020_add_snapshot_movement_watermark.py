@@ -0,0 +1,26 @@
+"""Record the highest included movement id on inventory snapshots
+
+Stock as of a time is rolled forward from a snapshot through the movements above
+this id instead of those created after taken_at. Existing snapshots keep a null
+watermark and are still rolled forward by timestamp.
+
+Revision ID: add_snapshot_movement_watermark
+Revises: add_sync_sequence
+Create Date: 2025-10-20 10:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_snapshot_movement_watermark'
+down_revision = 'add_sync_sequence'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('inventory_snapshots', sa.Column('last_movement_id', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('inventory_snapshots', 'last_movement_id')
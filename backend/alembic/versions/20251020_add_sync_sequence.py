@@ -0,0 +1,69 @@
+"""Track delta-sync changes with a per-tenant commit sequence
+
+Adds sync_seq to products, suppliers, product_categories and sync_tombstones, and the
+sync_counters table (one row per tenant). Existing rows all get sequence 1 and every
+tenant's counter starts there, so clients still holding a timestamp cursor get a 400
+from GET /sync and download everything again.
+
+The (user_id, last_updated, id) / (user_id, deleted_at, id) sync indexes are replaced
+by (user_id, sync_seq, id). Backfilling sync_seq rewrites every row of those tables.
+The products indexes are built and dropped concurrently on Postgres.
+
+Revision ID: add_sync_sequence
+Revises: add_sync_tracking
+Create Date: 2025-10-20 09:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_sync_sequence'
+down_revision = 'add_sync_tracking'
+branch_labels = None
+depends_on = None
+
+SMALL_TABLES = {
+    'suppliers': 'ix_suppliers_user_updated',
+    'product_categories': 'ix_product_categories_user_updated',
+    'sync_tombstones': 'ix_sync_tombstones_user_deleted',
+}
+
+
+def upgrade():
+    op.create_table(
+        'sync_counters',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('seq', sa.BigInteger(), nullable=False),
+    )
+    op.execute("INSERT INTO sync_counters (user_id, seq) SELECT id, 1 FROM users")
+    for table in ('products', *SMALL_TABLES):
+        op.add_column(table, sa.Column('sync_seq', sa.BigInteger(), nullable=True))
+        op.execute(f"UPDATE {table} SET sync_seq = 1")
+    for table, old_index in SMALL_TABLES.items():
+        op.create_index(f'ix_{table}_user_sync_seq', table, ['user_id', 'sync_seq', 'id'])
+        op.drop_index(old_index, table_name=table)
+    if op.get_bind().dialect.name != 'postgresql':
+        op.create_index('ix_products_user_sync_seq', 'products', ['user_id', 'sync_seq', 'id'])
+        op.drop_index('ix_products_user_updated', table_name='products')
+        return
+    # CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_products_user_sync_seq ON products (user_id, sync_seq, id)")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_products_user_updated")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        op.create_index('ix_products_user_updated', 'products', ['user_id', 'last_updated', 'id'])
+        op.drop_index('ix_products_user_sync_seq', table_name='products')
+    else:
+        with op.get_context().autocommit_block():
+            op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_products_user_updated ON products (user_id, last_updated, id)")
+            op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_products_user_sync_seq")
+    columns = {'suppliers': 'last_updated', 'product_categories': 'last_updated', 'sync_tombstones': 'deleted_at'}
+    for table, old_index in SMALL_TABLES.items():
+        op.create_index(old_index, table, ['user_id', columns[table], 'id'])
+        op.drop_index(f'ix_{table}_user_sync_seq', table_name=table)
+    for table in ('products', *SMALL_TABLES):
+        op.drop_column(table, 'sync_seq')
+    op.drop_table('sync_counters')
@@ -0,0 +1,329 @@
+"""Cold-storage archival of old sales and stock movements.
+
+Rows older than the archive horizon (ARCHIVE_HORIZON_DAYS, default two years) are moved
+out of product_sales / stock_movements into zstd-compressed Parquet files, one per
+tenant, table and month:
+
+    <ARCHIVE_DIR>/<table>/user_<id>/<YYYY-MM>.parquet
+
+Archived sales are also added to the product_sales_monthly rollup so their units and
+revenue stay queryable in SQL, and an inventory snapshot is taken first so stock
+levels after the horizon never need the archived movements. History reads call the
+read_* helpers below when a requested range reaches past the horizon.
+
+Archival needs the optional pyarrow package; without it archive() raises
+ArchiveUnavailable, and reads do too, but only if archived files exist.
+
+Run for every tenant with `python -m app.archive`.
+"""
+import asyncio
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, snapshots
+from .crud import UPSERT_CHUNK_SIZE, dialect_insert
+from .timeutil import as_utc
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency
+    pa = None
+
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'archive'))
+ARCHIVE_HORIZON_DAYS = int(os.getenv('ARCHIVE_HORIZON_DAYS', '730'))
+# Forecasts and classification read up to a year of sales from the hot table
+MIN_HORIZON_DAYS = 366
+# Rows moved per transaction; their ids are bound into the DELETE, so keep this well
+# under the 32767 bind parameters asyncpg accepts
+ARCHIVE_BATCH_SIZE = 10000
+# How far before a snapshot a movement above its watermark may have been created (the
+# writing transaction started earlier); archive files are searched that much further back
+WATERMARK_SLACK = timedelta(days=1)
+
+
+class ArchiveUnavailable(RuntimeError):
+    pass
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ArchiveUnavailable("Archived history needs the optional 'pyarrow' package (pip install pyarrow)")
+
+
+def _tables():
+    """table -> (model, date column, arrow schema)"""
+    utc = pa.timestamp('us', tz='UTC')
+    return {
+        'product_sales': (models.ProductSale, 'sale_date', pa.schema([
+            ('id', pa.int64()),
+            ('product_id', pa.int64()),
+            ('user_id', pa.int64()),
+            ('quantity', pa.int64()),
+            ('sale_price', pa.decimal128(12, 2)),
+            ('sale_date', utc),
+        ])),
+        'stock_movements': (models.StockMovement, 'created_at', pa.schema([
+            ('id', pa.int64()),
+            ('product_id', pa.int64()),
+            ('user_id', pa.int64()),
+            ('movement_type', pa.string()),
+            ('quantity_change', pa.int64()),
+            ('quantity_before', pa.int64()),
+            ('quantity_after', pa.int64()),
+            ('reference_id', pa.int64()),
+            ('reference_type', pa.string()),
+            ('notes', pa.string()),
+            ('transaction_date', utc),
+            ('created_at', utc),
+        ])),
+    }
+
+
+def horizon_cutoff(horizon_days: int = ARCHIVE_HORIZON_DAYS) -> datetime:
+    return datetime.now(timezone.utc) - timedelta(days=horizon_days)
+
+
+def _tenant_dir(table: str, user_id: int) -> str:
+    return os.path.join(ARCHIVE_DIR, table, f"user_{user_id}")
+
+
+def _month_files(table: str, user_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[str]:
+    """Archive files of a tenant whose month overlaps [start, end]."""
+    directory = _tenant_dir(table, user_id)
+    if not os.path.isdir(directory):
+        return []
+    first = f"{start:%Y-%m}" if start else None
+    last = f"{end:%Y-%m}" if end else None
+    files = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.parquet'):
+            continue
+        month = name[:-len('.parquet')]
+        if (first is None or month >= first) and (last is None or month <= last):
+            files.append(os.path.join(directory, name))
+    return files
+
+
+def _write_month(path: str, table: 'pa.Table') -> None:
+    """Append rows to a month file, skipping ids already archived (safe to re-run after a crash)."""
+    if os.path.exists(path):
+        existing = pq.read_table(path, schema=table.schema)
+        table = table.filter(pc.invert(pc.is_in(table['id'], value_set=existing['id'])))
+        table = pa.concat_tables([existing, table])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    pq.write_table(table, tmp, compression='zstd')
+    os.replace(tmp, path)
+
+
+async def _archive_table(db: AsyncSession, table_name: str, user_id: int, cutoff: datetime) -> int:
+    """Move the tenant's rows older than `cutoff` into the archive, batch by batch; returns how many moved."""
+    model, date_column, schema = _tables()[table_name]
+    key = getattr(model, date_column)
+    archived = 0
+    while True:
+        stmt = select(*[getattr(model, field.name) for field in schema]).where(
+            model.user_id == user_id, key < cutoff
+        ).order_by(model.id).limit(ARCHIVE_BATCH_SIZE)
+        result = await db.execute(stmt)
+        rows = [dict(row._mapping) for row in result.all()]
+        if not rows:
+            return archived
+        by_month = defaultdict(list)
+        for row in rows:
+            for field in ('sale_date', 'created_at', 'transaction_date'):
+                if field in row:
+                    row[field] = as_utc(row[field])
+            by_month[f"{row[date_column]:%Y-%m}"].append(row)
+        for month, month_rows in by_month.items():
+            path = os.path.join(_tenant_dir(table_name, user_id), f"{month}.parquet")
+            _write_month(path, pa.Table.from_pylist(month_rows, schema=schema))
+        # the files are written; now drop the rows (the date bound lets Postgres prune partitions)
+        await db.execute(delete(model).where(
+            model.id.in_([row['id'] for row in rows]), key < cutoff
+        ).execution_options(synchronize_session=False))
+        if table_name == 'product_sales':
+            await _add_to_monthly_rollup(db, user_id, rows)
+        await db.commit()
+        archived += len(rows)
+
+
+async def _add_to_monthly_rollup(db: AsyncSession, user_id: int, sales: List[dict]) -> None:
+    totals: Dict[tuple, list] = {}
+    for sale in sales:
+        month = date(sale['sale_date'].year, sale['sale_date'].month, 1)
+        entry = totals.setdefault((sale['product_id'], month), [0, 0, 0.0])
+        entry[0] += 1
+        entry[1] += sale['quantity']
+        entry[2] += float(sale['sale_price']) * sale['quantity']
+    rows = [
+        {"product_id": product_id, "month": month, "user_id": user_id, "sale_count": count, "units_sold": units, "revenue": round(revenue, 2)}
+        for (product_id, month), (count, units, revenue) in totals.items()
+    ]
+    rollup = models.ProductSalesMonthly
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        stmt = dialect_insert(db, rollup).values(rows[start:start + UPSERT_CHUNK_SIZE])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['product_id', 'month'],
+            set_={
+                "sale_count": rollup.sale_count + stmt.excluded.sale_count,
+                "units_sold": rollup.units_sold + stmt.excluded.units_sold,
+                "revenue": rollup.revenue + stmt.excluded.revenue,
+            },
+        )
+        await db.execute(stmt)
+
+
+async def archive(db: AsyncSession, user_id: int, horizon_days: int = ARCHIVE_HORIZON_DAYS) -> dict:
+    """Move the tenant's sales and movements older than `horizon_days` into the archive."""
+    _require_pyarrow()
+    if horizon_days < MIN_HORIZON_DAYS:
+        raise ValueError(f"Archive horizon must be at least {MIN_HORIZON_DAYS} days")
+    cutoff = horizon_cutoff(horizon_days)
+    # stock as of any time after the cutoff then resolves from snapshots and hot movements
+    await snapshots.take_snapshot(db, user_id)
+    sales = await _archive_table(db, 'product_sales', user_id, cutoff)
+    movements = await _archive_table(db, 'stock_movements', user_id, cutoff)
+    return {"cutoff": cutoff, "sales_archived": sales, "movements_archived": movements}
+
+
+def _read(table_name: str, user_id: int, product_id: Optional[int], start: Optional[datetime], end: Optional[datetime]) -> List[dict]:
+    files = _month_files(table_name, user_id, start, end)
+    if not files:
+        return []
+    _require_pyarrow()
+    _, date_column, schema = _tables()[table_name]
+    filters = []
+    if product_id is not None:
+        filters.append(('product_id', '=', product_id))
+    if start is not None:
+        filters.append((date_column, '>=', pa.scalar(as_utc(start), type=schema.field(date_column).type)))
+    if end is not None:
+        filters.append((date_column, '<=', pa.scalar(as_utc(end), type=schema.field(date_column).type)))
+    rows = []
+    for path in files:
+        rows.extend(pq.read_table(path, schema=schema, filters=filters or None).to_pylist())
+    return rows
+
+
+def read_sales(user_id: int, product_id: Optional[int] = None, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[dict]:
+    """Archived sales of a tenant (optionally one product) with sale_date in [start, end]."""
+    return _read('product_sales', user_id, product_id, start, end)
+
+
+def read_movements(user_id: int, product_id: Optional[int] = None, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[dict]:
+    """Archived stock movements of a tenant (optionally one product) with created_at in [start, end]."""
+    return _read('stock_movements', user_id, product_id, start, end)
+
+
+def reaches_archive(start: Optional[datetime]) -> bool:
+    """Whether a history range starting at `start` (None = all history) may include archived rows."""
+    return start is None or as_utc(start) < horizon_cutoff(MIN_HORIZON_DAYS)
+
+
+def movement_totals(user_id: int, after: Optional[datetime], until: Optional[datetime], product_ids=None, after_id: Optional[int] = None) -> Dict[int, int]:
+    """Net quantity change per product for archived movements created in (after, until].
+
+    With after_id, movements with a higher id count instead; they may have been
+    created shortly before `after` (see app/snapshots.py).
+    """
+    totals: Dict[int, int] = {}
+    wanted = set(product_ids) if product_ids is not None else None
+    start = after
+    if after_id is not None and after is not None:
+        start = after - WATERMARK_SLACK
+    for row in read_movements(user_id, start=start, end=until):
+        if after_id is not None:
+            if row['id'] <= after_id:
+                continue
+        elif after is not None and row['created_at'] <= as_utc(after):
+            continue
+        if wanted is not None and row['product_id'] not in wanted:
+            continue
+        totals[row['product_id']] = totals.get(row['product_id'], 0) + row['quantity_change']
+    return totals
+
+
+def _newest_first(rows: list, date_column: str) -> list:
+    return sorted(rows, key=lambda row: (as_utc(getattr(row, date_column)), row.id), reverse=True)
+
+
+async def sales_history(
+    db: AsyncSession,
+    user_id: int,
+    product_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> List[models.ProductSale]:
+    """Sales with sale_date in [since, until], newest first, from the hot table and the archive."""
+    sale = models.ProductSale
+    stmt = select(sale).where(sale.user_id == user_id).order_by(sale.sale_date.desc())
+    if product_id is not None:
+        stmt = stmt.where(sale.product_id == product_id)
+    if since is not None:
+        stmt = stmt.where(sale.sale_date >= since)
+    if until is not None:
+        stmt = stmt.where(sale.sale_date <= until)
+    result = await db.execute(stmt)
+    rows = list(result.scalars().all())
+    if not reaches_archive(since):
+        return rows
+    archived = await asyncio.to_thread(read_sales, user_id, product_id, since, until)
+    if not archived:
+        return rows
+    # archived rows come back as transient (never added to the session) objects
+    return _newest_first(rows + [sale(**row) for row in archived], 'sale_date')
+
+
+async def movement_history(
+    db: AsyncSession,
+    user_id: int,
+    product_id: int,
+    since: Optional[datetime] = None,
+    limit: Optional[int] = None,
+) -> List[models.StockMovement]:
+    """A product's stock movements created after `since`, newest first, from the hot table and the archive."""
+    movement = models.StockMovement
+    stmt = select(movement).where(
+        movement.product_id == product_id,
+        movement.user_id == user_id,
+    ).order_by(movement.created_at.desc())
+    if since is not None:
+        stmt = stmt.where(movement.created_at > since)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    result = await db.execute(stmt)
+    rows = list(result.scalars().all())
+    if (limit is not None and len(rows) >= limit) or not reaches_archive(since):
+        return rows
+    archived = await asyncio.to_thread(read_movements, user_id, product_id, since)
+    if since is not None:
+        archived = [row for row in archived if row['created_at'] > as_utc(since)]
+    if not archived:
+        return rows
+    rows = _newest_first(rows + [movement(**row) for row in archived], 'created_at')
+    return rows[:limit] if limit is not None else rows
+
+
+async def run_all() -> None:
+    """Archive every tenant's old sales and movements."""
+    from .database import async_session
+
+    async with async_session() as db:
+        result = await db.execute(select(models.User.id).order_by(models.User.id))
+        user_ids = result.scalars().all()
+    for user_id in user_ids:
+        async with async_session() as db:
+            summary = await archive(db, user_id)
+        print(f"user {user_id}: archived {summary['sales_archived']} sales, {summary['movements_archived']} movements")
+
+
+if __name__ == "__main__":
+    asyncio.run(run_all())
@@ -0,0 +1,206 @@
+"""Per-tenant response cache, and the store behind data versions (app/versions.py).
+
+Cached responses are keyed by tenant, path, query string and the current version
+tokens of the scopes the response reads. Write paths bump those versions through
+versions.touch() when they commit, so the next read misses and recomputes; the
+superseded entries are never read again and age out.
+
+Two backends share one small interface:
+
+* InProcessBackend (default): an LRU bounded by CACHE_MAX_BYTES of cached bodies with
+  a per-entry TTL, and version tokens in this process's memory. Only correct with a
+  single worker and no other process writing (batch jobs' bumps never reach it);
+  refused when WEB_CONCURRENCY asks uvicorn for more than one worker.
+* RedisBackend (CACHE_URL=redis://...; needs the optional `redis` package): bodies and
+  version tokens live in Redis, so every worker and batch job sees the same versions
+  and shares entries. Entries expire after their TTL; give Redis a maxmemory with
+  maxmemory-policy allkeys-lru to bound its size.
+
+set_backend() swaps the backend, e.g. RedisBackend(fakeredis.aioredis.FakeRedis()) as a
+local stand-in for Redis in tests.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import secrets
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # optional: only needed for the shared backend
+    redis_asyncio = None
+
+logger = logging.getLogger(__name__)
+
+CACHE_URL = os.getenv('CACHE_URL')
+CACHE_TTL_SECONDS = float(os.getenv('CACHE_TTL_SECONDS', '60'))
+CACHE_MAX_BYTES = int(os.getenv('CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+
+
+class InProcessBackend:
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[str, Tuple[float, bytes]]' = OrderedDict()
+        self._size = 0
+        self._versions: Dict[str, int] = {}
+        # a restart must never hand out a token seen before it
+        self._epoch = secrets.token_hex(4)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        if len(value) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._size += len(value)
+        while self._size > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, key: str) -> None:
+        _, value = self._entries.pop(key)
+        self._size -= len(value)
+
+    async def versions(self, keys: Sequence[str]) -> List[str]:
+        return [f"{self._epoch}.{self._versions.get(key, 0)}" for key in keys]
+
+    def bump(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            self._versions[key] = self._versions.get(key, 0) + 1
+
+    async def flush(self) -> None:
+        pass
+
+
+class RedisBackend:
+    """Cached bodies and version tokens in Redis; `client` is a redis.asyncio client (or a stand-in)."""
+
+    def __init__(self, client):
+        self.client = client
+        self._pending = set()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(f"cache:{key}")
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await self.client.set(f"cache:{key}", value, px=int(ttl * 1000))
+
+    async def versions(self, keys: Sequence[str]) -> List[str]:
+        names = [f"version:{key}" for key in keys]
+        tokens = await self.client.mget(names)
+        for i, token in enumerate(tokens):
+            if token is None:
+                # random rather than 0, so tags issued before Redis lost its data never match again
+                await self.client.set(names[i], secrets.token_hex(8), nx=True)
+                tokens[i] = await self.client.get(names[i])
+        return [t.decode() if isinstance(t, bytes) else t for t in tokens]
+
+    def bump(self, keys: Iterable[str]) -> None:
+        # called from the session's after_commit hook, which cannot await
+        task = asyncio.get_running_loop().create_task(self._bump(list(keys)))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _bump(self, keys: List[str]) -> None:
+        try:
+            for key in keys:
+                await self.client.set(f"version:{key}", secrets.token_hex(8))
+        except Exception:
+            logger.exception('Failed to bump cache versions %s', keys)
+
+    async def flush(self) -> None:
+        """Wait for version bumps still in flight (call before a batch job's event loop closes)."""
+        if self._pending:
+            await asyncio.gather(*list(self._pending))
+
+
+def _default_backend():
+    if not CACHE_URL:
+        if int(os.getenv('WEB_CONCURRENCY', '1')) > 1:
+            raise RuntimeError("WEB_CONCURRENCY > 1 needs CACHE_URL: in-process cache versions are not shared between workers")
+        return InProcessBackend()
+    if redis_asyncio is None:
+        raise RuntimeError("CACHE_URL is set but the redis package is not installed (pip install redis)")
+    return RedisBackend(redis_asyncio.from_url(CACHE_URL))
+
+
+_backend = None
+
+
+def backend():
+    global _backend
+    if _backend is None:
+        _backend = _default_backend()
+    return _backend
+
+
+def set_backend(new_backend) -> None:
+    global _backend
+    _backend = new_backend
+
+
+def version_keys(user_id: int, scopes: Sequence[str]) -> List[str]:
+    return [f"{user_id}:{scope}" for scope in scopes]
+
+
+async def current_versions(request: Request, user_id: int, scopes: Tuple[str, ...]) -> List[str]:
+    """The tenant's version tokens for `scopes`, read once per request."""
+    memo = getattr(request.state, 'cache_versions', None)
+    if memo is None:
+        memo = request.state.cache_versions = {}
+    if scopes not in memo:
+        memo[scopes] = await backend().versions(version_keys(user_id, scopes))
+    return memo[scopes]
+
+
+def resource_key(user_id: int, request: Request, tokens: Sequence[str]) -> str:
+    query = '&'.join(sorted(request.url.query.split('&'))) if request.url.query else ''
+    digest = hashlib.blake2b(f"{request.url.path}?{query}|{'|'.join(tokens)}".encode(), digest_size=12).hexdigest()
+    return f"{user_id}:{digest}"
+
+
+async def respond(
+    request: Request,
+    response: Response,
+    user_id: int,
+    scopes: Tuple[str, ...],
+    response_type,
+    load: Callable[[], Awaitable],
+    ttl: float = CACHE_TTL_SECONDS,
+) -> Response:
+    """Serve the route's JSON body from the cache, or build it with `load()` and store it.
+
+    `response_type` is the route's response_model, used to serialize what load() returns.
+    Headers already set on `response` (e.g. the ETag) are carried over.
+    """
+    try:
+        key = resource_key(user_id, request, await current_versions(request, user_id, scopes))
+        body = await backend().get(key)
+    except Exception:
+        # an unreachable shared backend degrades to uncached responses
+        logger.exception('Response cache unavailable')
+        key = body = None
+    if body is None:
+        body = TypeAdapter(response_type).dump_json(await load())
+        if key is not None:
+            try:
+                await backend().set(key, body, ttl)
+            except Exception:
+                logger.exception('Response cache unavailable')
+    return Response(content=body, media_type='application/json', headers=dict(response.headers))
@@ -0,0 +1,152 @@
+"""ABC/XYZ inventory classification.
+
+Every product of a tenant is classified in one vectorized pass: A/B/C by cumulative
+share of revenue (products sorted by revenue, highest first) and X/Y/Z by the
+coefficient of variation of per-period demand. Results are written to the
+product_classifications table so list endpoints can filter on them with a join.
+
+Run for every tenant as a batch job with `python -m app.classification`.
+"""
+import asyncio
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict
+
+import numpy as np
+from sqlalchemy import select, insert, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import cache, models, forecasting, versions
+
+logger = logging.getLogger(__name__)
+
+# Cumulative revenue share boundaries for A and B; the rest is C
+ABC_THRESHOLDS = (0.80, 0.95)
+# Coefficient of variation boundaries for X and Y; the rest (and no demand) is Z
+XYZ_THRESHOLDS = (0.5, 1.0)
+DEFAULT_LOOKBACK_DAYS = 182
+# Demand is bucketed into periods of this many days before measuring variability
+PERIOD_DAYS = 7
+
+
+def classify(revenue: np.ndarray, demand: np.ndarray) -> Dict[str, np.ndarray]:
+    """ABC/XYZ classes for products given their revenue vector and (products x periods) demand matrix."""
+    total = revenue.sum()
+    share = revenue / total if total > 0 else np.zeros_like(revenue)
+    order = np.argsort(-revenue, kind='stable')
+    cumulative = np.empty_like(share)
+    cumulative[order] = np.cumsum(share[order])
+    # classify on the share reached before the product, so the product that crosses
+    # a boundary still belongs to the higher class
+    before = cumulative - share
+    abc = np.where(
+        revenue <= 0, 'C',
+        np.where(before < ABC_THRESHOLDS[0], 'A', np.where(before < ABC_THRESHOLDS[1], 'B', 'C'))
+    )
+
+    if demand.shape[1] > 0:
+        mean = demand.mean(axis=1)
+        std = demand.std(axis=1)
+    else:
+        mean = std = np.zeros(demand.shape[0])
+    has_demand = mean > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cv = np.where(has_demand, std / mean, np.nan)
+    xyz = np.where(
+        ~has_demand, 'Z',
+        np.where(cv <= XYZ_THRESHOLDS[0], 'X', np.where(cv <= XYZ_THRESHOLDS[1], 'Y', 'Z'))
+    )
+    return {"abc": abc, "xyz": xyz, "share": share, "cumulative": cumulative, "cv": cv}
+
+
+async def run_classification(
+    db: AsyncSession,
+    user_id: int,
+    lookback_days: int = DEFAULT_LOOKBACK_DAYS,
+    period_days: int = PERIOD_DAYS,
+) -> dict:
+    """Reclassify all of a tenant's products over the last `lookback_days` and replace their stored classes."""
+    stmt = select(models.Product.id).where(models.Product.user_id == user_id).order_by(models.Product.id)
+    result = await db.execute(stmt)
+    product_ids = np.array(result.scalars().all(), dtype=np.int64)
+
+    periods = max(lookback_days // period_days, 1)
+    days = periods * period_days
+    start = date.today() - timedelta(days=days - 1)
+    daily = await forecasting.load_daily_sales(db, user_id, product_ids, start, days)
+    demand = daily.reshape(len(product_ids), periods, period_days).sum(axis=2)
+
+    revenue = np.zeros(len(product_ids))
+    if len(product_ids):
+        stmt = select(
+            models.ProductSale.product_id,
+            func.sum(models.ProductSale.quantity * models.ProductSale.sale_price),
+        ).where(
+            models.ProductSale.user_id == user_id,
+            models.ProductSale.sale_date >= datetime.combine(start, datetime.min.time()),
+        ).group_by(models.ProductSale.product_id)
+        result = await db.execute(stmt)
+        rows = result.all()
+        if rows:
+            sale_ids = np.array([r[0] for r in rows], dtype=np.int64)
+            idx = np.clip(np.searchsorted(product_ids, sale_ids), 0, len(product_ids) - 1)
+            keep = product_ids[idx] == sale_ids
+            revenue[idx[keep]] = np.array([float(r[1] or 0) for r in rows])[keep]
+
+    classes = classify(revenue, demand)
+    units = daily.sum(axis=1)
+    computed_at = datetime.now(timezone.utc)
+    rows = [
+        {
+            "product_id": int(product_ids[i]),
+            "user_id": user_id,
+            "abc_class": str(classes["abc"][i]),
+            "xyz_class": str(classes["xyz"][i]),
+            "revenue": round(float(revenue[i]), 2),
+            "revenue_share": float(classes["share"][i]),
+            "cumulative_share": float(classes["cumulative"][i]),
+            "units_sold": int(units[i]),
+            "demand_cv": None if np.isnan(classes["cv"][i]) else float(classes["cv"][i]),
+            "computed_at": computed_at,
+        }
+        for i in range(len(product_ids))
+    ]
+
+    # full recompute: replace the tenant's rows in one transaction
+    try:
+        await db.execute(delete(models.ProductClassification).where(models.ProductClassification.user_id == user_id))
+        if rows:
+            await db.execute(insert(models.ProductClassification), rows)
+        # the product list filters on the stored classes
+        versions.touch(db, user_id, 'products')
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    counts = {f"{a}{x}": 0 for a in "ABC" for x in "XYZ"}
+    for row in rows:
+        counts[row["abc_class"] + row["xyz_class"]] += 1
+    return {"products": len(rows), "counts": counts, "computed_at": computed_at}
+
+
+async def run_all() -> None:
+    """Reclassify every tenant's products."""
+    from .database import async_session
+
+    if isinstance(cache.backend(), cache.InProcessBackend):
+        logger.warning("CACHE_URL is not set: the API keeps serving cached product lists and ETags from before this run until it restarts")
+
+    async with async_session() as db:
+        result = await db.execute(select(models.User.id).order_by(models.User.id))
+        user_ids = result.scalars().all()
+    for user_id in user_ids:
+        async with async_session() as db:
+            summary = await run_classification(db, user_id)
+        print(f"user {user_id}: classified {summary['products']} products")
+    # shared cache backend: land the product-list version bumps before the loop closes
+    await cache.backend().flush()
+
+
+if __name__ == "__main__":
+    asyncio.run(run_all())
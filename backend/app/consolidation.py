@@ -0,0 +1,54 @@
+"""Supplier-grouped reorder consolidation.
+
+Reorder lines are grouped by supplier into one multi-line purchase order each. Line
+quantities are rounded up to the supplier's pack size, and an order that falls short
+of the supplier's minimum order quantity is topped up on its largest line.
+"""
+from typing import Dict, Iterable, List, Optional
+
+
+def round_up(quantity: int, pack_size: int) -> int:
+    pack_size = max(pack_size or 1, 1)
+    return -(-quantity // pack_size) * pack_size
+
+
+def plan_orders(lines: Iterable[dict], suppliers: Dict[int, object]) -> List[dict]:
+    """Group (product_id, supplier_id, quantity) dicts into per-supplier order plans.
+
+    suppliers maps supplier_id to an object with name, min_order_quantity and pack_size.
+    Repeated products within a supplier are merged. Lines without a supplier form one
+    group with no MOQ or pack-size rules. Plans are ordered by supplier_id, unassigned last.
+    """
+    groups: Dict[Optional[int], Dict[int, int]] = {}
+    for line in lines:
+        if line["quantity"] <= 0:
+            continue
+        items = groups.setdefault(line.get("supplier_id"), {})
+        items[line["product_id"]] = items.get(line["product_id"], 0) + line["quantity"]
+
+    plans = []
+    for supplier_id in sorted(groups, key=lambda sid: (sid is None, sid or 0)):
+        supplier = suppliers.get(supplier_id) if supplier_id is not None else None
+        pack_size = max(getattr(supplier, 'pack_size', 1) or 1, 1)
+        moq = getattr(supplier, 'min_order_quantity', 0) or 0
+        plan_lines = [
+            {"product_id": product_id, "requested_quantity": quantity, "quantity": round_up(quantity, pack_size)}
+            for product_id, quantity in groups[supplier_id].items()
+        ]
+        total = sum(line["quantity"] for line in plan_lines)
+        topped_up = False
+        if total < moq:
+            largest = max(plan_lines, key=lambda line: line["quantity"])
+            largest["quantity"] += round_up(moq - total, pack_size)
+            total = sum(line["quantity"] for line in plan_lines)
+            topped_up = True
+        plans.append({
+            "supplier_id": supplier_id,
+            "supplier_name": getattr(supplier, 'name', None),
+            "min_order_quantity": moq,
+            "pack_size": pack_size,
+            "total_quantity": total,
+            "topped_up_to_moq": topped_up,
+            "lines": plan_lines,
+        })
+    return plans
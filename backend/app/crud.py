@@ -1,72 +1,75 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from . import models, schemas
-from sqlalchemy import select
+from . import models, schemas, ledger, lookup_index, search, sync, versions
+from .timeutil import as_naive_utc
+from sqlalchemy import select, insert, update, delete, and_, or_, func, null, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import selectinload
-from typing import List, Optional
-from datetime import datetime
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from typing import Dict, List, Optional
+from datetime import datetime, timedelta, timezone
 
 
-async def get_category_by_name(db: AsyncSession, name: str, user_id: int) -> Optional[models.ProductCategory]:
-    """Get category by name for a specific user"""
-    stmt = select(models.ProductCategory).where(
-        models.ProductCategory.name == name,
-        models.ProductCategory.user_id == user_id
-    )
-    result = await db.execute(stmt)
-    return result.scalars().first()
+# Rows per INSERT ... ON CONFLICT statement (and per commit) for batched imports
+UPSERT_CHUNK_SIZE = 1000
+# Max values bound into a single IN (...) lookup
+IN_CHUNK_SIZE = 5000
+# Max SKUs + ids accepted by a single product lookup
+LOOKUP_MAX_ITEMS = 500
 
 
-async def get_supplier_by_name(db: AsyncSession, name: str, user_id: int) -> Optional[models.Supplier]:
-    """Get supplier by name for a specific user"""
-    stmt = select(models.Supplier).where(
-        models.Supplier.name == name,
-        models.Supplier.user_id == user_id
-    )
-    result = await db.execute(stmt)
-    return result.scalars().first()
+# Eager-load options shared by every query that returns products / purchase orders for
+# serialization. Many-to-one joins keep each load to a single round trip; the one-to-many
+# purchase-order lines are fetched with one extra IN query rather than multiplying rows.
+PRODUCT_LOAD_OPTIONS = (
+    joinedload(models.Product.supplier),
+    joinedload(models.Product.category),
+)
+PURCHASE_ORDER_LOAD_OPTIONS = (
+    joinedload(models.PurchaseOrder.supplier),
+    joinedload(models.PurchaseOrder.product).joinedload(models.Product.supplier),
+    joinedload(models.PurchaseOrder.product).joinedload(models.Product.category),
+    selectinload(models.PurchaseOrder.lines).joinedload(models.PurchaseOrderLine.product).joinedload(models.Product.supplier),
+    selectinload(models.PurchaseOrder.lines).joinedload(models.PurchaseOrderLine.product).joinedload(models.Product.category),
+)
 
 
-async def record_stock_movement_crud(
-    db: AsyncSession,
-    product: models.Product,
-    movement_type: str,
-    quantity_change: int,
-    user_id: Optional[int] = None,
-    reference_id: Optional[int] = None,
-    reference_type: Optional[str] = None,
-    notes: Optional[str] = None,
-    transaction_date: Optional[datetime] = None
-):
-    """Helper function to record stock movements in crud operations"""
-    quantity_before = product.quantity - quantity_change  # Calculate before since product.quantity is already updated
-    quantity_after = product.quantity
-    
-    # For manual edits, use current time as transaction date if not provided
-    if transaction_date is None:
-        transaction_date = datetime.now()
-    
-    movement = models.StockMovement(
-        product_id=product.id,
-        user_id=user_id,
-        movement_type=movement_type,
-        quantity_change=quantity_change,
-        quantity_before=quantity_before,
-        quantity_after=quantity_after,
-        reference_id=reference_id,
-        reference_type=reference_type,
-        notes=notes,
-        transaction_date=transaction_date
-    )
-    
-    db.add(movement)
-    return movement
+def dialect_insert(db: AsyncSession, model):
+    """Return a dialect-specific INSERT construct so ON CONFLICT / RETURNING are available."""
+    if db.bind.dialect.name == 'sqlite':
+        return sqlite_insert(model)
+    return pg_insert(model)
+
+
+async def resolve_id(db: AsyncSession, kind: str, key: str, user_id: int) -> Optional[int]:
+    """Id of the tenant's category / supplier with this name, without reading the row (see app/lookup_index.py)."""
+    obj_id = await lookup_index.resolve(db, user_id, kind, key)
+    if obj_id is not None:
+        return obj_id
+    model, column = lookup_index.KINDS[kind]
+    stmt = select(model.id).where(getattr(model, column) == key, model.user_id == user_id)
+    obj_id = (await db.execute(stmt)).scalar()
+    if obj_id is not None:
+        lookup_index.put(user_id, kind, key, obj_id)
+    return obj_id
+
+
+async def get_category_id(db: AsyncSession, name: str, user_id: int) -> Optional[int]:
+    """Id of the user's category with this name"""
+    return await resolve_id(db, 'category', name, user_id)
+
+
+async def get_supplier_id(db: AsyncSession, name: str, user_id: int) -> Optional[int]:
+    """Id of the user's supplier with this name"""
+    return await resolve_id(db, 'supplier', name, user_id)
 
 
 async def get_product_by_sku(db: AsyncSession, sku: str, user_id: Optional[int] = None) -> Optional[models.Product]:
     """Lookup a product by SKU. If user_id provided, scope lookup to that user."""
     if not sku:
         return None
+    # callers read the row's stock and price, so this one indexed read is needed anyway
     stmt = select(models.Product).where(models.Product.sku == sku)
     if user_id is not None:
         stmt = stmt.where(models.Product.user_id == user_id)
@@ -78,44 +81,85 @@ async def get_product(db: AsyncSession, product_id: int, user_id: Optional[int]
     stmt = select(models.Product).where(models.Product.id == product_id)
     if user_id is not None:
         stmt = stmt.where(models.Product.user_id == user_id)
-    stmt = stmt.options(
-        selectinload(models.Product.supplier),
-        selectinload(models.Product.category),
-    )
+    stmt = stmt.options(*PRODUCT_LOAD_OPTIONS)
     result = await db.execute(stmt)
     return result.scalars().first()
 
 
-async def get_products(db: AsyncSession, skip: int = 0, limit: int = 100, user_id: Optional[int] = None) -> List[models.Product]:
+async def lookup_products(
+    db: AsyncSession,
+    skus: List[str],
+    product_ids: List[int],
+    user_id: Optional[int] = None,
+):
+    """Fetch products by SKU and/or id in one query.
+
+    Returns (products, missing_skus, missing_ids); products are in request order (ids
+    first, then SKUs) without duplicates.
+    """
+    skus = list(dict.fromkeys(sku.strip() for sku in skus if sku and sku.strip()))
+    product_ids = list(dict.fromkeys(product_ids))
+    if not skus and not product_ids:
+        raise ValueError("Provide at least one SKU or product id")
+    if len(skus) + len(product_ids) > LOOKUP_MAX_ITEMS:
+        raise ValueError(f"At most {LOOKUP_MAX_ITEMS} SKUs and ids can be looked up at once")
+    keys = []
+    if product_ids:
+        keys.append(models.Product.id.in_(product_ids))
+    if skus:
+        keys.append(models.Product.sku.in_(skus))
+    stmt = select(models.Product).where(or_(*keys))
+    if user_id is not None:
+        stmt = stmt.where(models.Product.user_id == user_id)
+    stmt = stmt.options(*PRODUCT_LOAD_OPTIONS)
+    found = (await db.execute(stmt)).scalars().all()
+    by_id = {p.id: p for p in found}
+    by_sku = {p.sku: p for p in found if p.sku is not None}
+    products = {}
+    for product_id in product_ids:
+        if product_id in by_id:
+            products[product_id] = by_id[product_id]
+    for sku in skus:
+        if sku in by_sku:
+            products.setdefault(by_sku[sku].id, by_sku[sku])
+    missing_ids = [i for i in product_ids if i not in by_id]
+    missing_skus = [sku for sku in skus if sku not in by_sku]
+    return list(products.values()), missing_skus, missing_ids
+
+
+async def get_products(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    user_id: Optional[int] = None,
+    abc_class: Optional[str] = None,
+    xyz_class: Optional[str] = None,
+) -> List[models.Product]:
     stmt = select(models.Product)
     if user_id is not None:
         stmt = stmt.where(models.Product.user_id == user_id)
-    stmt = stmt.options(
-        selectinload(models.Product.supplier),
-        selectinload(models.Product.category),
-    ).offset(skip).limit(limit)
+    if abc_class or xyz_class:
+        # filter on the stored ABC/XYZ classes (products never classified are excluded)
+        stmt = stmt.join(models.ProductClassification, models.ProductClassification.product_id == models.Product.id)
+        if abc_class:
+            stmt = stmt.where(models.ProductClassification.abc_class == abc_class)
+        if xyz_class:
+            stmt = stmt.where(models.ProductClassification.xyz_class == xyz_class)
+    stmt = stmt.options(*PRODUCT_LOAD_OPTIONS).offset(skip).limit(limit)
     result = await db.execute(stmt)
     return result.scalars().all()
 
 
 async def create_product(db: AsyncSession, product: schemas.ProductCreate) -> models.Product:
     data = product.model_dump()
-    # Prevent inserting duplicate SKUs by checking existence first (user-scoped)
-    sku = data.get("sku")
-    user_id = data.get("user_id")
-    if sku and user_id:
-        stmt = select(models.Product).where(
-            models.Product.sku == sku,
-            models.Product.user_id == user_id
-        )
-        result = await db.execute(stmt)
-        if result.scalars().first():
-            raise ValueError("SKU already exists for this user")
+    related = await _resolve_product_references(db, data, data.get("user_id"))
     db_product = models.Product(**data)
     db.add(db_product)
+    versions.touch(db, db_product.user_id, 'products')
     try:
+        # id and last_updated come back via INSERT ... RETURNING (eager_defaults);
+        # duplicate SKUs are rejected by unique_sku_per_user
         await db.commit()
-        await db.refresh(db_product)
     except IntegrityError as e:
         # rollback and raise a simple error that the router can translate
         await db.rollback()
@@ -125,151 +169,129 @@ async def create_product(db: AsyncSession, product: schemas.ProductCreate) -> mo
             raise ValueError("SKU already exists for this user")
         # include original DB message to aid debugging (safe in dev)
         raise ValueError(f"Database integrity error: {msg}")
-    # reload with selectinload to ensure relationships accessible without IO
-    stmt = select(models.Product).where(models.Product.id == db_product.id).options(
-        selectinload(models.Product.supplier),
-        selectinload(models.Product.category),
-    )
-    result = await db.execute(stmt)
-    return result.scalars().first()
+    search.invalidate(db_product.user_id)
+    # attach the already-loaded supplier/category so serialization needs no IO
+    for name, obj in related.items():
+        set_committed_value(db_product, name, obj)
+    return db_product
 
 
 async def create_category(db: AsyncSession, category: schemas.ProductCategoryCreate) -> models.ProductCategory:
     data = category.model_dump()
-    # Prevent duplicate category names for the same user
-    stmt = select(models.ProductCategory).where(models.ProductCategory.name == data.get('name'))
-    if data.get('user_id') is not None:
-        stmt = stmt.where(models.ProductCategory.user_id == data.get('user_id'))
-    result = await db.execute(stmt)
-    if result.scalars().first():
-        raise ValueError('Category name already exists')
+    # duplicate names for the same user are rejected by unique_category_per_user
     db_cat = models.ProductCategory(**data)
     # ensure ownership is set on the model instance
     if data.get('user_id') is not None:
         db_cat.user_id = data.get('user_id')
     db.add(db_cat)
+    versions.touch(db, db_cat.user_id, 'categories')
     try:
         await db.commit()
-        await db.refresh(db_cat)
     except IntegrityError as e:
         await db.rollback()
         msg = str(e.orig) if getattr(e, 'orig', None) else str(e)
         if 'name' in msg.lower():
             raise ValueError('Category name already exists')
         raise ValueError(f"Database integrity error: {msg}")
+    lookup_index.put(db_cat.user_id, 'category', db_cat.name, db_cat.id)
     return db_cat
 
 
 async def create_supplier(db: AsyncSession, supplier: schemas.SupplierCreate) -> models.Supplier:
     data = supplier.model_dump()
-    # Prevent duplicate supplier names for the same user
-    stmt = select(models.Supplier).where(models.Supplier.name == data.get('name'))
-    if data.get('user_id') is not None:
-        stmt = stmt.where(models.Supplier.user_id == data.get('user_id'))
-    result = await db.execute(stmt)
-    if result.scalars().first():
-        raise ValueError('Supplier name already exists')
+    # duplicate names for the same user are rejected by unique_supplier_per_user
     db_sup = models.Supplier(**data)
     # ensure ownership is set on the model instance
     if data.get('user_id') is not None:
         db_sup.user_id = data.get('user_id')
     db.add(db_sup)
+    versions.touch(db, db_sup.user_id, 'suppliers')
     try:
         await db.commit()
-        await db.refresh(db_sup)
     except IntegrityError as e:
         await db.rollback()
         msg = str(e.orig) if getattr(e, 'orig', None) else str(e)
         if 'name' in msg.lower():
             raise ValueError('Supplier name already exists')
         raise ValueError(f"Database integrity error: {msg}")
+    lookup_index.put(db_sup.user_id, 'supplier', db_sup.name, db_sup.id)
     return db_sup
 
 
+async def _get_owned(db: AsyncSession, model, obj_id: Optional[int], user_id: Optional[int], error: str):
+    """Fetch a row by primary key through the identity map (no query when already loaded) and check ownership."""
+    if obj_id is None:
+        return None
+    obj = await db.get(model, obj_id)
+    if obj is None or (user_id is not None and obj.user_id != user_id):
+        raise ValueError(error)
+    return obj
+
+
+async def _resolve_product_references(db: AsyncSession, values: dict, user_id: Optional[int] = None) -> dict:
+    """Validate supplier_id / category_id in values and return the related objects keyed by relationship name.
+
+    Only keys present in values are resolved; raises ValueError for ids that don't exist for the user.
+    """
+    related = {}
+    if 'supplier_id' in values:
+        related['supplier'] = await _get_owned(db, models.Supplier, values['supplier_id'], user_id, 'Invalid supplier_id')
+    if 'category_id' in values:
+        related['category'] = await _get_owned(db, models.ProductCategory, values['category_id'], user_id, 'Invalid category_id')
+    return related
+
+
 async def update_product(db: AsyncSession, product_id: int, updates: schemas.ProductUpdate, user_id: Optional[int] = None) -> Optional[models.Product]:
     # load product with relationships
     stmt = select(models.Product).where(models.Product.id == product_id)
     if user_id is not None:
         stmt = stmt.where(models.Product.user_id == user_id)
-    stmt = stmt.options(
-        selectinload(models.Product.supplier),
-        selectinload(models.Product.category),
-    )
+    stmt = stmt.options(*PRODUCT_LOAD_OPTIONS)
     result = await db.execute(stmt)
     db_product = result.scalars().first()
     if not db_product:
         return None
-    
     updated_items = updates.model_dump(exclude_unset=True)
     
-    # Track quantity changes for stock movements
-    old_quantity = db_product.quantity
-    new_quantity = updated_items.get('quantity', old_quantity)
-    quantity_change = new_quantity - old_quantity
-    
     # validate FK references if provided
-    if 'supplier_id' in updated_items and updated_items.get('supplier_id') is not None:
-        stmt = select(models.Supplier).where(models.Supplier.id == updated_items.get('supplier_id'))
-        if user_id is not None:
-            stmt = stmt.where(models.Supplier.user_id == user_id)
-        result = await db.execute(stmt)
-        if not result.scalars().first():
-            raise ValueError('Invalid supplier_id')
-    if 'category_id' in updated_items and updated_items.get('category_id') is not None:
-        stmt = select(models.ProductCategory).where(models.ProductCategory.id == updated_items.get('category_id'))
-        if user_id is not None:
-            stmt = stmt.where(models.ProductCategory.user_id == user_id)
-        result = await db.execute(stmt)
-        if not result.scalars().first():
-            raise ValueError('Invalid category_id')
-    # If SKU is being changed/added, ensure uniqueness across other products for this user
-    if "sku" in updated_items:
-        new_sku = updated_items.get("sku")
-        if new_sku:
-            stmt = select(models.Product).where(
-                models.Product.sku == new_sku, 
-                models.Product.id != product_id,
-                models.Product.user_id == user_id
-            )
-            result = await db.execute(stmt)
-            if result.scalars().first():
-                raise ValueError("SKU already exists for this user")
+    related = await _resolve_product_references(db, updated_items, user_id)
+    
+    # Quantity goes through the ledger as a delta against the locked current value
+    new_quantity = updated_items.pop('quantity', None)
+    if new_quantity is not None:
+        current = await ledger.lock_quantities(db, [product_id])
+        quantity_change = new_quantity - current[product_id]
+        await ledger.apply_movements(db, [ledger.Movement(
+            product_id=product_id,
+            delta=quantity_change,
+            movement_type="adjustment",
+            reference_type="product_edit",
+            notes=f"Manual adjustment via product edit: {abs(quantity_change)} units",
+            transaction_date=datetime.now(),
+        )], user_id=user_id)
     
     # Apply updates to the product
     for k, v in updated_items.items():
         setattr(db_product, k, v)
     
-    # Record stock movement if quantity changed
-    if quantity_change != 0:
-        movement_type = "adjustment"
-        notes = f"Manual {movement_type} via product edit: {abs(quantity_change)} units"
-        
-        await record_stock_movement_crud(
-            db=db,
-            product=db_product,
-            movement_type=movement_type,
-            quantity_change=quantity_change,
-            user_id=user_id,
-            reference_type="product_edit",
-            notes=notes
-        )
-    
     db.add(db_product)
+    versions.touch(db, db_product.user_id, 'products')
     try:
+        # last_updated comes back via UPDATE ... RETURNING (eager_defaults);
+        # SKU clashes are rejected by unique_sku_per_user
         await db.commit()
-        await db.refresh(db_product)
     except IntegrityError as e:
         await db.rollback()
         msg = str(e.orig) if getattr(e, 'orig', None) else str(e)
         if 'sku' in msg.lower():
             raise ValueError("SKU already exists for this user")
         raise ValueError(f"Database integrity error: {msg}")
-    stmt = select(models.Product).where(models.Product.id == db_product.id).options(
-        selectinload(models.Product.supplier),
-        selectinload(models.Product.category),
-    )
-    result = await db.execute(stmt)
-    return result.scalars().first()
+    if updated_items.keys() & {'name', 'sku', 'description'}:
+        search.invalidate(db_product.user_id)
+    # point changed relationships at the objects resolved above
+    for name, obj in related.items():
+        set_committed_value(db_product, name, obj)
+    return db_product
 
 
 async def delete_product(db: AsyncSession, product_id: int, user_id: Optional[int] = None) -> bool:
@@ -283,7 +305,10 @@ async def delete_product(db: AsyncSession, product_id: int, user_id: Optional[in
     if not db_product:
         return False
     await db.delete(db_product)
+    await sync.record_deletions(db, 'product', [(db_product.id, db_product.user_id)])
+    versions.touch(db, db_product.user_id, 'products')
     await db.commit()
+    search.invalidate(db_product.user_id)
     return True
 
 
@@ -304,7 +329,10 @@ async def delete_category(db: AsyncSession, category_id: int, user_id: Optional[
     if result.scalars().first():
         raise ValueError('Category has products and cannot be deleted')
     await db.delete(db_cat)
+    await sync.record_deletions(db, 'category', [(db_cat.id, db_cat.user_id)])
+    versions.touch(db, db_cat.user_id, 'categories')
     await db.commit()
+    lookup_index.discard(db_cat.user_id, 'category', db_cat.name)
     return True
 
 
@@ -324,7 +352,10 @@ async def delete_supplier(db: AsyncSession, supplier_id: int, user_id: Optional[
     if result.scalars().first():
         raise ValueError('Supplier has products and cannot be deleted')
     await db.delete(db_sup)
+    await sync.record_deletions(db, 'supplier', [(db_sup.id, db_sup.user_id)])
+    versions.touch(db, db_sup.user_id, 'suppliers')
     await db.commit()
+    lookup_index.discard(db_sup.user_id, 'supplier', db_sup.name)
     return True
 
 
@@ -336,19 +367,23 @@ async def update_category(db: AsyncSession, category_id: int, updates: schemas.P
     db_cat = result.scalars().first()
     if not db_cat:
         return None
+    old_name = db_cat.name
     updated = updates.model_dump(exclude_unset=True)
     for k, v in updated.items():
         setattr(db_cat, k, v)
     db.add(db_cat)
+    versions.touch(db, db_cat.user_id, 'categories')
     try:
         await db.commit()
-        await db.refresh(db_cat)
     except IntegrityError as e:
         await db.rollback()
         msg = str(e.orig) if getattr(e, 'orig', None) else str(e)
         if 'name' in msg.lower():
             raise ValueError('Category name already exists')
         raise ValueError(f"Database integrity error: {msg}")
+    if old_name != db_cat.name:
+        lookup_index.discard(db_cat.user_id, 'category', old_name)
+        lookup_index.put(db_cat.user_id, 'category', db_cat.name, db_cat.id)
     return db_cat
 
 
@@ -360,17 +395,308 @@ async def update_supplier(db: AsyncSession, supplier_id: int, updates: schemas.S
     db_sup = result.scalars().first()
     if not db_sup:
         return None
+    old_name = db_sup.name
     updated = updates.model_dump(exclude_unset=True)
     for k, v in updated.items():
         setattr(db_sup, k, v)
     db.add(db_sup)
+    versions.touch(db, db_sup.user_id, 'suppliers')
     try:
         await db.commit()
-        await db.refresh(db_sup)
     except IntegrityError as e:
         await db.rollback()
         msg = str(e.orig) if getattr(e, 'orig', None) else str(e)
         if 'name' in msg.lower():
             raise ValueError('Supplier name already exists')
         raise ValueError(f"Database integrity error: {msg}")
+    if old_name != db_sup.name:
+        lookup_index.discard(db_sup.user_id, 'supplier', old_name)
+        lookup_index.put(db_sup.user_id, 'supplier', db_sup.name, db_sup.id)
     return db_sup
+
+
+async def _bulk_upsert_by_name(
+    db: AsyncSession,
+    model,
+    kind: str,
+    rows: List[dict],
+    update_columns: List[str],
+    on_conflict: str = 'skip',
+    chunk_size: int = UPSERT_CHUNK_SIZE,
+) -> Dict[str, int]:
+    """Insert rows keyed by (name, user_id) with INSERT ... ON CONFLICT, one commit per chunk.
+
+    on_conflict='skip' leaves existing rows untouched, 'update' overwrites update_columns.
+    Returns a name -> id mapping for every row that was inserted or updated, which is
+    also recorded in the lookup index under `kind`.
+    """
+    if on_conflict not in ('skip', 'update'):
+        raise ValueError("on_conflict must be 'skip' or 'update'")
+    scope = {'supplier': 'suppliers', 'category': 'categories'}[kind]
+    written: Dict[str, int] = {}
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        stmt = dialect_insert(db, model).values(chunk)
+        if on_conflict == 'update':
+            # a no-op SET on name still returns the existing row's id
+            set_ = {col: stmt.excluded[col] for col in update_columns}
+            # ON CONFLICT SET does not apply onupdate defaults; bump last_updated and queue the
+            # rows for delta sync
+            set_ = {**set_, 'last_updated': func.now(), 'sync_seq': null()} if set_ else {'name': stmt.excluded.name}
+            stmt = stmt.on_conflict_do_update(index_elements=['name', 'user_id'], set_=set_)
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=['name', 'user_id'])
+        stmt = stmt.returning(model.id, model.name)
+        for owner in {row.get('user_id') for row in chunk}:
+            versions.touch(db, owner, scope)
+        try:
+            result = await db.execute(stmt)
+            chunk_written = {name: id_ for id_, name in result.all()}
+            await db.commit()
+        except IntegrityError as e:
+            await db.rollback()
+            msg = str(e.orig) if getattr(e, 'orig', None) else str(e)
+            raise ValueError(f"Database integrity error: {msg}")
+        owners = {row['name']: row.get('user_id') for row in chunk}
+        for name, id_ in chunk_written.items():
+            lookup_index.put(owners.get(name), kind, name, id_)
+        written.update(chunk_written)
+    return written
+
+
+async def bulk_upsert_suppliers(db: AsyncSession, suppliers: List[schemas.SupplierCreate], on_conflict: str = 'skip', update_columns: Optional[List[str]] = None) -> Dict[str, int]:
+    """Batched supplier import on the unique_supplier_per_user constraint. Names must be unique within the batch."""
+    rows = [s.model_dump() for s in suppliers]
+    if update_columns is None:
+        update_columns = ['email', 'phone', 'address']
+    return await _bulk_upsert_by_name(db, models.Supplier, 'supplier', rows, update_columns, on_conflict)
+
+
+async def bulk_upsert_categories(db: AsyncSession, categories: List[schemas.ProductCategoryCreate], on_conflict: str = 'skip', update_columns: Optional[List[str]] = None) -> Dict[str, int]:
+    """Batched category import on the unique_category_per_user constraint. Names must be unique within the batch."""
+    rows = [c.model_dump() for c in categories]
+    if update_columns is None:
+        update_columns = ['description']
+    return await _bulk_upsert_by_name(db, models.ProductCategory, 'category', rows, update_columns, on_conflict)
+
+
+async def apply_stock_counts(db: AsyncSession, counts: Dict[str, int], user_id: int, notes: Optional[str] = None) -> dict:
+    """Reconcile counted quantities (sku -> counted) against stock in a single transaction.
+
+    Products are read (and row-locked where supported) with chunked IN queries, deltas are
+    computed in memory and applied as one ledger batch of 'adjustment' movements.
+    """
+    if not counts:
+        return {"adjusted": 0, "unchanged": 0, "missing": [], "adjustments": []}
+    skus = list(counts)
+    current = {}
+    for start in range(0, len(skus), IN_CHUNK_SIZE):
+        stmt = select(models.Product.id, models.Product.sku, models.Product.quantity).where(
+            models.Product.user_id == user_id,
+            models.Product.sku.in_(skus[start:start + IN_CHUNK_SIZE]),
+        ).with_for_update()
+        result = await db.execute(stmt)
+        for product_id, sku, quantity in result.all():
+            current[sku] = (product_id, quantity)
+
+    now = datetime.now()
+    movements = []
+    adjustments = []
+    unchanged = 0
+    for sku, counted in counts.items():
+        if sku not in current:
+            continue
+        product_id, before = current[sku]
+        change = counted - before
+        if change == 0:
+            unchanged += 1
+            continue
+        movements.append(ledger.Movement(
+            product_id=product_id,
+            delta=change,
+            movement_type="adjustment",
+            reference_type="stock_count",
+            notes=notes or f"Stock count adjustment: counted {counted}, expected {before}",
+            transaction_date=now,
+        ))
+        adjustments.append({
+            "sku": sku,
+            "product_id": product_id,
+            "quantity_before": before,
+            "quantity_after": counted,
+            "quantity_change": change,
+        })
+
+    try:
+        # the rows are locked above, so the deltas land exactly on the counted values
+        await ledger.apply_movements(db, movements, user_id=user_id)
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        msg = str(e.orig) if getattr(e, 'orig', None) else str(e)
+        raise ValueError(f"Database integrity error: {msg}")
+    return {
+        "adjusted": len(adjustments),
+        "unchanged": unchanged,
+        "missing": [sku for sku in skus if sku not in current],
+        "adjustments": adjustments,
+    }
+
+
+def _product_selection(selection: schemas.ProductBulkSelection, user_id: Optional[int] = None) -> list:
+    """WHERE clauses for a bulk product operation; at least one selector is required."""
+    if selection.product_ids is None and selection.category_id is None and selection.supplier_id is None:
+        raise ValueError('Provide product_ids, category_id or supplier_id')
+    conditions = []
+    if user_id is not None:
+        conditions.append(models.Product.user_id == user_id)
+    if selection.product_ids is not None:
+        conditions.append(models.Product.id.in_(selection.product_ids))
+    if selection.category_id is not None:
+        conditions.append(models.Product.category_id == selection.category_id)
+    if selection.supplier_id is not None:
+        conditions.append(models.Product.supplier_id == selection.supplier_id)
+    return conditions
+
+
+async def bulk_update_products(db: AsyncSession, selection: schemas.ProductBulkSelection, updates: schemas.ProductUpdate, user_id: Optional[int] = None) -> List[int]:
+    """Apply the same updates to every selected product with a single UPDATE ... RETURNING.
+
+    When quantity is set, the previous quantities are read under a row lock first and
+    the change goes through the ledger as one batch of 'adjustment' movements.
+    Returns the ids of the updated products.
+    """
+    values = updates.model_dump(exclude_unset=True)
+    if not values:
+        raise ValueError('No fields to update')
+    if 'sku' in values:
+        raise ValueError('SKU cannot be bulk updated')
+    conditions = _product_selection(selection, user_id)
+    await _resolve_product_references(db, values, user_id)
+
+    previous = {}
+    new_quantity = values.pop('quantity', None)
+    if new_quantity is not None:
+        # lock the selected rows so the deltas below land exactly on the new quantity
+        stmt = select(models.Product.id, models.Product.quantity).where(*conditions).with_for_update()
+        result = await db.execute(stmt)
+        previous = dict(result.all())
+
+    if values:
+        stmt = update(models.Product).where(*conditions).values(**values).returning(models.Product.id)
+        result = await db.execute(stmt.execution_options(synchronize_session=False))
+        product_ids = list(result.scalars().all())
+    else:
+        product_ids = sorted(previous)
+
+    now = datetime.now()
+    movements = [
+        ledger.Movement(
+            product_id=product_id,
+            delta=new_quantity - old_quantity,
+            movement_type="adjustment",
+            reference_type="bulk_product_edit",
+            notes=f"Manual adjustment via bulk product edit: {abs(new_quantity - old_quantity)} units",
+            transaction_date=now,
+        )
+        for product_id, old_quantity in previous.items()
+    ]
+
+    versions.touch(db, user_id, 'products')
+    try:
+        await ledger.apply_movements(db, movements, user_id=user_id)
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        msg = str(e.orig) if getattr(e, 'orig', None) else str(e)
+        raise ValueError(f"Database integrity error: {msg}")
+    if values.keys() & {'name', 'description'}:
+        search.invalidate(user_id)
+    return product_ids
+
+
+async def bulk_delete_products(db: AsyncSession, selection: schemas.ProductBulkSelection, user_id: Optional[int] = None) -> List[int]:
+    """Delete every selected product with a single DELETE ... RETURNING. Returns the deleted ids."""
+    conditions = _product_selection(selection, user_id)
+    stmt = delete(models.Product).where(*conditions).returning(models.Product.id, models.Product.user_id)
+    try:
+        result = await db.execute(stmt.execution_options(synchronize_session=False))
+        deleted = [tuple(row) for row in result.all()]
+        await sync.record_deletions(db, 'product', deleted)
+        for owner in {owner for _, owner in deleted}:
+            versions.touch(db, owner, 'products')
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        msg = str(e.orig) if getattr(e, 'orig', None) else str(e)
+        if 'foreign key' in msg.lower():
+            raise ValueError('Products have sales, stock movements or purchase orders and cannot be deleted')
+        raise ValueError(f"Database integrity error: {msg}")
+    for owner in {owner for _, owner in deleted}:
+        search.invalidate(owner)
+    return [product_id for product_id, _ in deleted]
+
+
+def _parse_stock_value_cursor(cursor: str):
+    try:
+        value, product_id = cursor.split(':', 1)
+        return int(value), int(product_id)
+    except ValueError:
+        raise ValueError("Invalid cursor")
+
+
+async def get_slow_moving_products(
+    db: AsyncSession,
+    user_id: int,
+    slow_days: int = 90,
+    dead_days: int = 180,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+) -> dict:
+    """In-stock products not sold for `slow_days` or more, ranked by tied-up value (quantity x price).
+
+    Products never sold, or not sold for `dead_days`, are 'dead'; the rest are 'slow'.
+    Pages are keyset-paginated on (stock value, id), which the ix_products_user_stock_value
+    index serves in order, so each page costs the same however deep it is. Pass the
+    returned next_cursor to fetch the following page.
+    """
+    if dead_days < slow_days:
+        raise ValueError("dead_days must be greater than or equal to slow_days")
+    now = datetime.now(timezone.utc)
+    slow_cutoff = now - timedelta(days=slow_days)
+    dead_cutoff = now - timedelta(days=dead_days)
+    value = models.Product.quantity * models.Product.price
+
+    stmt = select(models.Product.id, models.Product.name, models.Product.sku, models.Product.quantity,
+                  models.Product.price, models.Product.last_sold_at, value).where(
+        models.Product.user_id == user_id,
+        models.Product.quantity > 0,
+        or_(models.Product.last_sold_at.is_(None), models.Product.last_sold_at < slow_cutoff),
+    )
+    if cursor:
+        last_value, last_id = _parse_stock_value_cursor(cursor)
+        # a row comparison in index order is an index range condition; the equivalent OR is not
+        stmt = stmt.where(tuple_(value, models.Product.id) < tuple_(last_value, last_id))
+    stmt = stmt.order_by(value.desc(), models.Product.id.desc()).limit(limit + 1)
+    result = await db.execute(stmt)
+    rows = result.all()
+
+    items = []
+    for product_id, name, sku, quantity, price, last_sold_at, stock_value in rows[:limit]:
+        dead = last_sold_at is None or as_naive_utc(last_sold_at) < as_naive_utc(dead_cutoff)
+        items.append({
+            "product_id": product_id,
+            "name": name,
+            "sku": sku,
+            "quantity": quantity,
+            "price": price,
+            "tied_up_value": stock_value / 100,  # price in cents to dollars
+            "last_sold_at": last_sold_at,
+            "days_since_sale": (as_naive_utc(now) - as_naive_utc(last_sold_at)).days if last_sold_at else None,
+            "status": 'dead' if dead else 'slow',
+        })
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = f"{last[6]}:{last[0]}"
+    return {"items": items, "next_cursor": next_cursor}
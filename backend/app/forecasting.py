@@ -0,0 +1,258 @@
+"""Vectorized demand forecasting for reorder suggestions.
+
+Daily sales for every product of a tenant are loaded into one dense
+(products x days) NumPy matrix, and demand, variability, days of cover,
+safety stock and reorder quantities are computed for the whole catalog at once.
+"""
+import math
+from datetime import date, datetime, timedelta
+from statistics import NormalDist
+from typing import List, Optional, Union
+
+import numpy as np
+from sqlalchemy import select, func, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, lead_times
+
+DEFAULT_LEAD_TIME_DAYS = 7
+
+
+def _as_date(value) -> date:
+    # Postgres returns date objects for date(); SQLite returns ISO strings
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+async def load_daily_sales(db: AsyncSession, user_id: int, product_ids: np.ndarray, start: date, days: int) -> np.ndarray:
+    """Return a (len(product_ids), days) float matrix of units sold per product per day.
+
+    product_ids must be sorted ascending; column 0 is `start`.
+    """
+    daily = np.zeros((len(product_ids), days), dtype=np.float64)
+    if len(product_ids) == 0 or days <= 0:
+        return daily
+    day = func.date(models.ProductSale.sale_date)
+    stmt = select(
+        models.ProductSale.product_id,
+        day,
+        func.sum(models.ProductSale.quantity),
+    ).where(
+        models.ProductSale.user_id == user_id,
+        models.ProductSale.sale_date >= datetime.combine(start, datetime.min.time()),
+    ).group_by(models.ProductSale.product_id, day)
+    result = await db.execute(stmt)
+    rows = result.all()
+    if not rows:
+        return daily
+
+    sale_products = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    sale_days = np.fromiter(((_as_date(r[1]) - start).days for r in rows), dtype=np.int64, count=len(rows))
+    quantities = np.fromiter((r[2] for r in rows), dtype=np.float64, count=len(rows))
+
+    row_idx = np.searchsorted(product_ids, sale_products)
+    row_idx = np.clip(row_idx, 0, len(product_ids) - 1)
+    keep = (product_ids[row_idx] == sale_products) & (sale_days >= 0) & (sale_days < days)
+    np.add.at(daily, (row_idx[keep], sale_days[keep]), quantities[keep])
+    return daily
+
+
+def forecast_demand(daily: np.ndarray, window: int = 28, alpha: float = 0.3) -> dict:
+    """Per-product daily demand statistics over the columns of `daily`.
+
+    Returns the moving average over the last `window` days, the simple exponential
+    smoothing level over the full history, and the demand standard deviation over the window.
+    """
+    n_days = daily.shape[1]
+    if n_days == 0:
+        zeros = np.zeros(daily.shape[0])
+        return {"moving_average": zeros, "smoothed": zeros, "std": zeros}
+    window = max(1, min(window, n_days))
+    recent = daily[:, -window:]
+    moving_average = recent.mean(axis=1)
+    std = recent.std(axis=1, ddof=1) if window > 1 else np.zeros(daily.shape[0])
+
+    # closed-form SES level: alpha * sum((1 - alpha)^k * x[t-k]) with the first
+    # observation carrying the remaining weight
+    weights = alpha * (1 - alpha) ** np.arange(n_days - 1, -1, -1, dtype=np.float64)
+    weights[0] = (1 - alpha) ** (n_days - 1)
+    smoothed = daily @ weights
+    return {"moving_average": moving_average, "smoothed": smoothed, "std": std}
+
+
+def reorder_plan(
+    quantity: np.ndarray,
+    on_order: np.ndarray,
+    threshold: np.ndarray,
+    demand: np.ndarray,
+    demand_std: np.ndarray,
+    lead_time_days: Union[float, np.ndarray] = DEFAULT_LEAD_TIME_DAYS,
+    lead_time_std: Union[float, np.ndarray] = 0.0,
+    review_days: float = 7,
+    service_level: float = 0.95,
+) -> dict:
+    """Safety stock, reorder point and suggested order quantity for every product.
+
+    Safety stock covers both demand and lead-time variability. Products without sales
+    history fall back to the threshold rule used by the dashboard (top up to 3x the
+    low-stock threshold, at least 20 units).
+    """
+    lead_time = np.broadcast_to(np.asarray(lead_time_days, dtype=np.float64), quantity.shape)
+    lead_std = np.broadcast_to(np.asarray(lead_time_std, dtype=np.float64), quantity.shape)
+    z = NormalDist().inv_cdf(service_level)
+    safety_stock = z * np.sqrt(lead_time * demand_std ** 2 + (demand * lead_std) ** 2)
+    reorder_point = demand * lead_time + safety_stock
+    order_up_to = demand * (lead_time + review_days) + safety_stock
+    position = quantity + on_order
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_of_cover = np.where(demand > 0, quantity / demand, np.inf)
+
+    has_demand = demand > 0
+    below_threshold = quantity <= threshold
+    demand_qty = np.ceil(np.maximum(order_up_to - position, 0))
+    fallback_qty = np.maximum(threshold * 3 - quantity, 20) - on_order
+    suggested = np.where(has_demand, demand_qty, np.where(below_threshold, np.maximum(fallback_qty, 0), 0))
+    needs_reorder = ((has_demand & (position <= reorder_point)) | below_threshold) & (suggested > 0)
+    return {
+        "lead_time_days": lead_time,
+        "safety_stock": safety_stock,
+        "reorder_point": reorder_point,
+        "days_of_cover": days_of_cover,
+        "suggested_quantity": suggested.astype(np.int64),
+        "needs_reorder": needs_reorder,
+    }
+
+
+async def build_suggestions(
+    db: AsyncSession,
+    user_id: int,
+    lookback_days: int = 56,
+    window: int = 28,
+    alpha: float = 0.3,
+    review_days: int = 7,
+    service_level: float = 0.95,
+    include_all: bool = False,
+    limit: Optional[int] = None,
+) -> List[dict]:
+    """Forecast demand for all of a tenant's products and return reorder suggestions, most urgent first."""
+    stmt = select(
+        models.Product.id,
+        models.Product.name,
+        models.Product.sku,
+        models.Product.supplier_id,
+        models.Product.quantity,
+        models.Product.low_stock_threshold,
+    ).where(models.Product.user_id == user_id).order_by(models.Product.id)
+    result = await db.execute(stmt)
+    products = result.all()
+    if not products:
+        return []
+
+    product_ids = np.fromiter((p[0] for p in products), dtype=np.int64, count=len(products))
+    quantity = np.fromiter((p[4] for p in products), dtype=np.float64, count=len(products))
+    threshold = np.fromiter((p[5] for p in products), dtype=np.float64, count=len(products))
+
+    # units on order: single-product pending orders plus lines of consolidated ones
+    single = select(
+        models.PurchaseOrder.product_id.label("product_id"),
+        models.PurchaseOrder.quantity_ordered.label("quantity"),
+    ).where(
+        models.PurchaseOrder.user_id == user_id,
+        models.PurchaseOrder.status == 'pending',
+        models.PurchaseOrder.product_id.is_not(None),
+    )
+    lines = select(
+        models.PurchaseOrderLine.product_id.label("product_id"),
+        models.PurchaseOrderLine.quantity_ordered.label("quantity"),
+    ).join(models.PurchaseOrder, models.PurchaseOrder.id == models.PurchaseOrderLine.purchase_order_id).where(
+        models.PurchaseOrder.user_id == user_id,
+        models.PurchaseOrder.status == 'pending',
+    )
+    pending_items = union_all(single, lines).subquery()
+    stmt = select(
+        pending_items.c.product_id,
+        func.sum(pending_items.c.quantity),
+    ).group_by(pending_items.c.product_id).order_by(pending_items.c.product_id)
+    result = await db.execute(stmt)
+    on_order = np.zeros(len(products))
+    pending = result.all()
+    if pending:
+        pending_ids = np.array([r[0] for r in pending], dtype=np.int64)
+        idx = np.clip(np.searchsorted(product_ids, pending_ids), 0, len(products) - 1)
+        keep = product_ids[idx] == pending_ids
+        on_order[idx[keep]] = np.array([r[1] for r in pending], dtype=np.float64)[keep]
+
+    # measured supplier lead times (precomputed as orders complete), default otherwise
+    lead_time = np.full(len(products), float(DEFAULT_LEAD_TIME_DAYS))
+    lead_std = np.zeros(len(products))
+    supplier_stats = await lead_times.get_lead_times(db, user_id)
+    trusted = sorted(sid for sid, row in supplier_stats.items() if row.order_count >= lead_times.MIN_SAMPLES)
+    if trusted:
+        keys = np.array(trusted, dtype=np.int64)
+        means = np.array([supplier_stats[sid].mean_days for sid in trusted])
+        stds = np.array([lead_times.std_days(supplier_stats[sid]) for sid in trusted])
+        supplier_ids = np.fromiter((p[3] or 0 for p in products), dtype=np.int64, count=len(products))
+        idx = np.clip(np.searchsorted(keys, supplier_ids), 0, len(keys) - 1)
+        hit = keys[idx] == supplier_ids
+        lead_time[hit] = means[idx[hit]]
+        lead_std[hit] = stds[idx[hit]]
+
+    start = date.today() - timedelta(days=lookback_days - 1)
+    daily = await load_daily_sales(db, user_id, product_ids, start, lookback_days)
+    stats = forecast_demand(daily, window=window, alpha=alpha)
+    plan = reorder_plan(
+        quantity, on_order, threshold,
+        demand=stats["smoothed"],
+        demand_std=stats["std"],
+        lead_time_days=lead_time,
+        lead_time_std=lead_std,
+        review_days=review_days,
+        service_level=service_level,
+    )
+
+    selected = np.arange(len(products)) if include_all else np.flatnonzero(plan["needs_reorder"])
+    # most urgent first: out of stock, then fewest days of cover
+    order = np.lexsort((plan["days_of_cover"][selected], quantity[selected] > 0))
+    selected = selected[order]
+    if limit is not None:
+        selected = selected[:limit]
+
+    suggestions = []
+    for i in selected.tolist():
+        p = products[i]
+        cover = plan["days_of_cover"][i]
+        lead_time = plan["lead_time_days"][i]
+        if not plan["needs_reorder"][i]:
+            priority, reason = "none", "Sufficient stock"
+        elif p[4] <= 0:
+            priority, reason = "critical", "Out of stock"
+        elif math.isfinite(cover) and cover < lead_time:
+            priority, reason = "high", "Runs out before resupply"
+        elif p[4] <= p[5]:
+            priority, reason = "high", "Below threshold"
+        else:
+            priority, reason = "medium", "Below reorder point"
+        suggestions.append({
+            "product_id": p[0],
+            "name": p[1],
+            "sku": p[2],
+            "supplier_id": p[3],
+            "quantity": p[4],
+            "low_stock_threshold": p[5],
+            "on_order": int(on_order[i]),
+            "daily_demand": round(float(stats["smoothed"][i]), 3),
+            "moving_average": round(float(stats["moving_average"][i]), 3),
+            "demand_std": round(float(stats["std"][i]), 3),
+            "days_of_cover": round(float(cover), 1) if math.isfinite(cover) else None,
+            "lead_time_days": round(float(lead_time), 1),
+            "safety_stock": round(float(plan["safety_stock"][i]), 1),
+            "reorder_point": round(float(plan["reorder_point"][i]), 1),
+            "suggested_quantity": int(plan["suggested_quantity"][i]),
+            "priority": priority,
+            "reason": reason,
+        })
+    return suggestions
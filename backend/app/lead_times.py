@@ -0,0 +1,122 @@
+"""Supplier lead-time statistics maintained incrementally from completed purchase orders.
+
+Each completed order contributes one sample (order_date -> received_at, in days) to its
+supplier's SupplierLeadTime row: a running mean/variance (Welford) plus a per-day
+histogram from which the 90th percentile is read, so no purchase-order scan is needed.
+"""
+import math
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .crud import dialect_insert
+from .timeutil import as_utc
+
+# Samples beyond this many days share the last histogram bucket
+MAX_HISTOGRAM_DAYS = 180
+# Minimum completed orders before a supplier's measured lead time is trusted
+MIN_SAMPLES = 3
+
+_INSERTED_COLUMNS = ('supplier_id', 'user_id', 'order_count', 'mean_days', 'm2', 'p90_days', 'histogram', 'last_received_at')
+
+
+def days_between(start: datetime, end: datetime) -> float:
+    """Elapsed days between two timestamps, treating naive values as UTC."""
+    return max((as_utc(end) - as_utc(start)).total_seconds() / 86400.0, 0.0)
+
+
+def _percentile(histogram: list, fraction: float) -> Optional[float]:
+    total = sum(histogram)
+    if total == 0:
+        return None
+    target = fraction * total
+    seen = 0
+    for day, count in enumerate(histogram):
+        seen += count
+        if seen >= target:
+            return float(day)
+    return float(len(histogram) - 1)
+
+
+async def _lock_rows(db: AsyncSession, supplier_ids: list) -> Dict[int, models.SupplierLeadTime]:
+    stmt = select(models.SupplierLeadTime).where(
+        models.SupplierLeadTime.supplier_id.in_(supplier_ids)
+    ).with_for_update()
+    result = await db.execute(stmt)
+    return {row.supplier_id: row for row in result.scalars().all()}
+
+
+def _fold(row: models.SupplierLeadTime, values: list, received_at: datetime) -> None:
+    count, mean, m2 = row.order_count or 0, row.mean_days or 0.0, row.m2 or 0.0
+    histogram = list(row.histogram or [])
+    for value in values:
+        count += 1
+        delta = value - mean
+        mean += delta / count
+        m2 += delta * (value - mean)
+        bucket = min(int(value), MAX_HISTOGRAM_DAYS)
+        if len(histogram) <= bucket:
+            histogram.extend([0] * (bucket + 1 - len(histogram)))
+        histogram[bucket] += 1
+    row.order_count = count
+    row.mean_days = mean
+    row.m2 = m2
+    # assign a new list so the JSON column change is detected
+    row.histogram = histogram
+    row.p90_days = _percentile(histogram, 0.9)
+    row.last_received_at = received_at
+
+
+async def record_completions(db: AsyncSession, completions: Iterable[Tuple[Optional[int], datetime, datetime]], user_id: Optional[int] = None) -> None:
+    """Fold (supplier_id, order_date, received_at) samples into the per-supplier statistics.
+
+    Runs inside the caller's transaction; the affected rows are read with one locked IN query.
+    A supplier's first row is inserted with ON CONFLICT DO NOTHING; when a concurrent
+    transaction created it first, its row is locked and the samples folded into that.
+    """
+    samples: Dict[int, list] = {}
+    last_received: Dict[int, datetime] = {}
+    for supplier_id, order_date, received_at in completions:
+        if supplier_id is None or order_date is None or received_at is None:
+            continue
+        samples.setdefault(supplier_id, []).append(days_between(order_date, received_at))
+        if supplier_id not in last_received or received_at > last_received[supplier_id]:
+            last_received[supplier_id] = received_at
+    if not samples:
+        return
+
+    stats = await _lock_rows(db, list(samples))
+    for supplier_id, row in stats.items():
+        _fold(row, samples[supplier_id], last_received[supplier_id])
+    missing = [supplier_id for supplier_id in samples if supplier_id not in stats]
+    if not missing:
+        return
+    new_rows = []
+    for supplier_id in missing:
+        row = models.SupplierLeadTime(supplier_id=supplier_id, user_id=user_id)
+        _fold(row, samples[supplier_id], last_received[supplier_id])
+        new_rows.append({column: getattr(row, column) for column in _INSERTED_COLUMNS})
+    stmt = dialect_insert(db, models.SupplierLeadTime).values(new_rows).on_conflict_do_nothing(
+        index_elements=['supplier_id']
+    ).returning(models.SupplierLeadTime.supplier_id)
+    inserted = set((await db.execute(stmt)).scalars().all())
+    raced = [supplier_id for supplier_id in missing if supplier_id not in inserted]
+    if raced:
+        for supplier_id, row in (await _lock_rows(db, raced)).items():
+            _fold(row, samples[supplier_id], last_received[supplier_id])
+
+
+def std_days(row: models.SupplierLeadTime) -> float:
+    if not row.order_count or row.order_count < 2:
+        return 0.0
+    return math.sqrt(row.m2 / (row.order_count - 1))
+
+
+async def get_lead_times(db: AsyncSession, user_id: int) -> Dict[int, models.SupplierLeadTime]:
+    """All of a tenant's supplier lead-time rows keyed by supplier_id."""
+    stmt = select(models.SupplierLeadTime).where(models.SupplierLeadTime.user_id == user_id)
+    result = await db.execute(stmt)
+    return {row.supplier_id: row for row in result.scalars().all()}
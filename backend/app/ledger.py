@@ -0,0 +1,143 @@
+"""Stock ledger: the single path through which product quantities change.
+
+apply_movements() takes a batch of (product_id, delta, movement type, reference)
+items and, inside the caller's transaction:
+
+- updates the affected products with UPDATE ... SET quantity = quantity + CASE ...
+  RETURNING, one statement per UPDATE_CHUNK_SIZE products, so concurrent writers
+  never lose an update;
+- derives each movement's quantity_before / quantity_after from the returned
+  quantities, walking the batch in order;
+- writes all StockMovement rows with one executemany INSERT.
+
+Callers that set an absolute quantity (edits, stock counts) read the current values
+with lock_quantities() first and pass the difference as the delta.
+"""
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+from sqlalchemy import select, insert, update, case, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+
+from . import models, versions
+from .timeutil import as_naive_utc
+
+# Products per UPDATE. Each binds up to 6 parameters (quantity CASE, last_sold_at CASE
+# and the IN list), so a statement stays well under the 32767 asyncpg accepts.
+UPDATE_CHUNK_SIZE = 3000
+
+class Movement(NamedTuple):
+    product_id: int
+    delta: int
+    movement_type: str  # 'sale', 'restock', 'adjustment'
+    reference_id: Optional[int] = None
+    reference_type: Optional[str] = None
+    notes: Optional[str] = None
+    transaction_date: Optional[datetime] = None
+
+
+class InsufficientStock(ValueError):
+    def __init__(self, product_ids: List[int]):
+        self.product_ids = product_ids
+        super().__init__(f"Insufficient stock for product(s): {', '.join(str(i) for i in product_ids)}")
+
+
+async def lock_quantities(db: AsyncSession, product_ids: Iterable[int], user_id: Optional[int] = None) -> Dict[int, int]:
+    """Current quantities of the given products, row-locked until the transaction ends."""
+    stmt = select(models.Product.id, models.Product.quantity).where(
+        models.Product.id.in_(set(product_ids))
+    ).with_for_update()
+    if user_id is not None:
+        stmt = stmt.where(models.Product.user_id == user_id)
+    result = await db.execute(stmt)
+    return dict(result.all())
+
+
+async def apply_movements(
+    db: AsyncSession,
+    movements: Sequence[Movement],
+    user_id: Optional[int] = None,
+    allow_negative: bool = True,
+) -> List[dict]:
+    """Apply a batch of stock movements atomically and record them; returns the inserted movement rows.
+
+    Zero deltas are ignored. With allow_negative=False each UPDATE only matches products
+    that stay at or above zero, and InsufficientStock is raised for the others (the
+    caller should roll back). Sales also advance products.last_sold_at. Products already
+    loaded in the session get their new quantity without being expired. Does not commit.
+    """
+    movements = [m for m in movements if m.delta]
+    if not movements:
+        return []
+    totals: Dict[int, int] = {}
+    sold_at: Dict[int, datetime] = {}
+    for m in movements:
+        totals[m.product_id] = totals.get(m.product_id, 0) + m.delta
+        if m.movement_type == 'sale':
+            when = m.transaction_date or datetime.now()
+            if m.product_id not in sold_at or as_naive_utc(when) > as_naive_utc(sold_at[m.product_id]):
+                sold_at[m.product_id] = when
+
+    updated = {}
+    product_ids = list(totals)
+    for start in range(0, len(product_ids), UPDATE_CHUNK_SIZE):
+        chunk = product_ids[start:start + UPDATE_CHUNK_SIZE]
+        increment = case({product_id: totals[product_id] for product_id in chunk}, value=models.Product.id)
+        values = {"quantity": models.Product.quantity + increment}
+        chunk_sold_at = [(product_id, sold_at[product_id]) for product_id in chunk if product_id in sold_at]
+        if chunk_sold_at:
+            # backdated sales never move last_sold_at backwards
+            values["last_sold_at"] = case(
+                *[
+                    (and_(models.Product.id == product_id,
+                          or_(models.Product.last_sold_at.is_(None), models.Product.last_sold_at < when)), when)
+                    for product_id, when in chunk_sold_at
+                ],
+                else_=models.Product.last_sold_at,
+            )
+        stmt = update(models.Product).where(models.Product.id.in_(chunk)).values(**values)
+        if user_id is not None:
+            stmt = stmt.where(models.Product.user_id == user_id)
+        if not allow_negative:
+            stmt = stmt.where(models.Product.quantity + increment >= 0)
+        stmt = stmt.returning(models.Product.id, models.Product.quantity, models.Product.last_updated, models.Product.last_sold_at, models.Product.user_id)
+        result = await db.execute(stmt.execution_options(synchronize_session=False))
+        chunk_updated = {row[0]: row for row in result.all()}
+        for owner in {row[4] for row in chunk_updated.values()}:
+            versions.touch(db, owner, 'products')
+
+        missing = [product_id for product_id in chunk if product_id not in chunk_updated]
+        if missing:
+            raise InsufficientStock(missing)
+        updated.update(chunk_updated)
+
+    # keep products already in the session in step with the new values
+    for product_id, quantity, last_updated, last_sold, _ in updated.values():
+        product = db.sync_session.identity_map.get(identity_key(models.Product, product_id))
+        if product is not None:
+            set_committed_value(product, 'quantity', quantity)
+            set_committed_value(product, 'last_updated', last_updated)
+            set_committed_value(product, 'last_sold_at', last_sold)
+
+    # walk each product's movements forward from its pre-batch quantity
+    running = {product_id: updated[product_id][1] - total for product_id, total in totals.items()}
+    rows = []
+    for m in movements:
+        before = running[m.product_id]
+        running[m.product_id] = before + m.delta
+        rows.append({
+            "product_id": m.product_id,
+            "user_id": user_id,
+            "movement_type": m.movement_type,
+            "quantity_change": m.delta,
+            "quantity_before": before,
+            "quantity_after": before + m.delta,
+            "reference_id": m.reference_id,
+            "reference_type": m.reference_type,
+            "notes": m.notes,
+            "transaction_date": m.transaction_date,
+        })
+    await db.execute(insert(models.StockMovement), rows)
+    return rows
@@ -0,0 +1,99 @@
+"""In-process per-tenant lookup index: category name -> id, supplier name -> id.
+
+Each map is loaded for a tenant on first use with one query and kept for the
+LOOKUP_INDEX_TENANTS most recently used tenants. crud keeps the maps in step with
+every create / update / delete of categories and suppliers, so resolving the
+category and supplier names of a CSV row is a dictionary lookup that never reads
+the row. Keys missing from a map are looked up in the database.
+
+Writes made by other processes (another worker, a batch job) are not seen until the
+map is reloaded, which happens once it is LOOKUP_INDEX_MAX_AGE_SECONDS old; until then
+an id may name a row renamed meanwhile (a deleted one is rejected by the ownership
+check of the write using it).
+
+Products are not indexed by SKU: every caller reads the product's stock and price,
+so the row is read anyway, with one query on unique_sku_per_user.
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+
+MAX_TENANTS = int(os.getenv('LOOKUP_INDEX_TENANTS', '256'))
+MAX_AGE_SECONDS = float(os.getenv('LOOKUP_INDEX_MAX_AGE_SECONDS', '60'))
+
+# kind -> (model, key column)
+KINDS = {
+    'category': (models.ProductCategory, 'name'),
+    'supplier': (models.Supplier, 'name'),
+}
+
+
+class _TenantIndex:
+    def __init__(self):
+        self.maps: Dict[str, Dict[str, int]] = {}
+        self.loaded_at: Dict[str, float] = {}
+        # bumped on invalidation so a load that raced with a write is not kept
+        self.versions: Dict[str, int] = dict.fromkeys(KINDS, 0)
+
+
+_tenants: 'OrderedDict[int, _TenantIndex]' = OrderedDict()
+
+
+def _tenant(user_id: int) -> _TenantIndex:
+    index = _tenants.get(user_id)
+    if index is None:
+        index = _tenants[user_id] = _TenantIndex()
+        while len(_tenants) > MAX_TENANTS:
+            _tenants.popitem(last=False)
+    else:
+        _tenants.move_to_end(user_id)
+    return index
+
+
+async def resolve(db: AsyncSession, user_id: int, kind: str, key: str) -> Optional[int]:
+    """Id of the tenant's row with this SKU / name according to the index, loading the map if needed."""
+    index = _tenant(user_id)
+    mapping = index.maps.get(kind)
+    if mapping is not None and time.monotonic() - index.loaded_at[kind] > MAX_AGE_SECONDS:
+        # pick up writes made by other processes
+        mapping = None
+    if mapping is None:
+        version = index.versions[kind]
+        loaded_at = time.monotonic()
+        model, column = KINDS[kind]
+        key_column = getattr(model, column)
+        stmt = select(key_column, model.id).where(model.user_id == user_id, key_column.is_not(None))
+        mapping = dict((await db.execute(stmt)).all())
+        if index.versions[kind] == version:
+            index.maps[kind] = mapping
+            index.loaded_at[kind] = loaded_at
+    return mapping.get(key)
+
+
+def put(user_id: int, kind: str, key: Optional[str], obj_id: int) -> None:
+    """Record a key -> id mapping (no-op while the tenant's map is not loaded)."""
+    index = _tenants.get(user_id)
+    if index is not None and key is not None and kind in index.maps:
+        index.maps[kind][key] = obj_id
+
+
+def discard(user_id: int, kind: str, key: Optional[str]) -> None:
+    index = _tenants.get(user_id)
+    if index is not None and key is not None and kind in index.maps:
+        index.maps[kind].pop(key, None)
+
+
+def invalidate(user_id: int, kind: Optional[str] = None) -> None:
+    """Drop the tenant's map of `kind` (all maps when None); it is reloaded on next use."""
+    index = _tenants.get(user_id)
+    if index is None:
+        return
+    for name in ([kind] if kind else list(KINDS)):
+        index.maps.pop(name, None)
+        index.versions[name] += 1
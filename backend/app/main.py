@@ -1,9 +1,9 @@
 from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.ext.asyncio import AsyncEngine
-from . import crud, models, schemas
+from . import crud, models, schemas, partitions, versions
 from .database import engine, Base, get_db
-from .routers import products, suppliers, product_categories, product_sales, users, email, restock
+from .routers import products, suppliers, product_categories, product_sales, users, email, restock, sync
 import os
 
 # Use debug mode only in development
@@ -15,6 +15,8 @@ app = FastAPI(title="Stock Management API", debug=debug_mode)
 async def on_startup():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        # keep monthly partitions of the sales / movement tables ahead of time (Postgres)
+        await conn.run_sync(partitions.ensure_partitions)
 
 
 # include routers
@@ -25,6 +27,10 @@ app.include_router(product_sales.router)
 app.include_router(users.router)
 app.include_router(email.router)
 app.include_router(restock.router)
+app.include_router(sync.router)
+
+# read-your-writes: a write's response waits for its cache version bumps
+app.add_middleware(versions.FlushVersions)
 
 app.add_middleware(
     CORSMiddleware,
@@ -32,4 +38,6 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # let the dashboard read ETags for conditional polling
+    expose_headers=["ETag"],
 )
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, Numeric, Text, DateTime, ForeignKey, Boolean, UniqueConstraint
-from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy import DDL, event, null, BigInteger, Column, Integer, String, Numeric, Text, Date, DateTime, ForeignKey, Boolean, UniqueConstraint, Float, JSON, Index
+from sqlalchemy.sql import func, or_
+from sqlalchemy.orm import relationship, backref
 from .database import Base
 
 
@@ -12,14 +12,29 @@ class Supplier(Base):
     email = Column(String(255), nullable=True)
     phone = Column(String(64), nullable=True)
     address = Column(Text, nullable=True)
+    # Reorder consolidation: minimum units per order and the pack size line quantities round up to
+    min_order_quantity = Column(Integer, nullable=False, default=0, server_default='0')
+    pack_size = Column(Integer, nullable=False, default=1, server_default='1')
     user_id = Column(Integer, ForeignKey('users.id'), nullable=True, index=True)
+    last_updated = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    # delta-sync position (app/sync.py): cleared by every write, stamped at commit
+    sync_seq = Column(BigInteger, nullable=True, default=null(), onupdate=null())
 
     user = relationship('User', backref='suppliers')
     
     # Unique constraint per user (allows same supplier name across different users)
     __table_args__ = (
         UniqueConstraint('name', 'user_id', name='unique_supplier_per_user'),
+        # delta sync (app/sync.py) keyset
+        Index('ix_suppliers_user_sync_seq', 'user_id', 'sync_seq', 'id'),
     )
+    # Fetch server-generated last_updated with INSERT/UPDATE ... RETURNING
+    __mapper_args__ = {'eager_defaults': True}
+
+
+def product_search_document(name, sku, description):
+    """Name, SKU and description as one string, the expression trigram search indexes and queries."""
+    return name + ' ' + func.coalesce(sku, '') + ' ' + func.coalesce(description, '')
 
 
 class Product(Base):
@@ -36,6 +51,12 @@ class Product(Base):
     supplier_id = Column(Integer, ForeignKey('suppliers.id'), nullable=True, index=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=True, index=True)
     last_updated = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    # null on products older than the column whose history had no movements left to date them
+    created_at = Column(DateTime(timezone=True), nullable=True, server_default=func.now())
+    # delta-sync position (app/sync.py): cleared by every write, stamped at commit
+    sync_seq = Column(BigInteger, nullable=True, default=null(), onupdate=null())
+    # Latest sale date, advanced on every recorded sale (read by the dead-stock report)
+    last_sold_at = Column(DateTime(timezone=True), nullable=True)
 
     supplier = relationship('Supplier', backref='products')
     category = relationship('ProductCategory', backref='products')
@@ -44,7 +65,30 @@ class Product(Base):
     # Unique constraint per user (allows same SKU across different users)
     __table_args__ = (
         UniqueConstraint('sku', 'user_id', name='unique_sku_per_user'),
+        # Stock value (quantity x price) ordering for the keyset-paginated dead-stock report
+        Index('ix_products_user_stock_value', 'user_id', (quantity * price).self_group().desc(), id.desc()),
+        # Low-stock / out-of-stock products only (restock summary); small next to the table
+        Index(
+            'ix_products_user_low_stock', 'user_id', 'quantity', 'low_stock_threshold',
+            postgresql_where=or_(quantity <= low_stock_threshold, quantity <= 0),
+            sqlite_where=or_(quantity <= low_stock_threshold, quantity <= 0),
+        ),
+        # Product search (app.search): trigram GIN over the tenant's search documents, with
+        # user_id in the same index via btree_gin. Postgres only; SQLite searches in process.
+        Index(
+            'ix_products_search_trgm', 'user_id', product_search_document(name, sku, description).label('search_document'),
+            postgresql_using='gin', postgresql_ops={'search_document': 'gin_trgm_ops'},
+        ).ddl_if(dialect='postgresql'),
+        # delta sync (app/sync.py) keyset
+        Index('ix_products_user_sync_seq', 'user_id', 'sync_seq', 'id'),
     )
+    # Fetch server-generated id / last_updated with INSERT/UPDATE ... RETURNING
+    __mapper_args__ = {'eager_defaults': True}
+
+
+# trigram operator class and btree_gin's integer GIN support for ix_products_search_trgm
+event.listen(Product.__table__, 'before_create', DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+event.listen(Product.__table__, 'before_create', DDL('CREATE EXTENSION IF NOT EXISTS btree_gin').execute_if(dialect='postgresql'))
 
 
 class ProductCategory(Base):
@@ -54,16 +98,25 @@ class ProductCategory(Base):
     name = Column(String(128), nullable=False, index=True)
     description = Column(Text, nullable=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=True, index=True)
+    last_updated = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    # delta-sync position (app/sync.py): cleared by every write, stamped at commit
+    sync_seq = Column(BigInteger, nullable=True, default=null(), onupdate=null())
 
     user = relationship('User', backref='product_categories')
 
     # Unique constraint per user (allows same category name across different users)
     __table_args__ = (
         UniqueConstraint('name', 'user_id', name='unique_category_per_user'),
+        # delta sync (app/sync.py) keyset
+        Index('ix_product_categories_user_sync_seq', 'user_id', 'sync_seq', 'id'),
     )
+    # Fetch server-generated last_updated with INSERT/UPDATE ... RETURNING
+    __mapper_args__ = {'eager_defaults': True}
 
 
 class ProductSale(Base):
+    # On Postgres this is partitioned by month on sale_date, with primary key
+    # (id, sale_date); see app/partitions.py. ids remain unique (one sequence).
     __tablename__ = 'product_sales'
 
     id = Column(Integer, primary_key=True, index=True)
@@ -71,14 +124,29 @@ class ProductSale(Base):
     user_id = Column(Integer, ForeignKey('users.id'), nullable=True, index=True)
     quantity = Column(Integer, nullable=False)
     sale_price = Column(Numeric(12, 2), nullable=False)
-    sale_date = Column(DateTime(timezone=True), server_default=func.now())
+    sale_date = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
     
     # ORM relationships
     product = relationship('Product', backref='sales')
     user = relationship('User', backref='product_sales')
 
+    __table_args__ = (
+        # per-product sales history, answered from the index alone on Postgres
+        Index(
+            'ix_product_sales_product_user_date', 'product_id', 'user_id', sale_date.desc(),
+            postgresql_include=['id', 'quantity', 'sale_price'],
+        ),
+        # per-tenant sales windows (forecasting, classification)
+        Index('ix_product_sales_user_date', 'user_id', 'sale_date', postgresql_include=['product_id', 'quantity', 'sale_price']),
+        # rows arrive roughly in date order, so BRIN serves cross-tenant date ranges (e.g. moving rows
+        # out of the DEFAULT partition) at a tiny fraction of a btree's size
+        Index('ix_product_sales_sale_date_brin', 'sale_date', postgresql_using='brin'),
+    )
+
 
 class StockMovement(Base):
+    # On Postgres this is partitioned by month on created_at, with primary key
+    # (id, created_at); see app/partitions.py.
     __tablename__ = 'stock_movements'
 
     id = Column(Integer, primary_key=True, index=True)
@@ -92,12 +160,20 @@ class StockMovement(Base):
     reference_type = Column(String(50), nullable=True)  # 'sale', 'purchase_order', 'manual_adjustment'
     notes = Column(Text, nullable=True)
     transaction_date = Column(DateTime(timezone=True), nullable=True)  # Actual date of the transaction (sale date, etc.)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
     
     # ORM relationships
     product = relationship('Product', backref='stock_movements')
     user = relationship('User', backref='stock_movements')
 
+    __table_args__ = (
+        # time-bounded ledger tails (stock as of a date, reconciliation)
+        Index('ix_stock_movements_user_created', 'user_id', 'created_at'),
+        # per-product movement history
+        Index('ix_stock_movements_product_user_created', 'product_id', 'user_id', created_at.desc()),
+        Index('ix_stock_movements_created_brin', 'created_at', postgresql_using='brin'),
+    )
+
 
 class PurchaseOrder(Base):
     __tablename__ = 'purchase_orders'
@@ -105,10 +181,12 @@ class PurchaseOrder(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
     supplier_id = Column(Integer, ForeignKey('suppliers.id'), nullable=True, index=True)
-    product_id = Column(Integer, ForeignKey('products.id'), nullable=False, index=True)
-    quantity_ordered = Column(Integer, nullable=False)
+    # NULL for consolidated multi-line orders, whose products live in purchase_order_lines
+    product_id = Column(Integer, ForeignKey('products.id'), nullable=True, index=True)
+    quantity_ordered = Column(Integer, nullable=False)  # total units across lines for multi-line orders
     status = Column(String(50), nullable=False, default='pending')  # pending, completed, cancelled
     order_date = Column(DateTime(timezone=True), server_default=func.now())
+    received_at = Column(DateTime(timezone=True), nullable=True)  # set when the order is completed
     notes = Column(Text, nullable=True)
     notify_by_email = Column(Boolean, nullable=False, default=False)
     # Supplier rating fields (filled by user when order is completed)
@@ -122,6 +200,158 @@ class PurchaseOrder(Base):
     supplier = relationship('Supplier', backref='purchase_orders')
     product = relationship('Product', backref='purchase_orders')
 
+    __table_args__ = (
+        # order list filtered by status, newest first; pending counts/values in the restock summary
+        Index('ix_purchase_orders_user_status_date', 'user_id', 'status', order_date.desc()),
+    )
+    # Fetch server-generated id / order_date with INSERT ... RETURNING
+    __mapper_args__ = {'eager_defaults': True}
+
+
+class PurchaseOrderLine(Base):
+    __tablename__ = 'purchase_order_lines'
+
+    id = Column(Integer, primary_key=True, index=True)
+    purchase_order_id = Column(Integer, ForeignKey('purchase_orders.id', ondelete='CASCADE'), nullable=False, index=True)
+    product_id = Column(Integer, ForeignKey('products.id'), nullable=False, index=True)
+    quantity_ordered = Column(Integer, nullable=False)
+    unit_price = Column(Integer, nullable=True)  # product price (cents) when the order was placed
+
+    # ORM relationships
+    purchase_order = relationship('PurchaseOrder', backref=backref('lines', cascade='all, delete-orphan', order_by='PurchaseOrderLine.id'))
+    product = relationship('Product', backref='purchase_order_lines')
+
+
+class SupplierLeadTime(Base):
+    """Per-supplier lead-time distribution, updated incrementally as purchase orders complete."""
+    __tablename__ = 'supplier_lead_times'
+
+    supplier_id = Column(Integer, ForeignKey('suppliers.id', ondelete='CASCADE'), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=True, index=True)
+    order_count = Column(Integer, nullable=False, default=0)
+    mean_days = Column(Float, nullable=False, default=0.0)
+    m2 = Column(Float, nullable=False, default=0.0)  # running sum of squared deviations (Welford)
+    p90_days = Column(Float, nullable=True)
+    histogram = Column(JSON, nullable=False, default=list)  # order counts per whole day of lead time
+    last_received_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class SupplierScorecard(Base):
+    """Per-supplier rating aggregates, updated incrementally when purchase orders are rated."""
+    __tablename__ = 'supplier_scorecards'
+
+    supplier_id = Column(Integer, ForeignKey('suppliers.id', ondelete='CASCADE'), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=True, index=True)
+    on_time_delivery_sum = Column(Integer, nullable=False, default=0)
+    on_time_delivery_count = Column(Integer, nullable=False, default=0)
+    quality_score_sum = Column(Integer, nullable=False, default=0)
+    quality_score_count = Column(Integer, nullable=False, default=0)
+    cost_efficiency_sum = Column(Integer, nullable=False, default=0)
+    cost_efficiency_count = Column(Integer, nullable=False, default=0)
+    overall_rating_sum = Column(Integer, nullable=False, default=0)
+    overall_rating_count = Column(Integer, nullable=False, default=0)
+    recent_overall_rating = Column(Float, nullable=True)  # exponentially weighted, newest ratings count most
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+
+class ProductClassification(Base):
+    """ABC (revenue concentration) and XYZ (demand variability) class per product, recomputed by a batch job."""
+    __tablename__ = 'product_classifications'
+
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=True, index=True)
+    abc_class = Column(String(1), nullable=False)
+    xyz_class = Column(String(1), nullable=False)
+    revenue = Column(Numeric(14, 2), nullable=False, default=0)
+    revenue_share = Column(Float, nullable=False, default=0.0)
+    cumulative_share = Column(Float, nullable=False, default=0.0)  # share of revenue up to and including this product
+    units_sold = Column(Integer, nullable=False, default=0)
+    demand_cv = Column(Float, nullable=True)  # coefficient of variation of per-period demand; null without sales
+    computed_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index('ix_product_classifications_user_classes', 'user_id', 'abc_class', 'xyz_class'),
+    )
+
+
+class InventorySnapshot(Base):
+    """Per-product stock level checkpoint, taken at most once per tenant per day."""
+    __tablename__ = 'inventory_snapshots'
+
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    snapshot_date = Column(Date, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=True)
+    quantity = Column(Integer, nullable=False)
+    taken_at = Column(DateTime(timezone=True), nullable=False)
+    # highest stock_movements.id included; null on snapshots taken before it was recorded
+    last_movement_id = Column(Integer, nullable=True)
+
+    __table_args__ = (
+        Index('ix_inventory_snapshots_user_date', 'user_id', 'snapshot_date'),
+    )
+
+
+class LedgerWatermark(Base):
+    """Per-tenant progress of the stock-ledger reconciliation job."""
+    __tablename__ = 'ledger_watermarks'
+
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    last_movement_id = Column(Integer, nullable=False, default=0)  # movements up to this id have been checked
+    discrepancies = Column(Integer, nullable=False, default=0)  # found by the latest run
+    checked_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class ProductLedgerState(Base):
+    """Latest reconciled stock-movement per product, continued from on the next run."""
+    __tablename__ = 'product_ledger_states'
+
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=True, index=True)
+    last_movement_id = Column(Integer, nullable=False)
+    last_quantity_after = Column(Integer, nullable=False)
+
+
+class ProductSalesMonthly(Base):
+    """Monthly sales totals of archived product_sales rows (see app/archive.py)."""
+    __tablename__ = 'product_sales_monthly'
+
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    month = Column(Date, primary_key=True)  # first day of the month
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=True)
+    sale_count = Column(Integer, nullable=False, default=0)
+    units_sold = Column(Integer, nullable=False, default=0)
+    revenue = Column(Numeric(14, 2), nullable=False, default=0)
+
+    __table_args__ = (
+        Index('ix_product_sales_monthly_user_month', 'user_id', 'month'),
+    )
+
+
+class SyncTombstone(Base):
+    """Deleted product / supplier / category, reported to delta-sync clients (see app/sync.py)."""
+    __tablename__ = 'sync_tombstones'
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=True)
+    entity = Column(String(32), nullable=False)  # 'product', 'supplier' or 'category'
+    entity_id = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    sync_seq = Column(BigInteger, nullable=True)
+
+    __table_args__ = (
+        Index('ix_sync_tombstones_user_sync_seq', 'user_id', 'sync_seq', 'id'),
+    )
+
+
+class SyncCounter(Base):
+    """Per-tenant delta-sync sequence, advanced once by every committing write (see app/sync.py)."""
+    __tablename__ = 'sync_counters'
+
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    seq = Column(BigInteger, nullable=False, default=0)
+
 
 class User(Base):
     __tablename__ = 'users'
@@ -0,0 +1,111 @@
+"""Monthly range partitions for product_sales and stock_movements (Postgres only).
+
+The tables are converted to partitioned tables by the partition_sales_and_movements
+migration. Each month has its own partition (e.g. product_sales_y2025m10) and a
+DEFAULT partition catches rows outside the created range, such as heavily backdated
+sales. ensure_partitions() creates the partitions for the coming months; it runs on
+startup and can be scheduled with `python -m app.partitions`. On other databases
+(SQLite in development) everything here is a no-op.
+
+The functions take a synchronous Connection so they serve both Alembic migrations and
+the async engine (via `conn.run_sync`).
+"""
+import asyncio
+from datetime import date
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+# partitioned table -> partition key column
+PARTITIONED_TABLES = {
+    'product_sales': 'sale_date',
+    'stock_movements': 'created_at',
+}
+# Partitions are kept this many months ahead of the current one
+MONTHS_AHEAD = 3
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_y{month.year:04d}m{month.month:02d}"
+
+
+def is_partitioned(conn: Connection, table: str) -> bool:
+    if conn.dialect.name != 'postgresql':
+        return False
+    stmt = text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = :table AND c.relnamespace = current_schema()::regnamespace"
+    )
+    return conn.execute(stmt, {"table": table}).first() is not None
+
+
+def create_month_partition(conn: Connection, table: str, month: date) -> Optional[str]:
+    """Create the partition of `table` for the month starting at `month`; returns its name if created.
+
+    Rows for that month already sitting in the DEFAULT partition are moved into the new
+    partition (Postgres refuses to create a partition whose rows live in the default).
+    """
+    name = partition_name(table, month)
+    exists = conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar()
+    if exists is not None:
+        return None
+    key = PARTITIONED_TABLES[table]
+    start, end = month, add_months(month, 1)
+    bounds = f"FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    default = f"{table}_default"
+    has_default = conn.execute(text("SELECT to_regclass(:name)"), {"name": default}).scalar() is not None
+    stranded = has_default and conn.execute(
+        text(f"SELECT 1 FROM {default} WHERE {key} >= :start AND {key} < :end LIMIT 1"),
+        {"start": start, "end": end},
+    ).first() is not None
+    if not stranded:
+        conn.execute(text(f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES {bounds}"))
+        return name
+    conn.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    conn.execute(text(
+        f"WITH moved AS (DELETE FROM {default} WHERE {key} >= :start AND {key} < :end RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), {"start": start, "end": end})
+    conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES {bounds}"))
+    return name
+
+
+def ensure_partitions(conn: Connection, months_ahead: int = MONTHS_AHEAD, start: Optional[date] = None) -> List[str]:
+    """Create any missing monthly partitions from `start` (default: this month) to `months_ahead` months later."""
+    created = []
+    if conn.dialect.name != 'postgresql':
+        return created
+    first = month_start(start or date.today())
+    last = add_months(month_start(date.today()), months_ahead)
+    for table in PARTITIONED_TABLES:
+        if not is_partitioned(conn, table):
+            continue
+        month = first
+        while month <= last:
+            name = create_month_partition(conn, table, month)
+            if name:
+                created.append(name)
+            month = add_months(month, 1)
+    return created
+
+
+async def run() -> None:
+    from .database import engine
+
+    async with engine.begin() as conn:
+        created = await conn.run_sync(ensure_partitions)
+    print(f"created {len(created)} partitions" + (f": {', '.join(created)}" if created else ""))
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,200 @@
+"""Stock-ledger reconciliation.
+
+Checks, for a whole tenant at once, that the stock_movements ledger is internally
+consistent and agrees with products.quantity:
+
+- every movement satisfies quantity_after = quantity_before + quantity_change;
+- every movement starts where the product's previous movement ended;
+- each product's quantity equals the quantity_after of its latest movement.
+
+Runs are incremental: movements up to the tenant's stored watermark have already been
+checked, and each product's last reconciled quantity_after is kept in
+product_ledger_states, so a run reads only the movements recorded since the last one
+(with window functions, in one query). Products that never had a movement have
+nothing to reconcile against and are skipped.
+
+Run for every tenant with `python -m app.reconciliation` (add `--fix` to correct drift).
+"""
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, insert, func, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+
+# Movements younger than this are left for the next run, so transactions still in
+# flight (whose ids may be lower than committed ones) are never skipped.
+SETTLE_SECONDS = 60
+
+
+async def reconcile(db: AsyncSession, user_id: int, fix: bool = False, settle_seconds: int = SETTLE_SECONDS) -> dict:
+    """Reconcile the tenant's ledger from its watermark and return the discrepancies found.
+
+    With fix=True each drifted product gets an 'adjustment' movement that brings the
+    ledger to products.quantity (the quantity is taken as authoritative). Broken
+    movement chains are only reported.
+    """
+    movement = models.StockMovement
+    stmt = select(models.LedgerWatermark).where(models.LedgerWatermark.user_id == user_id).with_for_update()
+    result = await db.execute(stmt)
+    watermark = result.scalars().first()
+    if watermark is None:
+        watermark = models.LedgerWatermark(user_id=user_id, last_movement_id=0, discrepancies=0)
+        db.add(watermark)
+    start_id = watermark.last_movement_id or 0
+
+    now = datetime.now(timezone.utc)
+    stmt = select(func.max(movement.id)).where(
+        movement.user_id == user_id,
+        movement.id > start_id,
+        movement.created_at <= now - timedelta(seconds=settle_seconds),
+    )
+    end_id = (await db.execute(stmt)).scalar() or start_id
+
+    breaks = []
+    checked = 0
+    if end_id > start_id:
+        by_product = {"partition_by": movement.product_id}
+        tail = select(
+            movement.id,
+            movement.product_id,
+            movement.quantity_change,
+            movement.quantity_before,
+            movement.quantity_after,
+            func.lag(movement.quantity_after).over(order_by=movement.id, **by_product).label('previous_after'),
+            func.row_number().over(order_by=movement.id, **by_product).label('first_rank'),
+            func.row_number().over(order_by=movement.id.desc(), **by_product).label('last_rank'),
+            func.count().over().label('checked'),
+        ).where(
+            movement.user_id == user_id,
+            movement.id > start_id,
+            movement.id <= end_id,
+        ).subquery()
+        # only each product's first/last movement in the range and the inconsistent ones come back
+        stmt = select(tail).where(or_(
+            tail.c.first_rank == 1,
+            tail.c.last_rank == 1,
+            tail.c.quantity_after != tail.c.quantity_before + tail.c.quantity_change,
+            and_(tail.c.previous_after.is_not(None), tail.c.quantity_before != tail.c.previous_after),
+        )).order_by(tail.c.id)
+        result = await db.execute(stmt)
+        rows = result.all()
+
+        product_ids = {row.product_id for row in rows}
+        stmt = select(models.ProductLedgerState).where(
+            models.ProductLedgerState.product_id.in_(product_ids)
+        ).with_for_update()
+        result = await db.execute(stmt)
+        states = {state.product_id: state for state in result.scalars().all()}
+
+        for row in rows:
+            checked = row.checked
+            if row.quantity_after != row.quantity_before + row.quantity_change:
+                breaks.append({
+                    "movement_id": row.id,
+                    "product_id": row.product_id,
+                    "kind": 'arithmetic',
+                    "expected": row.quantity_before + row.quantity_change,
+                    "actual": row.quantity_after,
+                })
+            expected_before = row.previous_after
+            if row.first_rank == 1 and row.product_id in states:
+                expected_before = states[row.product_id].last_quantity_after
+            if expected_before is not None and row.quantity_before != expected_before:
+                breaks.append({
+                    "movement_id": row.id,
+                    "product_id": row.product_id,
+                    "kind": 'gap',
+                    "expected": expected_before,
+                    "actual": row.quantity_before,
+                })
+        for row in rows:
+            if row.last_rank != 1:
+                continue
+            state = states.get(row.product_id)
+            if state is None:
+                state = models.ProductLedgerState(product_id=row.product_id, user_id=user_id)
+                db.add(state)
+            state.last_movement_id = row.id
+            state.last_quantity_after = row.quantity_after
+        await db.flush()
+
+    # drift: products whose quantity disagrees with their ledger, skipping products
+    # with movements still waiting to settle (they are checked on a later run)
+    unsettled = select(movement.product_id).where(movement.user_id == user_id, movement.id > end_id)
+    stmt = select(
+        models.Product.id,
+        models.Product.name,
+        models.Product.sku,
+        models.Product.quantity,
+        models.ProductLedgerState.last_quantity_after,
+    ).join(
+        models.ProductLedgerState, models.ProductLedgerState.product_id == models.Product.id
+    ).where(
+        models.Product.user_id == user_id,
+        models.Product.quantity != models.ProductLedgerState.last_quantity_after,
+        models.Product.id.not_in(unsettled),
+    ).order_by(models.Product.id)
+    result = await db.execute(stmt)
+    drift = [
+        {
+            "product_id": product_id,
+            "name": name,
+            "sku": sku,
+            "quantity": quantity,
+            "ledger_quantity": ledger_quantity,
+            "difference": quantity - ledger_quantity,
+            "fixed": fix,
+        }
+        for product_id, name, sku, quantity, ledger_quantity in result.all()
+    ]
+
+    if fix and drift:
+        await db.execute(insert(models.StockMovement), [
+            {
+                "product_id": item["product_id"],
+                "user_id": user_id,
+                "movement_type": 'adjustment',
+                "quantity_change": item["difference"],
+                "quantity_before": item["ledger_quantity"],
+                "quantity_after": item["quantity"],
+                "reference_type": 'reconciliation',
+                "notes": f"Ledger reconciliation: ledger {item['ledger_quantity']}, stock {item['quantity']}",
+                "transaction_date": now,
+            }
+            for item in drift
+        ])
+
+    watermark.last_movement_id = end_id
+    watermark.discrepancies = len(breaks) + len(drift)
+    watermark.checked_at = now
+    await db.commit()
+    return {
+        "checked_movements": checked,
+        "watermark": end_id,
+        "chain_breaks": breaks,
+        "drift": drift,
+        "checked_at": now,
+    }
+
+
+async def run_all(fix: bool = False) -> None:
+    """Reconcile every tenant's ledger."""
+    from .database import async_session
+
+    async with async_session() as db:
+        result = await db.execute(select(models.User.id).order_by(models.User.id))
+        user_ids = result.scalars().all()
+    for user_id in user_ids:
+        async with async_session() as db:
+            report = await reconcile(db, user_id, fix=fix)
+        print(
+            f"user {user_id}: checked {report['checked_movements']} movements, "
+            f"{len(report['chain_breaks'])} chain breaks, {len(report['drift'])} drifted products"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(run_all(fix='--fix' in sys.argv[1:]))
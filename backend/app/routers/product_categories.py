@@ -1,7 +1,7 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from .. import models, schemas, crud
+from .. import models, schemas, crud, versions, cache
 from ..database import get_db
 from sqlalchemy import select
 from ..security import get_current_user
@@ -48,15 +48,24 @@ async def create_category(cat: schemas.ProductCategoryCreate, db: AsyncSession =
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@router.get("/", response_model=List[schemas.ProductCategoryOut])
-async def list_categories(db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    result = await db.execute(select(models.ProductCategory).where(models.ProductCategory.user_id == current_user.id))
-    return result.scalars().all()
+@router.get("/", response_model=List[schemas.ProductCategoryOut], dependencies=[Depends(versions.conditional('categories'))])
+async def list_categories(request: Request, response: Response, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    async def load():
+        result = await db.execute(select(models.ProductCategory).where(models.ProductCategory.user_id == current_user.id))
+        return result.scalars().all()
+    return await cache.respond(request, response, current_user.id, ('categories',), List[schemas.ProductCategoryOut], load)
 
 @router.post("/upload")
-async def upload_categories_csv(file: UploadFile = File(...), db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    """Upload a CSV file with category rows. Expected headers: name, description"""
-    
+async def upload_categories_csv(file: UploadFile = File(...), on_conflict: str = Form('skip'), db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    """Upload a CSV file with category rows. Expected headers: name, description
+
+    Rows are written in chunks with INSERT ... ON CONFLICT on (name, user_id).
+    on_conflict=skip (default) reports existing names as errors and leaves them untouched;
+    on_conflict=update overwrites the description when it is present in the CSV header.
+    """
+    if on_conflict not in ('skip', 'update'):
+        raise HTTPException(status_code=400, detail="on_conflict must be 'skip' or 'update'")
+
     # Capture user_id early to avoid async context issues
     user_id = current_user.id
 
@@ -70,7 +79,8 @@ async def upload_categories_csv(file: UploadFile = File(...), db: AsyncSession =
     if reader.fieldnames is None:
         raise HTTPException(status_code=400, detail="CSV file must have a header row")
 
-    results = []
+    results = {}
+    pending = {}  # name -> (row_no, schema); first occurrence wins
     row_no = 1
     for row in reader:
         row_no += 1
@@ -79,14 +89,23 @@ async def upload_categories_csv(file: UploadFile = File(...), db: AsyncSession =
         try:
             c_schema = schemas.ProductCategoryCreate.model_validate(data)
         except Exception as e:
-            results.append({"row": row_no, "ok": False, "error": f"Validation error: {e}"})
+            results[row_no] = {"row": row_no, "ok": False, "error": f"Validation error: {e}"}
             continue
-        try:
-            created = await crud.create_category(db, c_schema)
-            results.append({"row": row_no, "ok": True, "category_id": created.id, "user_id": user_id})
-        except ValueError as e:
-            results.append({"row": row_no, "ok": False, "error": str(e)})
-        except Exception as e:
-            results.append({"row": row_no, "ok": False, "error": f"Unexpected error: {e}"})
+        if c_schema.name in pending:
+            results[row_no] = {"row": row_no, "ok": False, "error": "Duplicate category name in file"}
+            continue
+        pending[c_schema.name] = (row_no, c_schema)
+
+    update_columns = [c for c in ('description',) if c in reader.fieldnames]
+    try:
+        written = await crud.bulk_upsert_categories(db, [c for _, c in pending.values()], on_conflict=on_conflict, update_columns=update_columns)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    for name, (r, _) in pending.items():
+        if name in written:
+            results[r] = {"row": r, "ok": True, "category_id": written[name], "user_id": user_id}
+        else:
+            results[r] = {"row": r, "ok": False, "error": "Category name already exists"}
 
-    return {"results": results}
+    return {"results": [results[r] for r in sorted(results)]}
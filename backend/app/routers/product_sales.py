@@ -4,46 +4,14 @@ from typing import List, Optional
 import csv
 import io
 from datetime import datetime
-from .. import models, schemas, crud
+from .. import models, schemas, crud, ledger, archive
 from ..database import get_db
 from ..security import get_current_user
-from sqlalchemy import select
+from sqlalchemy import insert
 
 router = APIRouter(prefix="/sales", tags=["sales"])
 
 
-async def record_stock_movement(
-    db: AsyncSession,
-    product: models.Product,
-    movement_type: str,
-    quantity_change: int,
-    user_id: Optional[int] = None,
-    reference_id: Optional[int] = None,
-    reference_type: Optional[str] = None,
-    notes: Optional[str] = None,
-    transaction_date: Optional[datetime] = None
-):
-    """Helper function to record stock movements"""
-    quantity_before = product.quantity
-    quantity_after = quantity_before + quantity_change
-    
-    movement = models.StockMovement(
-        product_id=product.id,
-        user_id=user_id,
-        movement_type=movement_type,
-        quantity_change=quantity_change,
-        quantity_before=quantity_before,
-        quantity_after=quantity_after,
-        reference_id=reference_id,
-        reference_type=reference_type,
-        notes=notes,
-        transaction_date=transaction_date
-    )
-    
-    db.add(movement)
-    return movement
-
-
 @router.post("/", response_model=schemas.ProductSaleOut)
 async def record_sale(
     sale: schemas.ProductSaleCreate,
@@ -69,21 +37,21 @@ async def record_sale(
     db.add(db_sale)
     await db.flush()  # Get the sale ID without committing
     
-    # Record stock movement BEFORE updating quantity
-    await record_stock_movement(
-        db=db,
-        product=product,
-        movement_type="sale",
-        quantity_change=-sale.quantity,  # negative for stock reduction
-        user_id=current_user.id,
-        reference_id=db_sale.id,
-        reference_type="sale",
-        notes=f"Sale of {sale.quantity} units at ${product.price} each",
-        transaction_date=sale.sale_date
-    )
-    
-    # Reduce stock count
-    product.quantity = product.quantity - sale.quantity
+    # Reduce stock and record the movement atomically; the guard in the UPDATE
+    # rejects the sale if a concurrent one took the remaining stock
+    try:
+        await ledger.apply_movements(db, [ledger.Movement(
+            product_id=product_id,
+            delta=-sale.quantity,  # negative for stock reduction
+            movement_type="sale",
+            reference_id=db_sale.id,
+            reference_type="sale",
+            notes=f"Sale of {sale.quantity} units at ${product.price} each",
+            transaction_date=sale.sale_date
+        )], user_id=current_user.id, allow_negative=False)
+    except ledger.InsufficientStock:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Insufficient stock")
     
     await db.commit()
     await db.refresh(db_sale)
@@ -91,30 +59,36 @@ async def record_sale(
 
 
 @router.get("/", response_model=List[schemas.ProductSaleOut])
-async def list_sales(db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    stmt = select(models.ProductSale).where(models.ProductSale.user_id == current_user.id)
-    result = await db.execute(stmt)
-    return result.scalars().all()
+async def list_sales(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    try:
+        return await archive.sales_history(db, current_user.id, since=since, until=until)
+    except archive.ArchiveUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
 
 @router.get("/product/{product_id}", response_model=List[schemas.ProductSaleOut])
 async def get_product_sales(
     product_id: int,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
     db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    """Get all sales for a specific product"""
+    """Get all sales for a specific product, newest first, including archived ones"""
     # First check if product exists
     product = await db.get(models.Product, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    stmt = select(models.ProductSale).where(
-        models.ProductSale.product_id == product_id,
-        models.ProductSale.user_id == current_user.id
-    ).order_by(models.ProductSale.sale_date.desc())
-    result = await db.execute(stmt)
-    return result.scalars().all()
+    try:
+        return await archive.sales_history(db, current_user.id, product_id, since=since, until=until)
+    except archive.ArchiveUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
 
 @router.post("/upload")
@@ -151,6 +125,11 @@ async def upload_sales_csv(
         sales_created = 0
         errors = []
         total_rows = 0
+        remaining = {}
+        pending_sales = []
+        pending_notes = []
+        # resolved products, kept referenced so repeated SKUs are served from the session
+        products_by_sku = {}
         
         for row_num, row in enumerate(csv_reader, start=2):  # Start at 2 because row 1 is headers
             total_rows += 1
@@ -173,7 +152,9 @@ async def upload_sales_csv(
                 )
                 if row_sku:
                     # find product by SKU scoped to current user when possible
-                    product_obj = await crud.get_product_by_sku(db, row_sku, current_user.id)
+                    if row_sku not in products_by_sku:
+                        products_by_sku[row_sku] = await crud.get_product_by_sku(db, row_sku, current_user.id)
+                    product_obj = products_by_sku[row_sku]
                     if not product_obj:
                         errors.append(f"Row {row_num}: Product with SKU '{row_sku}' not found for user")
                         continue
@@ -245,36 +226,22 @@ async def upload_sales_csv(
                     errors.append(f"Row {row_num}: Product with ID {row_product_id} not found")
                     continue
                 
-                if product.quantity < quantity:
-                    errors.append(f"Row {row_num}: Insufficient stock (available: {product.quantity}, requested: {quantity})")
+                # stock still available after the earlier rows of this file
+                available = remaining.setdefault(row_product_id, product.quantity)
+                if available < quantity:
+                    errors.append(f"Row {row_num}: Insufficient stock (available: {available}, requested: {quantity})")
                     continue
+                remaining[row_product_id] = available - quantity
                 
-                # Create sale record using product's current price
-                db_sale = models.ProductSale(
-                    product_id=row_product_id,
-                    user_id=current_user.id,
-                    quantity=quantity,
-                    sale_price=product.price,  # Use product's current price
-                    sale_date=sale_date or datetime.now()
-                )
-                db.add(db_sale)
-                await db.flush()  # Get the sale ID
-                
-                # Record stock movement BEFORE updating quantity
-                await record_stock_movement(
-                    db=db,
-                    product=product,
-                    movement_type="sale",
-                    quantity_change=-quantity,  # negative for stock reduction
-                    user_id=current_user.id,
-                    reference_id=db_sale.id,
-                    reference_type="sale",
-                    notes=f"CSV upload sale of {quantity} units at ${product.price} each",
-                    transaction_date=sale_date
-                )
-                
-                # Reduce stock count
-                product.quantity = product.quantity - quantity
+                # Sale record using product's current price; written with the rest of the file below
+                pending_sales.append({
+                    "product_id": row_product_id,
+                    "user_id": current_user.id,
+                    "quantity": quantity,
+                    "sale_price": product.price,  # Use product's current price
+                    "sale_date": sale_date or datetime.now(),
+                })
+                pending_notes.append((f"CSV upload sale of {quantity} units at ${product.price} each", sale_date))
                 
                 sales_created += 1
                 
@@ -285,9 +252,30 @@ async def upload_sales_csv(
                 errors.append(f"Row {row_num}: Unexpected error - {str(e)}")
                 continue
         
-        # Commit all sales
+        # Write all sales with one INSERT ... RETURNING and apply the stock changes as one
+        # ledger batch, then commit them together
         try:
+            if pending_sales:
+                stmt = insert(models.ProductSale).returning(models.ProductSale.id, sort_by_parameter_order=True)
+                result = await db.execute(stmt, pending_sales)
+                # in the order of pending_sales
+                sale_ids = result.scalars().all()
+                await ledger.apply_movements(db, [
+                    ledger.Movement(
+                        product_id=row["product_id"],
+                        delta=-row["quantity"],  # negative for stock reduction
+                        movement_type="sale",
+                        reference_id=sale_id,
+                        reference_type="sale",
+                        notes=notes,
+                        transaction_date=sale_date
+                    )
+                    for row, sale_id, (notes, sale_date) in zip(pending_sales, sale_ids, pending_notes)
+                ], user_id=current_user.id, allow_negative=False)
             await db.commit()
+        except ledger.InsufficientStock as e:
+            await db.rollback()
+            raise HTTPException(status_code=400, detail=f"Stock changed during upload, no sales were recorded: {e}")
         except Exception as e:
             await db.rollback()
             raise HTTPException(status_code=500, detail=f"Error committing sales to database: {str(e)}")
@@ -300,7 +288,9 @@ async def upload_sales_csv(
         }
         
         return response
-        
+
+    except HTTPException:
+        raise
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail=f"Error processing CSV: {str(e)}")
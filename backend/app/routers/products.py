@@ -1,12 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Optional
 from sqlalchemy import select
-from .. import crud, schemas
+from .. import crud, schemas, classification, snapshots, reconciliation, archive, search, versions, cache
 from ..database import get_db
 from ..security import get_current_user
 from .. import models
 import io, csv
+import datetime
 
 
 router = APIRouter(prefix="/products", tags=["products"])
@@ -24,12 +25,124 @@ async def create_product(product: schemas.ProductCreate, db: AsyncSession = Depe
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@router.get("/", response_model=List[schemas.ProductOut])
-async def list_products(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    return await crud.get_products(db, skip=skip, limit=limit, user_id=current_user.id)
+@router.get("/", response_model=List[schemas.ProductOut], dependencies=[Depends(versions.conditional(*versions.PRODUCT_SCOPES))])
+async def list_products(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    abc_class: Optional[str] = Query(None, pattern='^[ABC]$'),
+    xyz_class: Optional[str] = Query(None, pattern='^[XYZ]$'),
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    return await cache.respond(
+        request, response, current_user.id, versions.PRODUCT_SCOPES, List[schemas.ProductOut],
+        lambda: crud.get_products(db, skip=skip, limit=limit, user_id=current_user.id, abc_class=abc_class, xyz_class=xyz_class),
+    )
+
+
+@router.get("/search", response_model=List[schemas.ProductOut])
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=255),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Products whose name, SKU or description match `q` (substring or typo-tolerant), best match first."""
+    try:
+        return await search.search_products(db, current_user.id, q, skip=skip, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/classification/run", response_model=schemas.ProductClassificationRunResult)
+async def run_product_classification(
+    lookback_days: int = Query(classification.DEFAULT_LOOKBACK_DAYS, ge=7, le=365),
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Recompute the ABC/XYZ class of every product from sales over `lookback_days`."""
+    return await classification.run_classification(db, current_user.id, lookback_days=lookback_days)
+
 
+@router.get("/classification", response_model=List[schemas.ProductClassificationOut])
+async def list_product_classifications(
+    abc_class: Optional[str] = Query(None, pattern='^[ABC]$'),
+    xyz_class: Optional[str] = Query(None, pattern='^[XYZ]$'),
+    skip: int = 0,
+    limit: int = 100,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Stored ABC/XYZ classes, highest revenue first. Run /products/classification/run to refresh."""
+    stmt = select(models.ProductClassification, models.Product.name, models.Product.sku).join(
+        models.Product, models.Product.id == models.ProductClassification.product_id
+    ).where(models.ProductClassification.user_id == current_user.id)
+    if abc_class:
+        stmt = stmt.where(models.ProductClassification.abc_class == abc_class)
+    if xyz_class:
+        stmt = stmt.where(models.ProductClassification.xyz_class == xyz_class)
+    stmt = stmt.order_by(models.ProductClassification.revenue.desc(), models.ProductClassification.product_id).offset(skip).limit(limit)
+    result = await db.execute(stmt)
+    return [
+        {**{c.name: getattr(row, c.name) for c in models.ProductClassification.__table__.columns}, "name": name, "sku": sku}
+        for row, name, sku in result.all()
+    ]
 
-@router.get("/{product_id}", response_model=schemas.ProductOut)
+
+@router.get("/dead-stock", response_model=schemas.SlowMovingReport)
+async def get_dead_stock_report(
+    slow_days: int = Query(90, ge=1),
+    dead_days: int = Query(180, ge=1),
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Dead and slow-moving stock ranked by tied-up value, highest first."""
+    try:
+        return await crud.get_slow_moving_products(
+            db, current_user.id, slow_days=slow_days, dead_days=dead_days, cursor=cursor, limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/snapshots", response_model=schemas.InventorySnapshotResult)
+async def take_inventory_snapshot(db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    """Checkpoint every product's current quantity (replaces today's snapshot if one exists)."""
+    return await snapshots.take_snapshot(db, current_user.id)
+
+
+@router.get("/stock-as-of", response_model=List[schemas.StockLevelAsOf])
+async def get_stock_as_of(
+    at: datetime.datetime,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Stock level of every product at `at`, from the nearest snapshot plus later movements."""
+    try:
+        return await snapshots.get_stock_as_of(db, current_user.id, at)
+    except archive.ArchiveUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@router.post("/reconcile", response_model=schemas.ReconciliationReport)
+async def reconcile_stock_ledger(
+    fix: bool = False,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Check stock movements recorded since the last run against each other and against product quantities.
+
+    Set fix=true to write adjustment movements for products whose quantity has drifted from the ledger.
+    """
+    return await reconciliation.reconcile(db, current_user.id, fix=fix)
+
+
+@router.get("/{product_id}", response_model=schemas.ProductOut, dependencies=[Depends(versions.conditional(*versions.PRODUCT_SCOPES))])
 async def get_product(product_id: int, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     p = await crud.get_product(db, product_id, user_id=current_user.id)
     if not p:
@@ -79,6 +192,7 @@ async def upload_products_csv(file: UploadFile = File(...), db: AsyncSession = D
         raise HTTPException(status_code=400, detail="CSV file must have a header row")
 
     results = []
+    related = set()
     row_no = 1
     for row in reader:
         row_no += 1
@@ -104,19 +218,17 @@ async def upload_products_csv(file: UploadFile = File(...), db: AsyncSession = D
         
         # Handle category lookup
         if data.get('category'):
-            category = await crud.get_category_by_name(db, data['category'], user_id)
-            if not category:
+            category_id = await crud.get_category_id(db, data['category'], user_id)
+            if category_id is None:
                 results.append({"row": row_no, "ok": False, "error": f"Category '{data['category']}' not found for current user"})
                 continue
-            category_id = category.id
         
         # Handle supplier lookup
         if data.get('supplier'):
-            supplier = await crud.get_supplier_by_name(db, data['supplier'], user_id)
-            if not supplier:
+            supplier_id = await crud.get_supplier_id(db, data['supplier'], user_id)
+            if supplier_id is None:
                 results.append({"row": row_no, "ok": False, "error": f"Supplier '{data['supplier']}' not found for current user"})
                 continue
-            supplier_id = supplier.id
 
         # Build product data with resolved IDs
         product_data = {
@@ -140,6 +252,8 @@ async def upload_products_csv(file: UploadFile = File(...), db: AsyncSession = D
         try:
             created = await crud.create_product(db, p_schema)
             results.append({"row": row_no, "ok": True, "product_id": created.id})
+            # keep the category and supplier referenced so later rows find them in the session
+            related.update(obj for obj in (created.category, created.supplier) if obj is not None)
         except ValueError as e:
             results.append({"row": row_no, "ok": False, "error": str(e)})
         except Exception as e:
@@ -148,42 +262,133 @@ async def upload_products_csv(file: UploadFile = File(...), db: AsyncSession = D
     return {"results": results}
 
 
+@router.post("/stock-counts", response_model=schemas.StockCountResult)
+async def submit_stock_counts(batch: schemas.StockCountBatch, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    """Reconcile a stock take: set each SKU to its counted quantity and record 'adjustment' movements.
+
+    All counts are applied in one transaction. If a SKU appears more than once the last count wins.
+    """
+    counts = {item.sku: item.counted_quantity for item in batch.counts}
+    try:
+        return await crud.apply_stock_counts(db, counts, current_user.id, notes=batch.notes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/stock-counts/upload", response_model=schemas.StockCountResult)
+async def upload_stock_counts_csv(file: UploadFile = File(...), db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    """Upload a stock take as CSV. Expected headers: sku, counted_quantity (or quantity)"""
+    user_id = current_user.id
+
+    try:
+        raw = await file.read()
+        stream = io.StringIO(raw.decode('utf-8-sig'))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Unable to read/decode uploaded file as UTF-8")
+
+    reader = csv.DictReader(stream)
+    if reader.fieldnames is None:
+        raise HTTPException(status_code=400, detail="CSV file must have a header row")
+
+    counts = {}
+    errors = []
+    for row_no, row in enumerate(reader, start=2):
+        row_sku = (row.get('sku') or '').strip()
+        raw_qty = (row.get('counted_quantity') or row.get('quantity') or '').strip()
+        if not row_sku:
+            errors.append(f"Row {row_no}: Missing 'sku'")
+            continue
+        try:
+            counted = int(float(raw_qty))
+        except ValueError:
+            errors.append(f"Row {row_no}: Invalid counted quantity '{raw_qty}'")
+            continue
+        if counted < 0:
+            errors.append(f"Row {row_no}: Counted quantity must not be negative, got {counted}")
+            continue
+        counts[row_sku] = counted
+
+    try:
+        result = await crud.apply_stock_counts(db, counts, user_id, notes=None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    result["errors"] = errors
+    return result
+
+
+@router.post("/bulk-update", response_model=schemas.ProductBulkResult)
+async def bulk_update_products(batch: schemas.ProductBulkUpdate, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    """Apply the same field updates to all products matching the selection (ids, category_id, supplier_id)."""
+    try:
+        product_ids = await crud.bulk_update_products(db, batch.selection, batch.updates, user_id=current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"affected": len(product_ids), "product_ids": product_ids}
+
+
+@router.post("/bulk-delete", response_model=schemas.ProductBulkResult)
+async def bulk_delete_products(selection: schemas.ProductBulkSelection, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    """Delete all products matching the selection (ids, category_id, supplier_id)."""
+    try:
+        product_ids = await crud.bulk_delete_products(db, selection, user_id=current_user.id)
+    except ValueError as e:
+        msg = str(e)
+        if 'cannot be deleted' in msg.lower():
+            raise HTTPException(status_code=409, detail=msg)
+        raise HTTPException(status_code=400, detail=msg)
+    return {"affected": len(product_ids), "product_ids": product_ids}
+
+
+@router.post("/lookup", response_model=schemas.ProductLookupResult)
+async def lookup_products(request: schemas.ProductLookupRequest, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    """Fetch up to crud.LOOKUP_MAX_ITEMS products by SKU and/or id, with supplier and category, in one query."""
+    try:
+        products, missing_skus, missing_ids = await crud.lookup_products(db, request.skus, request.product_ids, user_id=current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"products": products, "missing_skus": missing_skus, "missing_ids": missing_ids}
+
+
 @router.get("/{product_id}/sales", response_model=List[schemas.ProductSaleOut])
 async def get_product_sales(
     product_id: int,
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
     db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    """Get all sales for a specific product"""
+    """Get all sales for a specific product, newest first, including archived ones"""
     # First check if product exists
     product = await db.get(models.Product, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    stmt = select(models.ProductSale).where(
-        models.ProductSale.product_id == product_id,
-        models.ProductSale.user_id == current_user.id
-    ).order_by(models.ProductSale.sale_date.desc())
-    result = await db.execute(stmt)
-    return result.scalars().all()
+    try:
+        return await archive.sales_history(db, current_user.id, product_id, since=since, until=until)
+    except archive.ArchiveUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
 
 @router.get("/{product_id}/stock-movements", response_model=List[schemas.StockMovementOut])
 async def get_product_stock_movements(
     product_id: int,
+    since: Optional[datetime.datetime] = None,
+    limit: Optional[int] = Query(None, ge=1),
     db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    """Get all stock movements for a specific product"""
+    """Get stock movements for a specific product, newest first.
+
+    Pass `since` and/or `limit` to bound the result (e.g. with /products/stock-as-of
+    supplying the starting level for a chart). Archived movements are included when
+    the range reaches past the archive horizon.
+    """
     # First check if product exists
     product = await db.get(models.Product, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    stmt = select(models.StockMovement).where(
-        models.StockMovement.product_id == product_id,
-        models.StockMovement.user_id == current_user.id
-    ).order_by(models.StockMovement.created_at.desc())
-    result = await db.execute(stmt)
-    return result.scalars().all()
-    return result.scalars().all()
+    try:
+        return await archive.movement_history(db, current_user.id, product_id, since=since, limit=limit)
+    except archive.ArchiveUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
-from sqlalchemy.orm import selectinload
-from typing import List
-from .. import crud, schemas, models
+from sqlalchemy import select, insert, update, and_, or_, func
+from sqlalchemy.orm.attributes import set_committed_value
+from typing import List, Optional
+from types import SimpleNamespace
+from .. import crud, schemas, models, forecasting, lead_times, scorecards, consolidation, ledger, versions, cache
 import asyncio
+from datetime import datetime, timezone
 from ..routers.email import send_order_summary
 from ..routers.email import send_batch_order_summary
 from ..database import get_db
@@ -12,51 +14,63 @@ from ..security import get_current_user
 
 router = APIRouter(prefix="/restock", tags=["restock"])
 
-@router.get("/summary", response_model=schemas.RestockSummary)
+# pending order values use product prices; stock counts read product quantities
+SUMMARY_SCOPES = ('purchase_orders', 'products')
+
+
+@router.get("/summary", response_model=schemas.RestockSummary, dependencies=[Depends(versions.conditional(*SUMMARY_SCOPES))])
 async def get_restock_summary(
+    request: Request,
+    response: Response,
     db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """Get summary statistics for restock dashboard"""
-    
+    return await cache.respond(
+        request, response, current_user.id, SUMMARY_SCOPES, schemas.RestockSummary,
+        lambda: restock_summary(db, current_user),
+    )
+
+
+async def restock_summary(db: AsyncSession, current_user: models.User) -> schemas.RestockSummary:
     # Count pending orders
-    pending_orders_stmt = select(models.PurchaseOrder).where(
+    pending_orders_stmt = select(func.count(models.PurchaseOrder.id)).where(
         and_(
             models.PurchaseOrder.user_id == current_user.id,
             models.PurchaseOrder.status == 'pending'
         )
     )
-    pending_orders_result = await db.execute(pending_orders_stmt)
-    pending_orders = pending_orders_result.scalars().all()
-    pending_orders_count = len(pending_orders)
-    
-    # Calculate total pending value using product prices
-    total_pending_value = 0
-    for order in pending_orders:
-        product = await db.get(models.Product, order.product_id)
-        if product:
-            total_pending_value += (product.price / 100) * order.quantity_ordered  # price in cents to dollars
+    pending_orders_count = (await db.execute(pending_orders_stmt)).scalar_one()
     
-    # Count low stock items
-    low_stock_stmt = select(models.Product).where(
-        and_(
-            models.Product.user_id == current_user.id,
-            models.Product.quantity <= models.Product.low_stock_threshold,
-            models.Product.quantity > 0
-        )
+    # Calculate total pending value in SQL: single-product orders at the product's
+    # current price, consolidated orders at their line prices (cents to dollars)
+    single_value_stmt = select(
+        func.coalesce(func.sum(models.Product.price * models.PurchaseOrder.quantity_ordered), 0)
+    ).select_from(models.PurchaseOrder).join(models.Product, models.Product.id == models.PurchaseOrder.product_id).where(
+        models.PurchaseOrder.user_id == current_user.id,
+        models.PurchaseOrder.status == 'pending'
     )
-    low_stock_result = await db.execute(low_stock_stmt)
-    low_stock_count = len(low_stock_result.scalars().all())
+    lines_value_stmt = select(
+        func.coalesce(func.sum(models.PurchaseOrderLine.unit_price * models.PurchaseOrderLine.quantity_ordered), 0)
+    ).select_from(models.PurchaseOrderLine).join(models.PurchaseOrder, models.PurchaseOrder.id == models.PurchaseOrderLine.purchase_order_id).where(
+        models.PurchaseOrder.user_id == current_user.id,
+        models.PurchaseOrder.status == 'pending'
+    )
+    total_pending_cents = (await db.execute(single_value_stmt)).scalar_one() + (await db.execute(lines_value_stmt)).scalar_one()
+    total_pending_value = total_pending_cents / 100
     
-    # Count out of stock items
-    out_of_stock_stmt = select(models.Product).where(
-        and_(
-            models.Product.user_id == current_user.id,
-            models.Product.quantity == 0
-        )
+    # Count low stock and out of stock items in one pass over the partial
+    # ix_products_user_low_stock index
+    low_stock = and_(models.Product.quantity <= models.Product.low_stock_threshold, models.Product.quantity > 0)
+    out_of_stock = models.Product.quantity == 0
+    stock_counts_stmt = select(
+        func.count().filter(low_stock),
+        func.count().filter(out_of_stock),
+    ).where(
+        models.Product.user_id == current_user.id,
+        or_(models.Product.quantity <= models.Product.low_stock_threshold, out_of_stock),
     )
-    out_of_stock_result = await db.execute(out_of_stock_stmt)
-    out_of_stock_count = len(out_of_stock_result.scalars().all())
+    low_stock_count, out_of_stock_count = (await db.execute(stock_counts_stmt)).one()
     
     return schemas.RestockSummary(
         pending_orders=pending_orders_count,
@@ -66,6 +80,32 @@ async def get_restock_summary(
     )
 
 
+@router.get("/suggestions", response_model=List[schemas.ReorderSuggestion])
+async def get_reorder_suggestions(
+    lookback_days: int = Query(56, ge=7, le=365),
+    service_level: float = Query(0.95, gt=0.5, lt=1),
+    review_days: int = Query(7, ge=0, le=90),
+    include_all: bool = False,
+    limit: Optional[int] = Query(None, ge=1),
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Demand-driven reorder suggestions for all of the user's products, most urgent first.
+
+    Demand is forecast from daily sales over `lookback_days`; set include_all to return
+    every product's forecast rather than only those that need reordering.
+    """
+    return await forecasting.build_suggestions(
+        db,
+        current_user.id,
+        lookback_days=lookback_days,
+        review_days=review_days,
+        service_level=service_level,
+        include_all=include_all,
+        limit=limit,
+    )
+
+
 @router.post("/orders", response_model=schemas.PurchaseOrderOut)
 async def create_purchase_order(
     order: schemas.PurchaseOrderCreate,
@@ -74,12 +114,14 @@ async def create_purchase_order(
 ):
     """Create a new purchase order for restocking"""
     
-    # Verify the product exists and belongs to the user
-    product = await db.get(models.Product, order.product_id)
-    if not product or product.user_id != current_user.id:
+    # Verify the product exists and belongs to the user (loaded with its
+    # supplier/category so the response needs no further queries)
+    product = await crud.get_product(db, order.product_id, user_id=current_user.id)
+    if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    # Verify supplier exists if provided
+    # Verify supplier exists if provided (identity-map hit when it's the product's supplier)
+    supplier = None
     if order.supplier_id:
         supplier = await db.get(models.Supplier, order.supplier_id)
         if not supplier or supplier.user_id != current_user.id:
@@ -97,24 +139,20 @@ async def create_purchase_order(
     )
     
     db.add(db_order)
+    versions.touch(db, current_user.id, 'purchase_orders')
+    # id and order_date come back via INSERT ... RETURNING (eager_defaults)
     await db.commit()
-    await db.refresh(db_order)
-    
-    # Return with relationships loaded
-    stmt = select(models.PurchaseOrder).options(
-        selectinload(models.PurchaseOrder.supplier),
-        selectinload(models.PurchaseOrder.product).selectinload(models.Product.supplier),
-        selectinload(models.PurchaseOrder.product).selectinload(models.Product.category)
-    ).where(models.PurchaseOrder.id == db_order.id)
     
-    result = await db.execute(stmt)
-    order_with_relations = result.scalar_one()
+    # Attach the already-loaded relationships instead of re-selecting the order
+    set_committed_value(db_order, 'product', product)
+    set_committed_value(db_order, 'supplier', supplier)
+    set_committed_value(db_order, 'lines', [])
+    order_with_relations = db_order
 
     # If the user requested to be notified by email for this order, send an
     # order summary asynchronously (fire-and-forget) so we don't delay the
     # API response. We pass the ORM object that already has related
-    # product/supplier loaded via selectinload so the email builder won't hit
-    # the DB.
+    # product/supplier attached so the email builder won't hit the DB.
     try:
         if getattr(order_with_relations, 'notify_by_email', False) and getattr(current_user, 'email', None):
             # schedule async send in background
@@ -127,7 +165,7 @@ async def create_purchase_order(
     return order_with_relations
 
 
-@router.get("/orders", response_model=List[schemas.PurchaseOrderOut])
+@router.get("/orders", response_model=List[schemas.PurchaseOrderOut], dependencies=[Depends(versions.conditional('purchase_orders', *versions.PRODUCT_SCOPES))])
 async def get_purchase_orders(
     status: str = None,
     skip: int = 0,
@@ -137,11 +175,7 @@ async def get_purchase_orders(
 ):
     """Get purchase order history, optionally filtered by status"""
     
-    stmt = select(models.PurchaseOrder).options(
-        selectinload(models.PurchaseOrder.supplier),
-        selectinload(models.PurchaseOrder.product).selectinload(models.Product.supplier),
-        selectinload(models.PurchaseOrder.product).selectinload(models.Product.category)
-    ).where(
+    stmt = select(models.PurchaseOrder).options(*crud.PURCHASE_ORDER_LOAD_OPTIONS).where(
         models.PurchaseOrder.user_id == current_user.id
     )
     
@@ -164,37 +198,55 @@ async def create_purchase_orders_batch(
 ):
     """Create multiple purchase orders in one transaction and send a single email summary for those that requested notification."""
 
-    created_orders = []
+    if not batch.orders:
+        return []
 
-    try:
-        for order in batch.orders:
-            # validate product ownership
-            product = await db.get(models.Product, order.product_id)
-            if not product or product.user_id != current_user.id:
-                raise HTTPException(status_code=404, detail=f"Product {order.product_id} not found")
-
-            if order.supplier_id:
-                supplier = await db.get(models.Supplier, order.supplier_id)
-                if not supplier or supplier.user_id != current_user.id:
-                    raise HTTPException(status_code=404, detail=f"Supplier {order.supplier_id} not found")
-
-            db_order = models.PurchaseOrder(
-                user_id=current_user.id,
-                supplier_id=order.supplier_id,
-                product_id=order.product_id,
-                quantity_ordered=order.quantity_ordered,
-                status=order.status,
-                notes=order.notes,
-                notify_by_email=getattr(order, 'notify_by_email', False)
-            )
+    # Validate every product and supplier with one IN query each. Products are
+    # loaded with their supplier/category so the response needs no further IO.
+    product_ids = {o.product_id for o in batch.orders}
+    stmt = select(models.Product).where(
+        models.Product.id.in_(product_ids),
+        models.Product.user_id == current_user.id
+    ).options(*crud.PRODUCT_LOAD_OPTIONS)
+    result = await db.execute(stmt)
+    products = {p.id: p for p in result.scalars().all()}
+
+    supplier_ids = {o.supplier_id for o in batch.orders if o.supplier_id}
+    suppliers = {}
+    if supplier_ids:
+        stmt = select(models.Supplier).where(
+            models.Supplier.id.in_(supplier_ids),
+            models.Supplier.user_id == current_user.id
+        )
+        result = await db.execute(stmt)
+        suppliers = {s.id: s for s in result.scalars().all()}
 
-            db.add(db_order)
-            # flush to assign ids and order_date
-            await db.flush()
-            await db.refresh(db_order)
-            created_orders.append(db_order)
+    for order in batch.orders:
+        if order.product_id not in products:
+            raise HTTPException(status_code=404, detail=f"Product {order.product_id} not found")
+        if order.supplier_id and order.supplier_id not in suppliers:
+            raise HTTPException(status_code=404, detail=f"Supplier {order.supplier_id} not found")
 
-        # commit all created orders atomically
+    rows = [
+        {
+            "user_id": current_user.id,
+            "supplier_id": order.supplier_id,
+            "product_id": order.product_id,
+            "quantity_ordered": order.quantity_ordered,
+            "status": order.status,
+            "notes": order.notes,
+            "notify_by_email": getattr(order, 'notify_by_email', False),
+        }
+        for order in batch.orders
+    ]
+
+    try:
+        # one multi-row INSERT ... RETURNING for all orders, committed atomically
+        # RETURNING rows come back in the order of `rows` (ids alone need not follow it)
+        stmt = insert(models.PurchaseOrder).returning(models.PurchaseOrder, sort_by_parameter_order=True)
+        result = await db.scalars(stmt, rows)
+        orders_with_rel = result.all()
+        versions.touch(db, current_user.id, 'purchase_orders')
         await db.commit()
     except Exception:
         # Rollback on any error and re-raise so API caller gets the error
@@ -204,16 +256,11 @@ async def create_purchase_orders_batch(
             pass
         raise
 
-    # Load relationships for each created order (avoid lazy IO later)
-    orders_with_rel = []
-    for o in created_orders:
-        stmt = select(models.PurchaseOrder).options(
-            selectinload(models.PurchaseOrder.supplier),
-            selectinload(models.PurchaseOrder.product).selectinload(models.Product.supplier),
-            selectinload(models.PurchaseOrder.product).selectinload(models.Product.category)
-        ).where(models.PurchaseOrder.id == o.id)
-        res = await db.execute(stmt)
-        orders_with_rel.append(res.scalar_one())
+    # Attach the products/suppliers loaded during validation (avoid lazy IO later)
+    for o in orders_with_rel:
+        set_committed_value(o, 'product', products[o.product_id])
+        set_committed_value(o, 'supplier', suppliers.get(o.supplier_id))
+        set_committed_value(o, 'lines', [])
 
     # If any of the created orders requested email notification, send a single batch email
     try:
@@ -227,7 +274,231 @@ async def create_purchase_orders_batch(
     return orders_with_rel
 
 
-@router.get("/orders/{order_id}", response_model=schemas.PurchaseOrderOut)
+async def _plan_consolidated_orders(request: schemas.ConsolidatedReorderRequest, db: AsyncSession, user_id: int):
+    """Validate reorder lines and group them into per-supplier plans.
+
+    Returns (plans, products, suppliers) with products/suppliers keyed by id and
+    products loaded with their supplier/category.
+    """
+    if request.lines is None:
+        suggestions = await forecasting.build_suggestions(db, user_id)
+        lines = [
+            {"product_id": s["product_id"], "supplier_id": s["supplier_id"], "quantity": s["suggested_quantity"]}
+            for s in suggestions
+        ]
+    else:
+        lines = [line.model_dump() for line in request.lines]
+    if not lines:
+        return [], {}, {}
+
+    stmt = select(models.Product).where(
+        models.Product.id.in_({line["product_id"] for line in lines}),
+        models.Product.user_id == user_id
+    ).options(*crud.PRODUCT_LOAD_OPTIONS)
+    result = await db.execute(stmt)
+    products = {p.id: p for p in result.scalars().all()}
+    for line in lines:
+        product = products.get(line["product_id"])
+        if product is None:
+            raise HTTPException(status_code=404, detail=f"Product {line['product_id']} not found")
+        if line.get("supplier_id") is None:
+            line["supplier_id"] = product.supplier_id
+
+    supplier_ids = {line["supplier_id"] for line in lines if line["supplier_id"] is not None}
+    suppliers = {}
+    if supplier_ids:
+        stmt = select(models.Supplier).where(
+            models.Supplier.id.in_(supplier_ids),
+            models.Supplier.user_id == user_id
+        )
+        result = await db.execute(stmt)
+        suppliers = {s.id: s for s in result.scalars().all()}
+    for supplier_id in supplier_ids:
+        if supplier_id not in suppliers:
+            raise HTTPException(status_code=404, detail=f"Supplier {supplier_id} not found")
+
+    return consolidation.plan_orders(lines, suppliers), products, suppliers
+
+
+@router.post("/orders/consolidate/preview", response_model=List[schemas.ConsolidatedOrderPlan])
+async def preview_consolidated_orders(
+    request: schemas.ConsolidatedReorderRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Show how reorder lines would be grouped per supplier, with pack-size rounding and MOQ top-ups applied."""
+    plans, _, _ = await _plan_consolidated_orders(request, db, current_user.id)
+    return plans
+
+
+@router.post("/orders/consolidate", response_model=List[schemas.PurchaseOrderOut])
+async def create_consolidated_orders(
+    request: schemas.ConsolidatedReorderRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Create one multi-line purchase order per supplier from reorder lines (or the current suggestions).
+
+    Line quantities are rounded up to the supplier's pack size and orders below the
+    supplier's minimum order quantity are topped up. Each order's lines are priced at
+    the product's current price.
+    """
+    plans, products, suppliers = await _plan_consolidated_orders(request, db, current_user.id)
+    if not plans:
+        return []
+
+    rows = [
+        {
+            "user_id": current_user.id,
+            "supplier_id": plan["supplier_id"],
+            "product_id": None,
+            "quantity_ordered": plan["total_quantity"],
+            "status": 'pending',
+            "notes": request.notes,
+            "notify_by_email": request.notify_by_email,
+        }
+        for plan in plans
+    ]
+
+    try:
+        # one INSERT ... RETURNING for the orders and one executemany INSERT for all lines
+        stmt = insert(models.PurchaseOrder).returning(models.PurchaseOrder.id, sort_by_parameter_order=True)
+        result = await db.execute(stmt, rows)
+        # in the order of `rows`, which is the plan order
+        order_ids = result.scalars().all()
+        line_rows = [
+            {
+                "purchase_order_id": order_id,
+                "product_id": line["product_id"],
+                "quantity_ordered": line["quantity"],
+                "unit_price": products[line["product_id"]].price,
+            }
+            for order_id, plan in zip(order_ids, plans)
+            for line in plan["lines"]
+        ]
+        await db.execute(insert(models.PurchaseOrderLine), line_rows)
+        versions.touch(db, current_user.id, 'purchase_orders')
+        await db.commit()
+    except Exception:
+        try:
+            await db.rollback()
+        except Exception:
+            pass
+        raise
+
+    stmt = select(models.PurchaseOrder).options(*crud.PURCHASE_ORDER_LOAD_OPTIONS).where(
+        models.PurchaseOrder.id.in_(order_ids)
+    ).order_by(models.PurchaseOrder.id)
+    result = await db.execute(stmt)
+    orders = result.scalars().all()
+
+    # One email for all the new orders, itemised per line
+    try:
+        if request.notify_by_email and getattr(current_user, 'email', None):
+            email_items = [
+                SimpleNamespace(
+                    id=order.id,
+                    product_id=line.product_id,
+                    quantity_ordered=line.quantity_ordered,
+                    product=line.product,
+                    supplier=order.supplier,
+                )
+                for order in orders
+                for line in order.lines
+            ]
+            asyncio.create_task(send_batch_order_summary(current_user.email, email_items, current_user.full_name))
+    except Exception:
+        pass
+
+    return orders
+
+
+@router.post("/orders/receive", response_model=schemas.PurchaseOrderReceiveResult)
+async def receive_purchase_orders(
+    receive: schemas.PurchaseOrderReceive,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Mark many pending purchase orders as completed and restock their products in one transaction.
+
+    Stock is incremented through the ledger in one batch (atomic in SQL, so receiving
+    doesn't race with concurrent sales), with one 'restock' movement per order line.
+    """
+    order_ids = list(dict.fromkeys(receive.order_ids))
+    if not order_ids:
+        return {"received": [], "skipped": []}
+
+    received_at = datetime.now(timezone.utc)
+    try:
+        stmt = update(models.PurchaseOrder).where(
+            models.PurchaseOrder.id.in_(order_ids),
+            models.PurchaseOrder.user_id == current_user.id,
+            models.PurchaseOrder.status == 'pending'
+        ).values(status='completed', received_at=received_at).returning(
+            models.PurchaseOrder.id,
+            models.PurchaseOrder.product_id,
+            models.PurchaseOrder.quantity_ordered,
+            models.PurchaseOrder.supplier_id,
+            models.PurchaseOrder.order_date
+        )
+        result = await db.execute(stmt.execution_options(synchronize_session=False))
+        received = sorted(result.all())
+        await lead_times.record_completions(
+            db,
+            [(supplier_id, order_date, received_at) for _, _, _, supplier_id, order_date in received],
+            user_id=current_user.id
+        )
+
+        # (order_id, product_id, quantity) per restocked item; consolidated orders
+        # (no product_id) restock each of their lines
+        items = [(order_id, product_id, quantity) for order_id, product_id, quantity, _, _ in received if product_id is not None]
+        consolidated_ids = [order_id for order_id, product_id, _, _, _ in received if product_id is None]
+        if consolidated_ids:
+            stmt = select(
+                models.PurchaseOrderLine.purchase_order_id,
+                models.PurchaseOrderLine.product_id,
+                models.PurchaseOrderLine.quantity_ordered
+            ).where(
+                models.PurchaseOrderLine.purchase_order_id.in_(consolidated_ids)
+            ).order_by(models.PurchaseOrderLine.purchase_order_id, models.PurchaseOrderLine.id)
+            result = await db.execute(stmt)
+            items = sorted(items + [tuple(row) for row in result.all()], key=lambda item: item[0])
+
+        await ledger.apply_movements(db, [
+            ledger.Movement(
+                product_id=product_id,
+                delta=quantity,
+                movement_type='restock',
+                reference_id=order_id,
+                reference_type='purchase_order',
+                notes=f"Restock from purchase order #{order_id}",
+            )
+            for order_id, product_id, quantity in items
+        ], user_id=current_user.id)
+
+        versions.touch(db, current_user.id, 'purchase_orders')
+        await db.commit()
+    except Exception:
+        try:
+            await db.rollback()
+        except Exception:
+            pass
+        raise
+
+    received_ids = [row[0] for row in received]
+    orders = []
+    if received_ids:
+        stmt = select(models.PurchaseOrder).options(*crud.PURCHASE_ORDER_LOAD_OPTIONS).where(
+            models.PurchaseOrder.id.in_(received_ids)
+        ).order_by(models.PurchaseOrder.id).execution_options(populate_existing=True)
+        result = await db.execute(stmt)
+        orders = result.scalars().all()
+
+    received_set = set(received_ids)
+    return {"received": orders, "skipped": [i for i in order_ids if i not in received_set]}
+
+
+@router.get("/orders/{order_id}", response_model=schemas.PurchaseOrderOut, dependencies=[Depends(versions.conditional('purchase_orders', *versions.PRODUCT_SCOPES))])
 async def get_purchase_order(
     order_id: int,
     db: AsyncSession = Depends(get_db),
@@ -235,11 +506,7 @@ async def get_purchase_order(
 ):
     """Get a specific purchase order"""
     
-    stmt = select(models.PurchaseOrder).options(
-        selectinload(models.PurchaseOrder.supplier),
-        selectinload(models.PurchaseOrder.product).selectinload(models.Product.supplier),
-        selectinload(models.PurchaseOrder.product).selectinload(models.Product.category)
-    ).where(
+    stmt = select(models.PurchaseOrder).options(*crud.PURCHASE_ORDER_LOAD_OPTIONS).where(
         and_(
             models.PurchaseOrder.id == order_id,
             models.PurchaseOrder.user_id == current_user.id
@@ -264,17 +531,14 @@ async def update_purchase_order(
 ):
     """Update a purchase order (e.g., mark as completed)"""
     
-    # Get the order with relationships loaded
-    stmt = select(models.PurchaseOrder).options(
-        selectinload(models.PurchaseOrder.supplier),
-        selectinload(models.PurchaseOrder.product).selectinload(models.Product.supplier),
-        selectinload(models.PurchaseOrder.product).selectinload(models.Product.category)
-    ).where(
+    # Get the order with relationships loaded, locked until commit so concurrent updates
+    # see each other's status and ratings (two completions must not both restock)
+    stmt = select(models.PurchaseOrder).options(*crud.PURCHASE_ORDER_LOAD_OPTIONS).where(
         and_(
             models.PurchaseOrder.id == order_id,
             models.PurchaseOrder.user_id == current_user.id
         )
-    )
+    ).with_for_update(of=models.PurchaseOrder)
     
     result = await db.execute(stmt)
     order = result.scalar_one_or_none()
@@ -284,51 +548,56 @@ async def update_purchase_order(
     
     # Update fields
     update_data = order_update.model_dump(exclude_unset=True)
+    if order.status == 'completed' and update_data.get('status', 'completed') != 'completed':
+        # its stock was received; reopening would restock it a second time on completion
+        raise HTTPException(status_code=400, detail="A completed purchase order cannot be reopened")
+    supplier = order.supplier
+    if update_data.get('supplier_id') is not None and update_data['supplier_id'] != order.supplier_id:
+        supplier = await db.get(models.Supplier, update_data['supplier_id'])
+        if not supplier or supplier.user_id != current_user.id:
+            raise HTTPException(status_code=404, detail="Supplier not found")
+    elif 'supplier_id' in update_data and update_data['supplier_id'] is None:
+        supplier = None
+    was_completed = order.status == 'completed'
+    old_supplier_id, old_ratings = order.supplier_id, scorecards.ratings_of(order)
     for field, value in update_data.items():
         setattr(order, field, value)
     
-    await db.commit()
-    await db.refresh(order)
+    # Keep the supplier scorecards in step with rating (or supplier) changes
+    await scorecards.record_rating_change(
+        db, old_supplier_id, old_ratings, order.supplier_id, scorecards.ratings_of(order), user_id=current_user.id
+    )
     
-    # If order is marked as completed, update product stock
-    if order_update.status == "completed":
-        product = await db.get(models.Product, order.product_id)
-        if product:
-            old_quantity = product.quantity
-            product.quantity += order.quantity_ordered
-            
-            # Create stock movement record
-            stock_movement = models.StockMovement(
-                product_id=product.id,
-                user_id=current_user.id,
+    # On completion: stamp the receipt time, fold the order into the supplier's
+    # lead-time stats and restock every line of a consolidated order (otherwise the
+    # order's single product), all in one transaction
+    if order_update.status == "completed" and not was_completed:
+        order.received_at = datetime.now(timezone.utc)
+        await lead_times.record_completions(db, [(order.supplier_id, order.order_date, order.received_at)], user_id=current_user.id)
+        if order.lines:
+            items = [(line.product_id, line.quantity_ordered) for line in order.lines]
+        else:
+            items = [(order.product_id, order.quantity_ordered)]
+        await ledger.apply_movements(db, [
+            ledger.Movement(
+                product_id=product_id,
+                delta=quantity,
                 movement_type='restock',
-                quantity_change=order.quantity_ordered,
-                quantity_before=old_quantity,
-                quantity_after=product.quantity,
                 reference_id=order.id,
                 reference_type='purchase_order',
-                notes=f"Restock from purchase order #{order.id}"
+                notes=f"Restock from purchase order #{order.id}",
             )
-            
-            db.add(stock_movement)
-            await db.commit()
+            for product_id, quantity in items
+            if product_id is not None
+        ], user_id=current_user.id)
     
-    # Re-fetch the order with relationships loaded before returning to avoid
-    # Pydantic triggering lazy IO (which causes MissingGreenlet in async context).
-    stmt = select(models.PurchaseOrder).options(
-        selectinload(models.PurchaseOrder.supplier),
-        selectinload(models.PurchaseOrder.product).selectinload(models.Product.supplier),
-        selectinload(models.PurchaseOrder.product).selectinload(models.Product.category)
-    ).where(
-        and_(
-            models.PurchaseOrder.id == order.id,
-            models.PurchaseOrder.user_id == current_user.id
-        )
-    )
-
-    result = await db.execute(stmt)
-    fresh_order = result.scalar_one()
-    return fresh_order
+    versions.touch(db, current_user.id, 'purchase_orders')
+    await db.commit()
+    set_committed_value(order, 'supplier', supplier)
+    
+    # Relationships were eager-loaded above and the session doesn't expire on
+    # commit, so the order can be serialized without lazy IO.
+    return order
 
 
 @router.delete("/orders/{order_id}")
@@ -339,11 +608,14 @@ async def delete_purchase_order(
 ):
     """Delete a purchase order"""
     
-    order = await db.get(models.PurchaseOrder, order_id)
+    order = await db.get(models.PurchaseOrder, order_id, with_for_update=True)
     if not order or order.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Purchase order not found")
     
+    # back the order's ratings out of its supplier's scorecard
+    await scorecards.record_rating_change(db, order.supplier_id, scorecards.ratings_of(order), None, {}, user_id=current_user.id)
     await db.delete(order)
+    versions.touch(db, current_user.id, 'purchase_orders')
     await db.commit()
     
     return {"ok": True}
\ No newline at end of file
@@ -1,10 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request, Response
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from .. import models, schemas
 from ..database import get_db
-from .. import crud
+from .. import crud, lead_times, scorecards, versions, cache
 from ..security import get_current_user
 import io, csv
 
@@ -27,13 +27,42 @@ async def create_supplier(supplier: schemas.SupplierCreate, db: AsyncSession = D
         raise HTTPException(status_code=400, detail=msg)
 
 
-@router.get("/", response_model=List[schemas.SupplierOut])
-async def list_suppliers(db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    result = await db.execute(select(models.Supplier).where(models.Supplier.user_id == current_user.id))
-    return result.scalars().all()
-
-
-@router.get("/{supplier_id}", response_model=schemas.SupplierOut)
+@router.get("/", response_model=List[schemas.SupplierOut], dependencies=[Depends(versions.conditional('suppliers'))])
+async def list_suppliers(request: Request, response: Response, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    async def load():
+        result = await db.execute(select(models.Supplier).where(models.Supplier.user_id == current_user.id))
+        return result.scalars().all()
+    return await cache.respond(request, response, current_user.id, ('suppliers',), List[schemas.SupplierOut], load)
+
+
+@router.get("/lead-times", response_model=List[schemas.SupplierLeadTimeOut])
+async def list_supplier_lead_times(db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    """Lead-time statistics (in days) per supplier, measured from completed purchase orders."""
+    stats = await lead_times.get_lead_times(db, current_user.id)
+    return [
+        {
+            "supplier_id": row.supplier_id,
+            "order_count": row.order_count,
+            "mean_days": row.mean_days,
+            "std_days": lead_times.std_days(row),
+            "p90_days": row.p90_days,
+            "last_received_at": row.last_received_at,
+        }
+        for row in stats.values()
+    ]
+
+
+@router.get("/scorecards", response_model=List[schemas.SupplierScorecardOut])
+async def list_supplier_scorecards(db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    """Average purchase-order ratings, counts and trend per supplier, read from the precomputed scorecards."""
+    stmt = select(models.SupplierScorecard, models.Supplier.name).join(
+        models.Supplier, models.Supplier.id == models.SupplierScorecard.supplier_id
+    ).where(models.Supplier.user_id == current_user.id)
+    result = await db.execute(stmt)
+    return [scorecards.to_out(card, name) for card, name in result.all()]
+
+
+@router.get("/{supplier_id}", response_model=schemas.SupplierOut, dependencies=[Depends(versions.conditional('suppliers'))])
 async def get_supplier(supplier_id: int, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     s = await db.get(models.Supplier, supplier_id)
     if not s or s.user_id != current_user.id:
@@ -42,9 +71,17 @@ async def get_supplier(supplier_id: int, db: AsyncSession = Depends(get_db), cur
 
 
 @router.post("/upload")
-async def upload_suppliers_csv(file: UploadFile = File(...), db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    """Upload a CSV file with supplier rows. Expected headers: name, email, phone, address"""
-    
+async def upload_suppliers_csv(file: UploadFile = File(...), on_conflict: str = Form('skip'), db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    """Upload a CSV file with supplier rows. Expected headers: name, email, phone, address
+    (optionally min_order_quantity, pack_size)
+
+    Rows are written in chunks with INSERT ... ON CONFLICT on (name, user_id).
+    on_conflict=skip (default) reports existing names as errors and leaves them untouched;
+    on_conflict=update overwrites the columns present in the CSV header.
+    """
+    if on_conflict not in ('skip', 'update'):
+        raise HTTPException(status_code=400, detail="on_conflict must be 'skip' or 'update'")
+
     # Capture user_id early to avoid async context issues
     user_id = current_user.id
     
@@ -58,26 +95,40 @@ async def upload_suppliers_csv(file: UploadFile = File(...), db: AsyncSession =
     if reader.fieldnames is None:
         raise HTTPException(status_code=400, detail="CSV file must have a header row")
 
-    results = []
+    results = {}
+    pending = {}  # name -> (row_no, schema); first occurrence wins
     row_no = 1
     for row in reader:
         row_no += 1
         data = {k: (v if v != '' else None) for k, v in row.items()}
         data['user_id'] = user_id
+        # blank ordering rules fall back to the schema defaults
+        for key in ('min_order_quantity', 'pack_size'):
+            if data.get(key) is None:
+                data.pop(key, None)
         try:
             s_schema = schemas.SupplierCreate.model_validate(data)
         except Exception as e:
-            results.append({"row": row_no, "ok": False, "error": f"Validation error: {e}"})
+            results[row_no] = {"row": row_no, "ok": False, "error": f"Validation error: {e}"}
             continue
-        try:
-            created = await crud.create_supplier(db, s_schema)
-            results.append({"row": row_no, "ok": True, "supplier_id": created.id, "user_id": user_id})
-        except ValueError as e:
-            results.append({"row": row_no, "ok": False, "error": str(e)})
-        except Exception as e:
-            results.append({"row": row_no, "ok": False, "error": f"Unexpected error: {e}"})
+        if s_schema.name in pending:
+            results[row_no] = {"row": row_no, "ok": False, "error": "Duplicate supplier name in file"}
+            continue
+        pending[s_schema.name] = (row_no, s_schema)
+
+    update_columns = [c for c in ('email', 'phone', 'address', 'min_order_quantity', 'pack_size') if c in reader.fieldnames]
+    try:
+        written = await crud.bulk_upsert_suppliers(db, [s for _, s in pending.values()], on_conflict=on_conflict, update_columns=update_columns)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    for name, (r, _) in pending.items():
+        if name in written:
+            results[r] = {"row": r, "ok": True, "supplier_id": written[name], "user_id": user_id}
+        else:
+            results[r] = {"row": r, "ok": False, "error": "Supplier name already exists"}
 
-    return {"results": results}
+    return {"results": [results[r] for r in sorted(results)]}
 
 
 
@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from .. import models, schemas, sync
+from ..database import get_db
+from ..security import get_current_user
+
+router = APIRouter(prefix="/sync", tags=["sync"])
+
+
+@router.get("/", response_model=schemas.SyncChanges)
+async def get_changes(
+    since: Optional[str] = Query(None, description="cursor returned by the previous call; omit for a full download"),
+    limit: int = Query(500, ge=1, le=1000),
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Products, suppliers and categories changed or deleted since the cursor. Call again while has_more is true."""
+    try:
+        return await sync.changes_since(db, current_user.id, since, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -1,13 +1,19 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Dict, Optional, List
 import datetime
 
+# Most ids one bulk request may name; they are bound into a single IN (...), which
+# must stay well under the 32767 parameters asyncpg accepts
+MAX_BULK_IDS = 5000
+
 
 class SupplierBase(BaseModel):
     name: str = Field(..., max_length=255)
     email: Optional[str] = None
     phone: Optional[str] = None
     address: Optional[str] = None
+    min_order_quantity: int = Field(0, ge=0)
+    pack_size: int = Field(1, ge=1)
 
 
 class SupplierCreate(SupplierBase):
@@ -17,6 +23,7 @@ class SupplierCreate(SupplierBase):
 class SupplierOut(SupplierBase):
     id: int
     user_id: Optional[int] = None
+    last_updated: Optional[datetime.datetime] = None
 
     class Config:
         from_attributes = True
@@ -61,6 +68,108 @@ class ProductUpdate(BaseModel):
     supplier_id: Optional[int] = None
 
 
+class ProductBulkSelection(BaseModel):
+    """Selects products for a bulk operation; criteria are combined with AND."""
+    product_ids: Optional[List[int]] = Field(None, max_length=MAX_BULK_IDS)
+    category_id: Optional[int] = None
+    supplier_id: Optional[int] = None
+
+
+class ProductBulkUpdate(BaseModel):
+    selection: ProductBulkSelection
+    updates: ProductUpdate
+
+
+class ProductBulkResult(BaseModel):
+    affected: int
+    product_ids: List[int]
+
+
+class ProductLookupRequest(BaseModel):
+    """SKUs and/or product ids to fetch in one request."""
+    skus: List[str] = []
+    product_ids: List[int] = []
+
+
+class ProductClassificationOut(BaseModel):
+    product_id: int
+    name: Optional[str] = None
+    sku: Optional[str] = None
+    abc_class: str
+    xyz_class: str
+    revenue: float
+    revenue_share: float
+    cumulative_share: float
+    units_sold: int
+    demand_cv: Optional[float] = None
+    computed_at: Optional[datetime.datetime] = None
+
+
+class ProductClassificationRunResult(BaseModel):
+    products: int
+    # product count per combined class, e.g. {"AX": 12, "CZ": 40}
+    counts: Dict[str, int]
+    computed_at: datetime.datetime
+
+
+class SlowMovingProduct(BaseModel):
+    product_id: int
+    name: str
+    sku: Optional[str] = None
+    quantity: int
+    price: int
+    tied_up_value: float
+    last_sold_at: Optional[datetime.datetime] = None
+    days_since_sale: Optional[int] = None  # null when never sold
+    status: str  # dead, slow
+
+
+class SlowMovingReport(BaseModel):
+    items: List[SlowMovingProduct]
+    # pass as `cursor` to fetch the next page; null on the last page
+    next_cursor: Optional[str] = None
+
+
+class InventorySnapshotResult(BaseModel):
+    snapshot_date: datetime.date
+    taken_at: datetime.datetime
+    products: int
+
+
+class StockLevelAsOf(BaseModel):
+    product_id: int
+    name: str
+    sku: Optional[str] = None
+    quantity: int  # stock at the requested time
+    current_quantity: int
+
+
+class LedgerChainBreak(BaseModel):
+    movement_id: int
+    product_id: int
+    kind: str  # arithmetic (after != before + change), gap (before != previous after)
+    expected: int
+    actual: int
+
+
+class LedgerDrift(BaseModel):
+    product_id: int
+    name: str
+    sku: Optional[str] = None
+    quantity: int
+    ledger_quantity: int
+    difference: int
+    fixed: bool
+
+
+class ReconciliationReport(BaseModel):
+    checked_movements: int
+    watermark: int
+    chain_breaks: List[LedgerChainBreak]
+    drift: List[LedgerDrift]
+    checked_at: datetime.datetime
+
+
 class ProductOut(ProductBase):
     id: int
     last_updated: Optional[datetime.datetime] = None
@@ -73,6 +182,12 @@ class ProductOut(ProductBase):
         from_attributes = True
 
 
+class ProductLookupResult(BaseModel):
+    products: List[ProductOut]
+    missing_skus: List[str]
+    missing_ids: List[int]
+
+
 class ProductCategoryBase(BaseModel):
     name: str
     description: Optional[str] = None
@@ -85,6 +200,7 @@ class ProductCategoryCreate(ProductCategoryBase):
 class ProductCategoryOut(ProductCategoryBase):
     id: int
     user_id: Optional[int] = None
+    last_updated: Optional[datetime.datetime] = None
 
     class Config:
         from_attributes = True
@@ -93,6 +209,25 @@ class ProductCategoryOut(ProductCategoryBase):
 ProductOut.model_rebuild()
 
 
+class SyncTombstoneOut(BaseModel):
+    entity: str
+    entity_id: int
+    deleted_at: datetime.datetime
+
+    class Config:
+        from_attributes = True
+
+
+class SyncChanges(BaseModel):
+    """Changes since the request's cursor; pass `cursor` back as `since` on the next call."""
+    products: List[ProductOut]
+    suppliers: List[SupplierOut]
+    categories: List[ProductCategoryOut]
+    deleted: List[SyncTombstoneOut]
+    cursor: str
+    has_more: bool
+
+
 class ProductSaleBase(BaseModel):
     quantity: int
     sale_date: Optional[datetime.datetime] = None
@@ -112,6 +247,33 @@ class ProductSaleOut(ProductSaleBase):
         from_attributes = True
 
 
+class StockCountItem(BaseModel):
+    sku: str
+    counted_quantity: int = Field(..., ge=0)
+
+
+class StockCountBatch(BaseModel):
+    """Counted quantities from a stock take, reconciled in one request."""
+    counts: List[StockCountItem]
+    notes: Optional[str] = None
+
+
+class StockCountAdjustment(BaseModel):
+    sku: str
+    product_id: int
+    quantity_before: int
+    quantity_after: int
+    quantity_change: int
+
+
+class StockCountResult(BaseModel):
+    adjusted: int
+    unchanged: int
+    missing: List[str]
+    adjustments: List[StockCountAdjustment]
+    errors: List[str] = []
+
+
 class StockMovementBase(BaseModel):
     product_id: int
     movement_type: str  # 'sale', 'restock', 'adjustment', 'initial'
@@ -216,10 +378,25 @@ class PurchaseOrderUpdate(BaseModel):
     overall_rating: Optional[int] = None
 
 
+class PurchaseOrderLineOut(BaseModel):
+    id: int
+    product_id: int
+    quantity_ordered: int
+    unit_price: Optional[int] = None
+    product: Optional[ProductOut] = None
+
+    class Config:
+        from_attributes = True
+
+
 class PurchaseOrderOut(PurchaseOrderBase):
     id: int
     user_id: int
+    # None for consolidated multi-line orders; see lines
+    product_id: Optional[int] = None
+    lines: List[PurchaseOrderLineOut] = []
     order_date: Optional[datetime.datetime] = None
+    received_at: Optional[datetime.datetime] = None
     supplier: Optional[SupplierOut] = None
     product: Optional[ProductOut] = None
     notify_by_email: bool = False
@@ -232,9 +409,98 @@ class PurchaseOrderOut(PurchaseOrderBase):
         from_attributes = True
 
 
+class ReorderLine(BaseModel):
+    product_id: int
+    quantity: int = Field(..., gt=0)
+    # defaults to the product's supplier
+    supplier_id: Optional[int] = None
+
+
+class ConsolidatedReorderRequest(BaseModel):
+    """Group reorder lines into one multi-line purchase order per supplier.
+
+    When lines is omitted the current reorder suggestions are used.
+    """
+    lines: Optional[List[ReorderLine]] = None
+    notes: Optional[str] = None
+    notify_by_email: bool = False
+
+
+class ConsolidatedPlanLine(BaseModel):
+    product_id: int
+    requested_quantity: int
+    quantity: int
+
+
+class ConsolidatedOrderPlan(BaseModel):
+    supplier_id: Optional[int] = None
+    supplier_name: Optional[str] = None
+    min_order_quantity: int
+    pack_size: int
+    total_quantity: int
+    topped_up_to_moq: bool
+    lines: List[ConsolidatedPlanLine]
+
+
+class PurchaseOrderReceive(BaseModel):
+    """Receive (complete) many purchase orders at once."""
+    order_ids: List[int] = Field(..., max_length=MAX_BULK_IDS)
+
+
+class PurchaseOrderReceiveResult(BaseModel):
+    received: List[PurchaseOrderOut]
+    # requested ids that were not pending (not found, already completed or cancelled)
+    skipped: List[int]
+
+
 # Restock Summary
 class RestockSummary(BaseModel):
     pending_orders: int
     low_stock_items: int
     out_of_stock_items: int
     total_pending_value: float
+
+
+class ReorderSuggestion(BaseModel):
+    product_id: int
+    name: str
+    sku: Optional[str] = None
+    supplier_id: Optional[int] = None
+    quantity: int
+    low_stock_threshold: int
+    on_order: int
+    daily_demand: float
+    moving_average: float
+    demand_std: float
+    days_of_cover: Optional[float] = None  # None when there is no recent demand
+    lead_time_days: float
+    safety_stock: float
+    reorder_point: float
+    suggested_quantity: int
+    priority: str  # critical, high, medium, none
+    reason: str
+
+
+class SupplierLeadTimeOut(BaseModel):
+    supplier_id: int
+    order_count: int
+    mean_days: float
+    std_days: float
+    p90_days: Optional[float] = None
+    last_received_at: Optional[datetime.datetime] = None
+
+
+class SupplierScorecardOut(BaseModel):
+    supplier_id: int
+    supplier_name: Optional[str] = None
+    rated_orders: int
+    on_time_delivery_avg: Optional[float] = None
+    on_time_delivery_count: int
+    quality_score_avg: Optional[float] = None
+    quality_score_count: int
+    cost_efficiency_avg: Optional[float] = None
+    cost_efficiency_count: int
+    overall_rating_avg: Optional[float] = None
+    overall_rating_count: int
+    recent_overall_rating: Optional[float] = None
+    trend: Optional[str] = None  # up, down, flat
@@ -0,0 +1,104 @@
+"""Per-supplier scorecards maintained incrementally from purchase-order ratings.
+
+Each SupplierScorecard row keeps running sums and counts for the four rating fields
+on PurchaseOrder plus an exponentially weighted recent overall rating, so averages
+and trend are read without scanning purchase orders. Callers pass the rating values
+before and after a change; the old values are backed out and the new ones added.
+A backed-out rating cannot be taken out of the recent rating, which is reset instead
+once at most one overall rating is left.
+"""
+from typing import Dict, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .crud import dialect_insert
+
+RATING_FIELDS = ('on_time_delivery', 'quality_score', 'cost_efficiency', 'overall_rating')
+# Weight of the newest overall rating in the recent-rating average
+RECENT_ALPHA = 0.5
+# Minimum gap between recent and all-time overall rating to report a trend
+TREND_EPSILON = 0.1
+
+
+def ratings_of(order: models.PurchaseOrder) -> Dict[str, Optional[int]]:
+    return {field: getattr(order, field) for field in RATING_FIELDS}
+
+
+async def _lock(db: AsyncSession, supplier_id: int) -> Optional[models.SupplierScorecard]:
+    stmt = select(models.SupplierScorecard).where(
+        models.SupplierScorecard.supplier_id == supplier_id
+    ).with_for_update()
+    result = await db.execute(stmt)
+    return result.scalars().first()
+
+
+async def _get_or_create(db: AsyncSession, supplier_id: int, user_id: Optional[int]) -> models.SupplierScorecard:
+    """The supplier's scorecard, locked; a concurrent first rating cannot create a second one."""
+    card = await _lock(db, supplier_id)
+    if card is None:
+        stmt = dialect_insert(db, models.SupplierScorecard).values(supplier_id=supplier_id, user_id=user_id)
+        await db.execute(stmt.on_conflict_do_nothing(index_elements=['supplier_id']))
+        card = await _lock(db, supplier_id)
+    return card
+
+
+async def record_rating_change(
+    db: AsyncSession,
+    old_supplier_id: Optional[int],
+    old_ratings: Dict[str, Optional[int]],
+    new_supplier_id: Optional[int],
+    new_ratings: Dict[str, Optional[int]],
+    user_id: Optional[int] = None,
+) -> None:
+    """Move an order's contribution from (old supplier, old ratings) to (new supplier, new ratings).
+
+    Runs inside the caller's transaction. Pass an empty dict for a side that has no ratings
+    (e.g. old_ratings={} for a newly rated order, new_ratings={} for a deleted one).
+    """
+    if old_supplier_id == new_supplier_id and all(old_ratings.get(f) == new_ratings.get(f) for f in RATING_FIELDS):
+        return
+    if old_supplier_id is not None and any(old_ratings.get(f) is not None for f in RATING_FIELDS):
+        card = await _get_or_create(db, old_supplier_id, user_id)
+        for field in RATING_FIELDS:
+            value = old_ratings.get(field)
+            if value is not None:
+                setattr(card, f'{field}_sum', getattr(card, f'{field}_sum') - value)
+                setattr(card, f'{field}_count', getattr(card, f'{field}_count') - 1)
+        if old_ratings.get('overall_rating') is not None and card.overall_rating_count <= 1:
+            # what is left is known exactly: no rating, or the one in the sum
+            card.recent_overall_rating = float(card.overall_rating_sum) if card.overall_rating_count else None
+    if new_supplier_id is not None and any(new_ratings.get(f) is not None for f in RATING_FIELDS):
+        card = await _get_or_create(db, new_supplier_id, user_id)
+        for field in RATING_FIELDS:
+            value = new_ratings.get(field)
+            if value is not None:
+                setattr(card, f'{field}_sum', getattr(card, f'{field}_sum') + value)
+                setattr(card, f'{field}_count', getattr(card, f'{field}_count') + 1)
+        overall = new_ratings.get('overall_rating')
+        if overall is not None and (overall != old_ratings.get('overall_rating') or old_supplier_id != new_supplier_id):
+            if card.recent_overall_rating is None:
+                card.recent_overall_rating = float(overall)
+            else:
+                card.recent_overall_rating = RECENT_ALPHA * overall + (1 - RECENT_ALPHA) * card.recent_overall_rating
+
+
+def to_out(card: models.SupplierScorecard, supplier_name: Optional[str] = None) -> dict:
+    """Serialize a scorecard row with averages, counts and trend."""
+    out = {"supplier_id": card.supplier_id, "supplier_name": supplier_name}
+    for field in RATING_FIELDS:
+        count = getattr(card, f'{field}_count') or 0
+        total = getattr(card, f'{field}_sum') or 0
+        out[f'{field}_count'] = count
+        out[f'{field}_avg'] = round(total / count, 2) if count else None
+    overall_avg = out['overall_rating_avg']
+    recent = card.recent_overall_rating
+    trend = None
+    if overall_avg is not None and recent is not None and out['overall_rating_count'] >= 2:
+        delta = recent - overall_avg
+        trend = 'up' if delta > TREND_EPSILON else 'down' if delta < -TREND_EPSILON else 'flat'
+    out['recent_overall_rating'] = round(recent, 2) if recent is not None else None
+    out['trend'] = trend
+    out['rated_orders'] = max(out[f'{field}_count'] for field in RATING_FIELDS)
+    return out
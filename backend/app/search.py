@@ -0,0 +1,116 @@
+"""Ranked product search over name, SKU and description.
+
+On Postgres the query runs against ix_products_search_trgm, a pg_trgm GIN index over
+the search document (see models.product_search_document) with user_id in the same
+index, so a tenant's matches come from one bitmap index scan:
+
+* a product matches when the query is a case-insensitive substring of the document, or
+  when it is word-similar to part of it (pg_trgm's `%>` operator, threshold
+  pg_trgm.word_similarity_threshold, 0.6 by default) which tolerates typos;
+* results are ranked by an exact SKU hit first, then word_similarity, then name.
+
+Queries shorter than three characters cannot use trigrams and scan the tenant's rows.
+
+Other databases (SQLite in tests) use an in-process trigram index per tenant with the
+same matching and ranking rules, loaded on first search and dropped by crud on every
+product create / update / delete.
+"""
+import re
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from sqlalchemy import case, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+
+# pg_trgm's default word_similarity_threshold
+WORD_SIMILARITY_THRESHOLD = 0.6
+# tenants whose in-process index is kept (non-Postgres fallback only)
+FALLBACK_TENANTS = 32
+
+_WORD = re.compile(r'[^\W_]+')
+
+
+def _trigrams(text: str) -> FrozenSet[str]:
+    """pg_trgm-style trigrams: per lower-cased word, padded with two blanks in front and one behind."""
+    grams = set()
+    for word in _WORD.findall(text.lower()):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+def _word_similarity(query: FrozenSet[str], document: FrozenSet[str]) -> float:
+    # share of the query's trigrams found in the document (pg_trgm's word_similarity,
+    # without its contiguous-extent refinement)
+    if not query:
+        return 0.0
+    return len(query & document) / len(query)
+
+
+# user_id -> {product id: (lower-cased document, sku, trigrams)}
+_tenants: 'OrderedDict[int, Dict[int, Tuple[str, Optional[str], FrozenSet[str]]]]' = OrderedDict()
+
+
+def invalidate(user_id: Optional[int]) -> None:
+    """Drop the tenant's in-process index; it is rebuilt on the next search."""
+    _tenants.pop(user_id, None)
+
+
+async def _tenant_documents(db: AsyncSession, user_id: int):
+    documents = _tenants.get(user_id)
+    if documents is not None:
+        _tenants.move_to_end(user_id)
+        return documents
+    product = models.Product
+    stmt = select(product.id, product.sku, models.product_search_document(product.name, product.sku, product.description)).where(product.user_id == user_id)
+    documents = {
+        product_id: (document.lower(), sku, _trigrams(document))
+        for product_id, sku, document in (await db.execute(stmt)).all()
+    }
+    _tenants[user_id] = documents
+    while len(_tenants) > FALLBACK_TENANTS:
+        _tenants.popitem(last=False)
+    return documents
+
+
+async def _search_in_process(db: AsyncSession, user_id: int, q: str, skip: int, limit: int, load_options) -> List[models.Product]:
+    documents = await _tenant_documents(db, user_id)
+    needle = q.lower()
+    query_grams = _trigrams(q)
+    ranked = []
+    for product_id, (document, sku, grams) in documents.items():
+        score = _word_similarity(query_grams, grams)
+        if needle in document or score >= WORD_SIMILARITY_THRESHOLD:
+            ranked.append((sku is not None and sku.lower() == needle, score, document, product_id))
+    ranked.sort(key=lambda r: (not r[0], -r[1], r[2], r[3]))
+    page = [product_id for *_, product_id in ranked[skip:skip + limit]]
+    if not page:
+        return []
+    stmt = select(models.Product).where(models.Product.id.in_(page)).options(*load_options)
+    found = {p.id: p for p in (await db.execute(stmt)).scalars().all()}
+    return [found[product_id] for product_id in page if product_id in found]
+
+
+async def search_products(db: AsyncSession, user_id: int, q: str, skip: int = 0, limit: int = 20) -> List[models.Product]:
+    """The tenant's products matching `q`, best match first, with supplier and category loaded."""
+    # crud imports this module (for invalidate), so import it lazily
+    from .crud import PRODUCT_LOAD_OPTIONS
+    q = q.strip()
+    if not q:
+        raise ValueError("Search query must not be empty")
+    if db.bind.dialect.name != 'postgresql':
+        return await _search_in_process(db, user_id, q, skip, limit, PRODUCT_LOAD_OPTIONS)
+    product = models.Product
+    document = models.product_search_document(product.name, product.sku, product.description)
+    exact_sku = case((func.lower(product.sku) == q.lower(), 1), else_=0)
+    stmt = (
+        select(product)
+        .where(product.user_id == user_id, or_(document.icontains(q, autoescape=True), document.op('%>')(q)))
+        .order_by(exact_sku.desc(), func.word_similarity(q, document).desc(), product.name, product.id)
+        .options(*PRODUCT_LOAD_OPTIONS)
+        .offset(skip)
+        .limit(limit)
+    )
+    return (await db.execute(stmt)).scalars().all()
@@ -0,0 +1,172 @@
+"""Point-in-time inventory snapshots.
+
+A snapshot copies every product's quantity for a tenant into inventory_snapshots
+(at most one per tenant per day). Stock as of any moment is then the nearest earlier
+snapshot plus the movements recorded between it and that moment, so history queries
+read one day of ledger at most instead of the whole movement table.
+
+A snapshot stores the highest movement id at the time it was taken, and rolling it
+forward reads the movements above that id. Movement timestamps are the start of the
+writing transaction, so a sale that began before the snapshot and committed after it
+would fall on the wrong side of a timestamp; its id cannot. The ledger locks a
+product before inserting its movement and the snapshot reads the watermark with the
+tenant's products share-locked, so every movement at or below the watermark is in
+the copied quantities and every later one is above it.
+
+Take a snapshot for every tenant as a daily job with `python -m app.snapshots`.
+"""
+import asyncio
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import select, func, literal, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, archive
+from .crud import dialect_insert
+from .timeutil import as_utc
+
+
+async def take_snapshot(db: AsyncSession, user_id: int, taken_at: Optional[datetime] = None) -> dict:
+    """Copy the tenant's current quantities into today's snapshot with one INSERT ... SELECT.
+
+    Taking a second snapshot on the same day replaces the first. taken_at defaults to
+    the database clock, the one movement timestamps come from.
+    """
+    # waits for transactions still moving this tenant's stock and holds off new ones until commit
+    await db.execute(select(models.Product.id).where(models.Product.user_id == user_id).with_for_update(read=True))
+    result = await db.execute(select(func.max(models.StockMovement.id)))
+    last_movement_id = result.scalar()
+    if taken_at is None:
+        taken_at = (await db.execute(select(func.now()))).scalar()
+    taken_at = as_utc(taken_at)
+    source = select(
+        models.Product.id,
+        literal(taken_at.date(), models.InventorySnapshot.snapshot_date.type),
+        models.Product.user_id,
+        models.Product.quantity,
+        literal(taken_at, models.InventorySnapshot.taken_at.type),
+        literal(last_movement_id, models.InventorySnapshot.last_movement_id.type),
+    ).where(models.Product.user_id == user_id)
+    stmt = dialect_insert(db, models.InventorySnapshot).from_select(
+        ['product_id', 'snapshot_date', 'user_id', 'quantity', 'taken_at', 'last_movement_id'], source
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['product_id', 'snapshot_date'],
+        set_={
+            'quantity': stmt.excluded.quantity,
+            'taken_at': stmt.excluded.taken_at,
+            'last_movement_id': stmt.excluded.last_movement_id,
+        },
+    )
+    try:
+        result = await db.execute(stmt)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return {"snapshot_date": taken_at.date(), "taken_at": taken_at, "products": result.rowcount}
+
+
+async def _movement_totals(db: AsyncSession, user_id: int, after: Optional[datetime], until: Optional[datetime], product_ids=None, after_id: Optional[int] = None) -> dict:
+    """Net quantity change per product for movements created in (after, until], archived ones included.
+
+    With after_id the lower bound is the movement id instead (`after` still narrows
+    which archive files are read).
+    """
+    stmt = select(
+        models.StockMovement.product_id,
+        func.sum(models.StockMovement.quantity_change),
+    ).where(models.StockMovement.user_id == user_id)
+    if after_id is not None:
+        stmt = stmt.where(models.StockMovement.id > after_id)
+    elif after is not None:
+        stmt = stmt.where(models.StockMovement.created_at > after)
+    if until is not None:
+        stmt = stmt.where(models.StockMovement.created_at <= until)
+    if product_ids is not None:
+        stmt = stmt.where(models.StockMovement.product_id.in_(product_ids))
+    result = await db.execute(stmt.group_by(models.StockMovement.product_id))
+    totals = {product_id: int(total or 0) for product_id, total in result.all()}
+    if archive.reaches_archive(after):
+        archived = await asyncio.to_thread(archive.movement_totals, user_id, after, until, product_ids, after_id)
+        for product_id, total in archived.items():
+            totals[product_id] = totals.get(product_id, 0) + total
+    return totals
+
+
+async def get_stock_as_of(db: AsyncSession, user_id: int, as_of: datetime) -> List[dict]:
+    """Every product's quantity at `as_of`.
+
+    Products in the latest snapshot taken at or before `as_of` are rolled forward
+    through the movements recorded since. Products without such a snapshot (created
+    later, or no snapshot yet) are rolled back from their live quantity instead.
+    Products created after `as_of` are left out.
+    """
+    as_of = as_utc(as_of)
+    stmt = select(models.Product.id, models.Product.name, models.Product.sku, models.Product.quantity).where(
+        models.Product.user_id == user_id,
+        or_(models.Product.created_at.is_(None), models.Product.created_at <= as_of),
+    ).order_by(models.Product.id)
+    result = await db.execute(stmt)
+    products = result.all()
+
+    stmt = select(
+        models.InventorySnapshot.snapshot_date,
+        models.InventorySnapshot.taken_at,
+        models.InventorySnapshot.last_movement_id,
+    ).where(
+        models.InventorySnapshot.user_id == user_id,
+        models.InventorySnapshot.taken_at <= as_of,
+    ).order_by(models.InventorySnapshot.snapshot_date.desc()).limit(1)
+    result = await db.execute(stmt)
+    latest = result.first()
+
+    base = {}
+    forward = {}
+    taken_at = None
+    if latest is not None:
+        snapshot_date, taken_at, last_movement_id = latest
+        stmt = select(models.InventorySnapshot.product_id, models.InventorySnapshot.quantity).where(
+            models.InventorySnapshot.user_id == user_id,
+            models.InventorySnapshot.snapshot_date == snapshot_date,
+        )
+        result = await db.execute(stmt)
+        base = dict(result.all())
+        # snapshots taken before the watermark existed fall back to their timestamp
+        forward = await _movement_totals(db, user_id, taken_at, as_of, after_id=last_movement_id)
+
+    missing = [p[0] for p in products if p[0] not in base]
+    backward = await _movement_totals(db, user_id, as_of, None, product_ids=missing) if missing else {}
+
+    rows = []
+    for product_id, name, sku, live_quantity in products:
+        if product_id in base:
+            quantity = base[product_id] + forward.get(product_id, 0)
+        else:
+            quantity = live_quantity - backward.get(product_id, 0)
+        rows.append({
+            "product_id": product_id,
+            "name": name,
+            "sku": sku,
+            "quantity": quantity,
+            "current_quantity": live_quantity,
+        })
+    return rows
+
+
+async def run_all() -> None:
+    """Snapshot every tenant's stock."""
+    from .database import async_session
+
+    async with async_session() as db:
+        result = await db.execute(select(models.User.id).order_by(models.User.id))
+        user_ids = result.scalars().all()
+    for user_id in user_ids:
+        async with async_session() as db:
+            summary = await take_snapshot(db, user_id)
+        print(f"user {user_id}: snapshot of {summary['products']} products for {summary['snapshot_date']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(run_all())
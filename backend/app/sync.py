@@ -0,0 +1,136 @@
+"""Delta sync of a tenant's products, suppliers and categories.
+
+GET /sync hands out changes as four feeds: products, suppliers, categories and
+deletions (sync_tombstones, written by record_deletions() in the deleting transaction).
+
+Every row of those tables carries sync_seq, its position in the tenant's change
+sequence (sync_counters). A write clears it (the column's onupdate; new rows start
+without one). Right before a transaction that wrote the tenant's products, suppliers or
+categories (versions.touch) or tombstones commits, the tenant's counter is advanced and
+the cleared rows are stamped with the new value. The counter row stays locked until
+the commit, so a tenant's writers stamp and commit one after another: a sequence value
+only becomes visible once every smaller one is, and a cursor past it never misses a
+later commit, however long the writing transaction ran.
+
+Each feed is read in (sync_seq, id) order from the position stored for it in the
+opaque cursor, so a cursor only ever moves forward and a page boundary can fall inside
+the rows stamped by one commit.
+
+A client starts without a cursor (full download, paged), applies each response
+(upsert the rows, drop the tombstoned ids) and calls again with the returned cursor,
+immediately while has_more is true.
+"""
+import base64
+import json
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event, insert, select, update, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models, versions
+
+# feed -> model
+FEEDS = {
+    'products': models.Product,
+    'suppliers': models.Supplier,
+    'categories': models.ProductCategory,
+    'deleted': models.SyncTombstone,
+}
+# version scope -> model whose rows a write to that scope changes
+SCOPE_MODELS = {
+    'products': models.Product,
+    'suppliers': models.Supplier,
+    'categories': models.ProductCategory,
+}
+
+_TOMBSTONED = 'sync_tombstoned'
+
+
+def _next_seq(session: Session, user_id: int) -> int:
+    # crud imports this module (so every write path has the commit hook), so import it lazily
+    from .crud import dialect_insert
+    counter = models.SyncCounter
+    stmt = dialect_insert(session, counter).values(user_id=user_id, seq=1)
+    stmt = stmt.on_conflict_do_update(index_elements=['user_id'], set_={'seq': counter.seq + 1})
+    return session.execute(stmt.returning(counter.seq)).scalar_one()
+
+
+async def record_deletions(db: AsyncSession, entity: str, deleted: List[tuple]) -> None:
+    """Write tombstones for deleted (id, user_id) pairs in the current transaction."""
+    if not deleted:
+        return
+    await db.execute(insert(models.SyncTombstone), [
+        {"user_id": owner, "entity": entity, "entity_id": entity_id} for entity_id, owner in deleted
+    ])
+    db.info.setdefault(_TOMBSTONED, set()).update(owner for _, owner in deleted if owner is not None)
+
+
+@event.listens_for(Session, 'before_commit')
+def _stamp(session):
+    tenants: Dict[int, set] = {}
+    for user_id, scope in versions.touched(session):
+        if scope in SCOPE_MODELS:
+            tenants.setdefault(user_id, set()).add(SCOPE_MODELS[scope])
+    for user_id in session.info.get(_TOMBSTONED, ()):
+        tenants.setdefault(user_id, set()).add(models.SyncTombstone)
+    if not tenants:
+        return
+    # commit flushes pending ORM changes only after this hook
+    session.flush()
+    # counters are locked in tenant order, so writers touching several tenants cannot deadlock
+    for user_id in sorted(tenants):
+        seq = _next_seq(session, user_id)
+        for model in sorted(tenants[user_id], key=lambda m: m.__tablename__):
+            values = {'sync_seq': seq}
+            if model is not models.SyncTombstone:
+                # stamping is not a change of its own
+                values['last_updated'] = model.last_updated
+            session.execute(
+                update(model).where(model.user_id == user_id, model.sync_seq.is_(None)).values(**values)
+                .execution_options(synchronize_session=False)
+            )
+
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def _forget(session):
+    session.info.pop(_TOMBSTONED, None)
+
+
+def encode_cursor(positions: Dict[str, Tuple[int, int]]) -> str:
+    data = {feed: [seq, row_id] for feed, (seq, row_id) in positions.items()}
+    return base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Dict[str, Tuple[int, int]]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(raw)
+        # int() rejects the timestamps of cursors issued before sync_seq; those clients start over
+        return {feed: (int(seq), int(row_id)) for feed, (seq, row_id) in data.items() if feed in FEEDS}
+    except (ValueError, TypeError, AttributeError):
+        raise ValueError("Invalid cursor")
+
+
+async def changes_since(db: AsyncSession, user_id: int, cursor: Optional[str] = None, limit: int = 500) -> dict:
+    """Up to `limit` changed rows per feed after `cursor` (everything when None), and the next cursor."""
+    from .crud import PRODUCT_LOAD_OPTIONS
+    positions = decode_cursor(cursor) if cursor else {}
+    changes = {'has_more': False}
+    for feed, model in FEEDS.items():
+        stmt = select(model).where(model.user_id == user_id, model.sync_seq.is_not(None))
+        if feed in positions:
+            stmt = stmt.where(tuple_(model.sync_seq, model.id) > tuple_(*positions[feed]))
+        if model is models.Product:
+            stmt = stmt.options(*PRODUCT_LOAD_OPTIONS)
+        stmt = stmt.order_by(model.sync_seq, model.id).limit(limit + 1)
+        rows = (await db.execute(stmt)).scalars().all()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            changes['has_more'] = True
+        if rows:
+            positions[feed] = (rows[-1].sync_seq, rows[-1].id)
+        changes[feed] = rows
+    changes['cursor'] = encode_cursor(positions)
+    return changes
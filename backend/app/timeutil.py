@@ -0,0 +1,23 @@
+"""Timezone normalisation shared by modules that compare stored and given timestamps.
+
+Postgres returns timezone-aware values for TIMESTAMP WITH TIME ZONE columns while SQLite
+and callers may pass naive ones; naive values are taken to be UTC.
+"""
+from datetime import datetime, timezone
+from typing import Optional
+
+
+def as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """`value` as an aware UTC datetime (None stays None)."""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def as_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """`value` as a naive UTC datetime (None stays None)."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
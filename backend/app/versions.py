@@ -0,0 +1,123 @@
+"""Per-tenant data versions for conditional GETs (ETag / If-None-Match).
+
+Writes to a tenant's products, suppliers, categories or purchase orders call
+touch(db, user_id, scope). The bump is applied when the session commits and dropped
+on rollback, so a version never runs ahead of the data readers can see.
+
+Read routes depend on conditional(*scopes). It builds a strong ETag from the
+versions of the scopes the response reads (a product embeds its supplier and
+category, so the product list reads all three), the path and the query string. An
+unchanged poll is answered 304 before the route's queries run and before any
+serialization; only the user lookup done for authentication remains.
+
+Version tokens are kept by the cache backend (app/cache.py), which also keys cached
+responses by them. A shared backend applies bumps asynchronously; FlushVersions holds
+every response until the bumps of the request's commits have landed, so a client
+reading right after its own write never gets the pre-write body or a 304.
+
+The default in-process backend only sees writes made in this process. Run a single
+worker (as the container command does) unless CACHE_URL points every worker and batch
+job at a shared Redis: without it, the classification job's changes never reach the
+API's versions, and cached product lists and ETags stay stale until the API restarts.
+"""
+import logging
+from typing import Optional
+
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import cache, models
+from .security import get_current_user
+
+logger = logging.getLogger(__name__)
+
+SCOPES = ('products', 'suppliers', 'categories', 'purchase_orders')
+# read by every response embedding products (ProductOut nests supplier and category)
+PRODUCT_SCOPES = ('products', 'suppliers', 'categories')
+# cached copies must be revalidated, and only by the requesting user's browser
+CACHE_CONTROL = 'private, no-cache'
+
+_PENDING = 'versions_touched'
+
+
+def touch(db: AsyncSession, user_id: Optional[int], *scopes: str) -> None:
+    """Bump the tenant's version of each scope once the session's transaction commits."""
+    if user_id is None:
+        return
+    pending = db.info.setdefault(_PENDING, set())
+    for scope in scopes:
+        if scope not in SCOPES:
+            raise ValueError(f"Unknown version scope: {scope}")
+        pending.add((user_id, scope))
+
+
+def touched(session: Session) -> set:
+    """(user_id, scope) pairs touched in the session's current transaction."""
+    return session.info.get(_PENDING, set())
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply(session):
+    touched = session.info.pop(_PENDING, None)
+    if touched:
+        cache.backend().bump(key for user_id, scope in touched for key in cache.version_keys(user_id, [scope]))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard(session):
+    session.info.pop(_PENDING, None)
+
+
+class FlushVersions:
+    """ASGI middleware: send a response only once pending version bumps have reached the backend."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        async def send_after_bumps(message):
+            if message['type'] == 'http.response.start':
+                await cache.backend().flush()
+            await send(message)
+
+        await self.app(scope, receive, send_after_bumps)
+
+
+async def etag(user_id: int, scopes: tuple, request: Request) -> str:
+    tokens = await cache.current_versions(request, user_id, scopes)
+    return f'"{cache.resource_key(user_id, request, tokens)}"'
+
+
+def _matches(if_none_match: Optional[str], tag: str) -> bool:
+    if not if_none_match:
+        return False
+    # If-None-Match uses the weak comparison: W/ prefixes are ignored
+    candidates = [c.strip() for c in if_none_match.split(',')]
+    return any(c == '*' or c.removeprefix('W/') == tag for c in candidates)
+
+
+def conditional(*scopes: str):
+    """Route dependency: 304 Not Modified when If-None-Match carries the current ETag, else set the ETag."""
+    for scope in scopes:
+        if scope not in SCOPES:
+            raise ValueError(f"Unknown version scope: {scope}")
+
+    async def check(request: Request, response: Response, current_user: models.User = Depends(get_current_user)):
+        try:
+            tag = await etag(current_user.id, scopes, request)
+        except Exception:
+            # without versions there is no safe ETag; serve the full response
+            logger.exception('Cache versions unavailable')
+            return
+        if _matches(request.headers.get('if-none-match'), tag):
+            raise HTTPException(status_code=304, headers={'ETag': tag, 'Cache-Control': CACHE_CONTROL})
+        response.headers['ETag'] = tag
+        response.headers['Cache-Control'] = CACHE_CONTROL
+
+    return check
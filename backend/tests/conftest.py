@@ -0,0 +1,67 @@
+import asyncio
+import itertools
+import os
+
+import pytest
+
+# app.database and app.security read these at import time. Tests bring their own
+# engines, so the app's engine points at a throwaway in-memory database and never
+# at the DATABASE_URL of a real deployment.
+os.environ['DATABASE_URL'] = 'sqlite+aiosqlite://'
+os.environ.setdefault('JWT_SECRET', 'test-secret')
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine  # noqa: E402
+from sqlalchemy.pool import NullPool  # noqa: E402
+
+from app import cache, models  # noqa: E402
+from app.database import Base, get_db  # noqa: E402
+from app.main import app  # noqa: E402
+from app.security import create_access_token  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def engine(tmp_path_factory):
+    # a file database: every connection (one per session, NullPool) sees the same data
+    url = f"sqlite+aiosqlite:///{tmp_path_factory.mktemp('db') / 'app.db'}"
+    engine = create_async_engine(url, poolclass=NullPool)
+
+    async def create():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(create())
+    yield engine
+    asyncio.run(engine.dispose())
+
+
+@pytest.fixture(scope='module')
+def client(engine):
+    session = async_sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
+
+    async def override_get_db():
+        async with session() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    cache.set_backend(cache.InProcessBackend())
+    yield TestClient(app)
+    app.dependency_overrides.pop(get_db, None)
+    cache.set_backend(None)
+
+
+_users = itertools.count()
+
+
+@pytest.fixture
+def headers(engine):
+    """Authorization for a new user of the module's database."""
+    async def create_user():
+        async with async_sessionmaker(bind=engine, expire_on_commit=False)() as db:
+            user = models.User(full_name='Test user', email=f'user-{next(_users)}@example.invalid', password_hash='!', is_verified=True)
+            db.add(user)
+            await db.commit()
+            return user.id
+
+    user_id = asyncio.run(create_user())
+    return {'Authorization': f"Bearer {create_access_token({'sub': str(user_id)})}"}
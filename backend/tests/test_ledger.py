@@ -0,0 +1,86 @@
+"""Stock ledger: guarded decrements and the movements recorded for a batch."""
+import asyncio
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app import ledger, models
+
+
+def _product(client, headers, name, quantity):
+    response = client.post('/products/', json={'name': name, 'sku': name, 'price': 100, 'quantity': quantity}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _apply(engine, movements, user_id, **kwargs):
+    """Apply and commit a batch in a session of its own; returns the recorded rows."""
+    async def apply():
+        async with async_sessionmaker(bind=engine, expire_on_commit=False)() as db:
+            try:
+                rows = await ledger.apply_movements(db, movements, user_id=user_id, **kwargs)
+            except ledger.InsufficientStock:
+                await db.rollback()
+                raise
+            await db.commit()
+            return rows
+
+    return asyncio.run(apply())
+
+
+def _state(engine, product_ids):
+    """(quantity, movement count) per product."""
+    async def read():
+        async with async_sessionmaker(bind=engine)() as db:
+            quantities = dict((await db.execute(
+                select(models.Product.id, models.Product.quantity).where(models.Product.id.in_(product_ids))
+            )).all())
+            counts = dict((await db.execute(
+                select(models.StockMovement.product_id, func.count()).where(
+                    models.StockMovement.product_id.in_(product_ids)
+                ).group_by(models.StockMovement.product_id)
+            )).all())
+            return {product_id: (quantities[product_id], counts.get(product_id, 0)) for product_id in product_ids}
+
+    return asyncio.run(read())
+
+
+def test_insufficient_stock_rejects_the_whole_batch(engine, client, headers):
+    enough = _product(client, headers, 'Enough', 5)
+    short = _product(client, headers, 'Short', 2)
+    product_ids = [enough['id'], short['id']]
+    before = _state(engine, product_ids)
+
+    with pytest.raises(ledger.InsufficientStock) as raised:
+        _apply(engine, [
+            ledger.Movement(product_id=enough['id'], delta=-3, movement_type='sale'),
+            ledger.Movement(product_id=short['id'], delta=-4, movement_type='sale'),
+        ], enough['user_id'], allow_negative=False)
+    assert raised.value.product_ids == [short['id']]
+    assert _state(engine, product_ids) == before
+
+
+def test_allow_negative_lets_stock_go_below_zero(engine, client, headers):
+    product = _product(client, headers, 'Oversold', 2)
+    rows = _apply(engine, [ledger.Movement(product_id=product['id'], delta=-4, movement_type='adjustment')], product['user_id'])
+    assert [(row['quantity_before'], row['quantity_after']) for row in rows] == [(2, -2)]
+    assert _state(engine, [product['id']])[product['id']][0] == -2
+
+
+def test_batch_movements_chain_in_order(engine, client, headers):
+    product = _product(client, headers, 'Chained', 5)
+    rows = _apply(engine, [
+        ledger.Movement(product_id=product['id'], delta=delta, movement_type='adjustment')
+        for delta in (-1, 3, 0, -2)
+    ], product['user_id'], allow_negative=False)
+    # zero deltas are not recorded
+    assert [(row['quantity_before'], row['quantity_after']) for row in rows] == [(5, 4), (4, 7), (7, 5)]
+    assert _state(engine, [product['id']])[product['id']][0] == 5
+
+
+def test_sale_beyond_stock_is_rejected(client, headers):
+    product = _product(client, headers, 'Sold out', 2)
+    response = client.post('/sales/', params={'product_id': product['id']}, json={'quantity': 3}, headers=headers)
+    assert response.status_code == 400
+    assert client.get(f"/products/{product['id']}", headers=headers).json()['quantity'] == 2
@@ -0,0 +1,97 @@
+"""Product stock counts and bulk update / delete."""
+from app import schemas
+
+
+def _product(client, headers, name, quantity=10, supplier_id=None):
+    response = client.post('/products/', json={
+        'name': name, 'sku': name, 'price': 100, 'quantity': quantity, 'supplier_id': supplier_id,
+    }, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _get(client, headers, product):
+    return client.get(f"/products/{product['id']}", headers=headers)
+
+
+def test_stock_counts_set_counted_quantities(client, headers):
+    counted = _product(client, headers, 'Counted', quantity=10)
+    _product(client, headers, 'Unchanged', quantity=5)
+
+    response = client.post('/products/stock-counts', json={'counts': [
+        {'sku': 'Counted', 'counted_quantity': 7},
+        {'sku': 'Unchanged', 'counted_quantity': 5},
+        {'sku': 'Unknown', 'counted_quantity': 1},
+    ]}, headers=headers)
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert result['adjusted'] == 1
+    assert result['unchanged'] == 1
+    assert result['missing'] == ['Unknown']
+    assert result['adjustments'] == [{
+        'sku': 'Counted', 'product_id': counted['id'],
+        'quantity_before': 10, 'quantity_after': 7, 'quantity_change': -3,
+    }]
+    assert _get(client, headers, counted).json()['quantity'] == 7
+    movements = client.get(f"/products/{counted['id']}/stock-movements", headers=headers).json()
+    assert [(m['quantity_change'], m['quantity_after']) for m in movements if m['reference_type'] == 'stock_count'] == [(-3, 7)]
+
+
+def test_bulk_update_changes_only_the_selection(client, headers):
+    first = _product(client, headers, 'Bulk first', quantity=10)
+    second = _product(client, headers, 'Bulk second', quantity=3)
+    other = _product(client, headers, 'Bulk other', quantity=4)
+
+    response = client.post('/products/bulk-update', json={
+        'selection': {'product_ids': [first['id'], second['id']]},
+        'updates': {'price': 250, 'quantity': 6},
+    }, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()['affected'] == 2
+    assert sorted(response.json()['product_ids']) == sorted([first['id'], second['id']])
+
+    for product, change in ((first, -4), (second, 3)):
+        updated = _get(client, headers, product).json()
+        assert (updated['price'], updated['quantity']) == (250, 6)
+        movements = client.get(f"/products/{product['id']}/stock-movements", headers=headers).json()
+        assert [m['quantity_change'] for m in movements if m['reference_type'] == 'bulk_product_edit'] == [change]
+    untouched = _get(client, headers, other).json()
+    assert (untouched['price'], untouched['quantity']) == (100, 4)
+
+
+def test_bulk_update_rejects_sku_changes(client, headers):
+    product = _product(client, headers, 'Bulk sku')
+    response = client.post('/products/bulk-update', json={
+        'selection': {'product_ids': [product['id']]}, 'updates': {'sku': 'Renamed'},
+    }, headers=headers)
+    assert response.status_code == 400
+
+
+def test_bulk_delete_removes_the_selection(client, headers):
+    supplier = client.post('/suppliers/', json={'name': 'Bulk delete supplier'}, headers=headers).json()
+    doomed = [_product(client, headers, f'Doomed {n}', quantity=0, supplier_id=supplier['id']) for n in range(2)]
+    kept = _product(client, headers, 'Kept', quantity=0)
+
+    response = client.post('/products/bulk-delete', json={'supplier_id': supplier['id']}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()['affected'] == 2
+    assert sorted(response.json()['product_ids']) == sorted(product['id'] for product in doomed)
+    for product in doomed:
+        assert _get(client, headers, product).status_code == 404
+    assert _get(client, headers, kept).status_code == 200
+
+
+def test_bulk_operations_need_a_selection(client, headers):
+    assert client.post('/products/bulk-delete', json={}, headers=headers).status_code == 400
+
+
+def test_bulk_id_lists_are_capped(client, headers):
+    too_many = list(range(1, schemas.MAX_BULK_IDS + 2))
+    response = client.post('/products/bulk-delete', json={'product_ids': too_many}, headers=headers)
+    assert response.status_code == 422
+    response = client.post('/products/bulk-update', json={
+        'selection': {'product_ids': too_many}, 'updates': {'price': 1},
+    }, headers=headers)
+    assert response.status_code == 422
+    response = client.post('/restock/orders/receive', json={'order_ids': too_many}, headers=headers)
+    assert response.status_code == 422
@@ -0,0 +1,202 @@
+"""Purchase orders: batch creation, consolidation, restocking exactly once and supplier statistics."""
+
+
+def _product(client, headers, name, quantity=10, supplier_id=None):
+    response = client.post('/products/', json={
+        'name': name, 'sku': name, 'price': 100, 'quantity': quantity, 'supplier_id': supplier_id,
+    }, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _order(client, headers, product, quantity, supplier_id=None):
+    response = client.post('/restock/orders', json={
+        'product_id': product['id'], 'supplier_id': supplier_id, 'quantity_ordered': quantity,
+    }, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _quantity(client, headers, product):
+    return client.get(f"/products/{product['id']}", headers=headers).json()['quantity']
+
+
+def test_completing_twice_restocks_once(client, headers):
+    product = _product(client, headers, 'Completed')
+    order = _order(client, headers, product, 5)
+
+    for _ in range(2):
+        response = client.put(f"/restock/orders/{order['id']}", json={'status': 'completed'}, headers=headers)
+        assert response.status_code == 200, response.text
+    assert _quantity(client, headers, product) == 15
+
+
+def test_completed_order_cannot_be_reopened(client, headers):
+    product = _product(client, headers, 'Reopened')
+    order = _order(client, headers, product, 5)
+    client.put(f"/restock/orders/{order['id']}", json={'status': 'completed'}, headers=headers)
+
+    response = client.put(f"/restock/orders/{order['id']}", json={'status': 'pending'}, headers=headers)
+    assert response.status_code == 400
+    # ratings can still be added to a completed order
+    response = client.put(f"/restock/orders/{order['id']}", json={'overall_rating': 4}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()['status'] == 'completed'
+    assert _quantity(client, headers, product) == 15
+
+
+def test_batch_create_returns_orders_in_request_order(client, headers):
+    products = [_product(client, headers, f'Batch {n}') for n in range(3)]
+    requested = [(products[2], 3), (products[0], 1), (products[1], 2), (products[0], 4)]
+
+    response = client.post('/restock/orders/batch', json={'orders': [
+        {'product_id': product['id'], 'quantity_ordered': quantity} for product, quantity in requested
+    ]}, headers=headers)
+    assert response.status_code == 200, response.text
+    created = response.json()
+    assert [(order['product_id'], order['quantity_ordered']) for order in created] == [
+        (product['id'], quantity) for product, quantity in requested
+    ]
+    assert [order['product']['id'] for order in created] == [product['id'] for product, _ in requested]
+    for order in created:
+        stored = client.get(f"/restock/orders/{order['id']}", headers=headers).json()
+        assert (stored['product_id'], stored['quantity_ordered']) == (order['product_id'], order['quantity_ordered'])
+
+
+def test_batch_with_an_unknown_product_creates_nothing(client, headers):
+    product = _product(client, headers, 'Batch known')
+    response = client.post('/restock/orders/batch', json={'orders': [
+        {'product_id': product['id'], 'quantity_ordered': 1},
+        {'product_id': product['id'] + 10_000, 'quantity_ordered': 1},
+    ]}, headers=headers)
+    assert response.status_code == 404
+    assert client.get('/restock/orders', headers=headers).json() == []
+
+
+def test_receiving_twice_restocks_once(client, headers):
+    product = _product(client, headers, 'Received')
+    orders = [_order(client, headers, product, 5), _order(client, headers, product, 3)]
+    order_ids = [order['id'] for order in orders]
+    unknown = order_ids[-1] + 10_000
+
+    response = client.post('/restock/orders/receive', json={'order_ids': order_ids + [unknown]}, headers=headers)
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert [order['id'] for order in result['received']] == order_ids
+    assert all(order['status'] == 'completed' and order['received_at'] for order in result['received'])
+    assert result['skipped'] == [unknown]
+    assert _quantity(client, headers, product) == 18
+
+    response = client.post('/restock/orders/receive', json={'order_ids': order_ids}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json() == {'received': [], 'skipped': order_ids}
+    assert _quantity(client, headers, product) == 18
+    movements = client.get(f"/products/{product['id']}/stock-movements", headers=headers).json()
+    assert sorted(m['reference_id'] for m in movements if m['movement_type'] == 'restock') == order_ids
+
+
+def test_receive_skips_orders_completed_by_update(client, headers):
+    product = _product(client, headers, 'Completed then received')
+    order = _order(client, headers, product, 5)
+    client.put(f"/restock/orders/{order['id']}", json={'status': 'completed'}, headers=headers)
+
+    response = client.post('/restock/orders/receive', json={'order_ids': [order['id']]}, headers=headers)
+    assert response.json() == {'received': [], 'skipped': [order['id']]}
+    assert _quantity(client, headers, product) == 15
+
+
+def _supplier(client, headers, name, **rules):
+    response = client.post('/suppliers/', json={'name': name, **rules}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_consolidation_pairs_lines_with_their_orders(client, headers):
+    packed = _supplier(client, headers, 'Packs of five', pack_size=5)
+    minimum = _supplier(client, headers, 'Minimum twenty', min_order_quantity=20)
+    first = _product(client, headers, 'Packed first', supplier_id=packed['id'])
+    second = _product(client, headers, 'Packed second', supplier_id=packed['id'])
+    topped_up = _product(client, headers, 'Topped up', supplier_id=minimum['id'])
+
+    response = client.post('/restock/orders/consolidate', json={'lines': [
+        {'product_id': first['id'], 'quantity': 3},
+        {'product_id': topped_up['id'], 'quantity': 4},
+        {'product_id': second['id'], 'quantity': 6},
+    ]}, headers=headers)
+    assert response.status_code == 200, response.text
+    orders = {order['supplier_id']: order for order in response.json()}
+    assert set(orders) == {packed['id'], minimum['id']}
+    expected = {
+        packed['id']: {first['id']: 5, second['id']: 10},
+        minimum['id']: {topped_up['id']: 20},
+    }
+    for supplier_id, lines in expected.items():
+        order = orders[supplier_id]
+        assert order['product_id'] is None
+        assert {line['product_id']: line['quantity_ordered'] for line in order['lines']} == lines
+        assert order['quantity_ordered'] == sum(lines.values())
+        assert all(line['unit_price'] == 100 for line in order['lines'])
+
+    # receiving a consolidated order restocks each of its lines
+    response = client.post('/restock/orders/receive', json={'order_ids': [orders[packed['id']]['id']]}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert _quantity(client, headers, first) == 15
+    assert _quantity(client, headers, second) == 20
+    assert _quantity(client, headers, topped_up) == 10
+
+
+def test_completions_update_supplier_lead_times(client, headers):
+    supplier = _supplier(client, headers, 'Lead times')
+    product = _product(client, headers, 'Lead time product', supplier_id=supplier['id'])
+    updated, received, pending = (_order(client, headers, product, 1, supplier['id']) for _ in range(3))
+    assert client.get('/suppliers/lead-times', headers=headers).json() == []
+
+    client.put(f"/restock/orders/{updated['id']}", json={'status': 'completed'}, headers=headers)
+    client.put(f"/restock/orders/{updated['id']}", json={'status': 'completed'}, headers=headers)
+    client.post('/restock/orders/receive', json={'order_ids': [received['id']]}, headers=headers)
+    client.post('/restock/orders/receive', json={'order_ids': [received['id']]}, headers=headers)
+
+    stats = client.get('/suppliers/lead-times', headers=headers).json()
+    assert len(stats) == 1
+    assert stats[0]['supplier_id'] == supplier['id']
+    # each completed order counts once; the pending one not at all
+    assert stats[0]['order_count'] == 2
+    assert 0 <= stats[0]['mean_days'] < 1
+    assert stats[0]['last_received_at'] is not None
+
+
+def _scorecard(client, headers, supplier):
+    cards = {card['supplier_id']: card for card in client.get('/suppliers/scorecards', headers=headers).json()}
+    return cards.get(supplier['id'])
+
+
+def test_ratings_update_supplier_scorecards(client, headers):
+    supplier = _supplier(client, headers, 'Rated')
+    other = _supplier(client, headers, 'Rated other')
+    product = _product(client, headers, 'Rated product', supplier_id=supplier['id'])
+    first, second = (_order(client, headers, product, 1, supplier['id']) for _ in range(2))
+    for order, rating in ((first, 4), (second, 2)):
+        response = client.put(f"/restock/orders/{order['id']}", json={
+            'status': 'completed', 'overall_rating': rating, 'quality_score': 5,
+        }, headers=headers)
+        assert response.status_code == 200, response.text
+
+    card = _scorecard(client, headers, supplier)
+    assert (card['rated_orders'], card['overall_rating_count'], card['overall_rating_avg']) == (2, 2, 3)
+    assert (card['quality_score_count'], card['quality_score_avg']) == (2, 5)
+
+    # re-rating replaces the order's earlier rating
+    client.put(f"/restock/orders/{second['id']}", json={'overall_rating': 5}, headers=headers)
+    card = _scorecard(client, headers, supplier)
+    assert (card['overall_rating_count'], card['overall_rating_avg']) == (2, 4.5)
+
+    # moving an order to another supplier moves its ratings with it
+    client.put(f"/restock/orders/{second['id']}", json={'supplier_id': other['id']}, headers=headers)
+    card = _scorecard(client, headers, supplier)
+    assert (card['overall_rating_count'], card['overall_rating_avg']) == (1, 4)
+    assert _scorecard(client, headers, other)['overall_rating_avg'] == 5
+
+    # deleting an order backs its ratings out
+    client.delete(f"/restock/orders/{first['id']}", headers=headers)
+    card = _scorecard(client, headers, supplier)
+    assert (card['rated_orders'], card['overall_rating_count'], card['overall_rating_avg']) == (0, 0, None)
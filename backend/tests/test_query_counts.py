@@ -0,0 +1,98 @@
+"""Round trips per request on the product and purchase-order endpoints.
+
+Products are serialized with their supplier and category, loaded through
+crud.PRODUCT_LOAD_OPTIONS joins; writes return server defaults through RETURNING and
+reuse related objects from the session instead of re-selecting. These tests count
+the statements each request sends (authentication included) so a lazy load or a
+post-write refresh shows up as a failure.
+"""
+import pytest
+from sqlalchemy import event
+
+# Highest number of statements a single write request may send
+MAX_WRITE_QUERIES = 9
+# Completing an order also moves stock, folds the lead time into the supplier's
+# statistics and stamps the delta-sync sequence
+MAX_COMPLETION_QUERIES = 10
+
+
+@pytest.fixture
+def queries(engine):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, 'before_cursor_execute', record)
+    yield statements
+    event.remove(engine.sync_engine, 'before_cursor_execute', record)
+
+
+def _count(queries, send):
+    queries.clear()
+    response = send()
+    assert response.status_code == 200, response.text
+    return len(queries), response.json()
+
+
+def _add_products(client, headers, start, count):
+    for i in range(start, start + count):
+        supplier = client.post('/suppliers/', json={'name': f'Supplier {i}'}, headers=headers).json()
+        category = client.post('/categories/', json={'name': f'Category {i}'}, headers=headers).json()
+        response = client.post('/products/', json={
+            'name': f'Product {i}', 'sku': f'SKU-{i}', 'price': 100, 'quantity': 10,
+            'supplier_id': supplier['id'], 'category_id': category['id'],
+        }, headers=headers)
+        assert response.status_code == 200, response.text
+
+
+def test_product_list_queries_do_not_grow_with_products(client, headers, queries):
+    _add_products(client, headers, 0, 1)
+    few, body = _count(queries, lambda: client.get('/products/', headers=headers))
+    assert len(body) == 1
+
+    _add_products(client, headers, 1, 24)
+    many, body = _count(queries, lambda: client.get('/products/', headers=headers))
+    assert len(body) == 25
+    assert all(p['supplier'] is not None and p['category'] is not None for p in body)
+    assert many == few
+
+
+def test_product_detail_queries(client, headers, queries):
+    _add_products(client, headers, 100, 2)
+    products = client.get('/products/', headers=headers).json()
+    counts = []
+    for product in products:
+        count, body = _count(queries, lambda: client.get(f"/products/{product['id']}", headers=headers))
+        assert body['supplier']['id'] == product['supplier_id']
+        assert body['category']['id'] == product['category_id']
+        counts.append(count)
+    # authentication plus one joined SELECT
+    assert counts == [2, 2]
+
+
+def test_write_endpoints_stay_single_digit(client, headers, queries):
+    count, supplier = _count(queries, lambda: client.post('/suppliers/', json={'name': 'Writer'}, headers=headers))
+    assert count <= MAX_WRITE_QUERIES
+    count, category = _count(queries, lambda: client.post('/categories/', json={'name': 'Writer'}, headers=headers))
+    assert count <= MAX_WRITE_QUERIES
+
+    count, product = _count(queries, lambda: client.post('/products/', json={
+        'name': 'Written', 'sku': 'WRITTEN', 'price': 100, 'quantity': 5,
+        'supplier_id': supplier['id'], 'category_id': category['id'],
+    }, headers=headers))
+    assert count <= MAX_WRITE_QUERIES
+    assert product['supplier']['name'] == 'Writer'
+
+    count, product = _count(queries, lambda: client.put(f"/products/{product['id']}", json={'quantity': 9, 'price': 5}, headers=headers))
+    assert count <= MAX_WRITE_QUERIES
+    assert (product['quantity'], product['price']) == (9, 5)
+
+    count, order = _count(queries, lambda: client.post('/restock/orders', json={
+        'product_id': product['id'], 'supplier_id': supplier['id'], 'quantity_ordered': 3,
+    }, headers=headers))
+    assert count <= MAX_WRITE_QUERIES
+
+    count, order = _count(queries, lambda: client.put(f"/restock/orders/{order['id']}", json={'status': 'completed'}, headers=headers))
+    assert count <= MAX_COMPLETION_QUERIES
+    assert order['product']['quantity'] == 12
@@ -0,0 +1,388 @@
+"""EXPLAIN-plan regression tests for the hot read paths (Postgres only).
+
+Each check calls the real router / crud function for a sample tenant and product,
+records the SQL it sends, and EXPLAINs (FORMAT JSON) every recorded statement that
+reads one of the check's tables. A check fails when one of those plans
+
+- contains a forbidden node type (by default a Seq Scan) on a checked table;
+- never reads a checked table through the expected index (on partitioned tables the
+  per-partition indexes are named after the parent index, e.g.
+  ix_product_sales_user_date_y2025m10);
+- reads more partitions of a checked table than the check allows (partition pruning);
+- has an estimated total cost above the check's max_cost;
+- never reads a checked table through an Index Cond matching the check's
+  index_conditions pattern (e.g. a keyset cursor that must bound the index range
+  rather than be filtered row by row).
+
+Plans depend on the data, so the tests run against a disposable Postgres database
+named by PLAN_CHECK_DATABASE_URL (postgresql+asyncpg://...) and are skipped when it is
+unset. They create the schema and seed synthetic tenants once (their ledger is not
+consistent); a database holding any other users is refused.
+
+    PLAN_CHECK_DATABASE_URL=postgresql+asyncpg://localhost/plan_check pytest tests/test_query_plans.py
+
+The default max_cost values are sized for the seed volumes; PLAN_CHECK_THRESHOLDS
+names a JSON file mapping check names to {"max_cost": ...} overrides. With
+PLAN_CHECK_STRUCTURAL=1 the checks run with sequential scans disabled and without
+cost limits, which proves that a usable index exists for each query on any amount of
+data. The sample tenant is the one with the most products.
+"""
+import asyncio
+import json
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+
+import pytest
+from sqlalchemy import event, select, func, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app import models, crud, forecasting, partitions, search, snapshots
+from app.database import Base
+from app.routers import products as products_router, product_sales as sales_router, restock as restock_router
+
+PLAN_CHECK_DATABASE_URL = os.getenv('PLAN_CHECK_DATABASE_URL')
+PLAN_CHECK_THRESHOLDS = os.getenv('PLAN_CHECK_THRESHOLDS')
+STRUCTURAL = os.getenv('PLAN_CHECK_STRUCTURAL', '').lower() in ('1', 'true', 'yes')
+
+pytestmark = pytest.mark.skipif(
+    not PLAN_CHECK_DATABASE_URL, reason="set PLAN_CHECK_DATABASE_URL to a disposable Postgres database"
+)
+
+# Synthetic data added by seed()
+SEED_TENANTS = 20
+SEED_PRODUCTS = 1000  # per tenant
+SEED_SALES = 50  # per product, spread over SEED_MONTHS
+SEED_ORDERS = 300  # per tenant
+SEED_MONTHS = 24
+SEED_EMAIL = 'plan-check-{}@example.invalid'
+
+# A range query over the last few weeks (at most three calendar months) reads those
+# months, the months created ahead of time and the DEFAULT partition
+RECENT_PARTITIONS = 3 + partitions.MONTHS_AHEAD + 1
+
+
+class PlanCheck(NamedTuple):
+    name: str
+    # (db, user, product) -> awaitable running the code path under test
+    call: Callable
+    # table -> index its reads must use (None: any plan without forbidden nodes)
+    indexes: Dict[str, Optional[str]]
+    # highest acceptable estimated total cost of any statement
+    max_cost: float
+    # most partitions of a checked table one statement may read (None: no limit)
+    max_partitions: Optional[int] = None
+    forbidden_nodes: Sequence[str] = ('Seq Scan',)
+    # table -> regex some scan of it must match in its Index Cond
+    index_conditions: Dict[str, str] = {}
+
+
+def _days_ago(days: int) -> datetime:
+    return datetime.now(timezone.utc) - timedelta(days=days)
+
+
+async def _dead_stock_next_page(db: AsyncSession, user: models.User, product: models.Product) -> dict:
+    first = await crud.get_slow_moving_products(db, user.id, limit=20)
+    if first['next_cursor'] is None:
+        raise RuntimeError("The sample tenant has a single page of dead stock")
+    return await crud.get_slow_moving_products(db, user.id, cursor=first['next_cursor'], limit=20)
+
+
+CHECKS = [
+    PlanCheck(
+        'product list',
+        lambda db, user, product: crud.get_products(db, skip=0, limit=100, user_id=user.id),
+        {'products': 'ix_products_user_id'},
+        max_cost=2000,
+    ),
+    PlanCheck(
+        'SKU lookup',
+        lambda db, user, product: crud.lookup_products(db, [product.sku], [], user_id=user.id),
+        {'products': 'unique_sku_per_user'},
+        max_cost=100,
+    ),
+    PlanCheck(
+        'product by SKU',
+        lambda db, user, product: crud.get_product_by_sku(db, product.sku, user.id),
+        {'products': 'unique_sku_per_user'},
+        max_cost=100,
+    ),
+    PlanCheck(
+        'product search',
+        lambda db, user, product: search.search_products(db, user.id, product.sku),
+        {'products': 'ix_products_search_trgm'},
+        max_cost=2000,
+    ),
+    PlanCheck(
+        'dead-stock report',
+        lambda db, user, product: crud.get_slow_moving_products(db, user.id),
+        {'products': 'ix_products_user_stock_value'},
+        max_cost=2000,
+    ),
+    PlanCheck(
+        'dead-stock report, later page',
+        _dead_stock_next_page,
+        {'products': 'ix_products_user_stock_value'},
+        max_cost=2000,
+        index_conditions={'products': r'ROW\('},
+    ),
+    PlanCheck(
+        'restock summary',
+        lambda db, user, product: restock_router.restock_summary(db, user),
+        {'products': 'ix_products_user_low_stock', 'purchase_orders': 'ix_purchase_orders_user_status_date'},
+        max_cost=2000,
+    ),
+    PlanCheck(
+        'purchase orders by status',
+        lambda db, user, product: restock_router.get_purchase_orders(status='pending', skip=0, limit=100, db=db, current_user=user),
+        {'purchase_orders': 'ix_purchase_orders_user_status_date'},
+        max_cost=2000,
+    ),
+    PlanCheck(
+        'product sales history',
+        lambda db, user, product: products_router.get_product_sales(product.id, db=db, current_user=user),
+        {'product_sales': 'ix_product_sales_product_user_date'},
+        max_cost=1000,
+    ),
+    PlanCheck(
+        'recent sales',
+        lambda db, user, product: sales_router.list_sales(since=_days_ago(30), until=None, db=db, current_user=user),
+        {'product_sales': 'ix_product_sales_user_date'},
+        max_cost=20000,
+        max_partitions=RECENT_PARTITIONS,
+    ),
+    PlanCheck(
+        'stock movement history',
+        lambda db, user, product: products_router.get_product_stock_movements(product.id, since=None, limit=50, db=db, current_user=user),
+        {'stock_movements': 'ix_stock_movements_product_user_created'},
+        max_cost=1000,
+    ),
+    PlanCheck(
+        'stock as of yesterday',
+        lambda db, user, product: snapshots.get_stock_as_of(db, user.id, _days_ago(1)),
+        {'stock_movements': 'ix_stock_movements_user_created'},
+        max_cost=20000,
+        max_partitions=RECENT_PARTITIONS,
+    ),
+    PlanCheck(
+        'reorder suggestions',
+        lambda db, user, product: forecasting.build_suggestions(db, user.id),
+        {'product_sales': 'ix_product_sales_user_date'},
+        max_cost=50000,
+        max_partitions=RECENT_PARTITIONS,
+    ),
+]
+
+
+def seed(
+    conn: Connection,
+    tenants: int = SEED_TENANTS,
+    products: int = SEED_PRODUCTS,
+    sales: int = SEED_SALES,
+    orders: int = SEED_ORDERS,
+    months: int = SEED_MONTHS,
+) -> int:
+    """Add synthetic tenants with products, sales, movements and orders; returns the number added.
+
+    Does nothing when the seed tenants already exist. Sales and movements are inserted
+    in date order, as they would accumulate, so the BRIN indexes are representative.
+    """
+    exists = conn.execute(text("SELECT 1 FROM users WHERE email = :email"), {"email": SEED_EMAIL.format(1)}).first()
+    if exists is not None:
+        return 0
+    partitions.ensure_partitions(conn, start=partitions.add_months(partitions.month_start(datetime.now().date()), -months))
+    seeded = "u.email LIKE 'plan-check-%@example.invalid'"
+    conn.execute(text(
+        "INSERT INTO users (full_name, email, password_hash, is_verified) "
+        "SELECT 'Plan check ' || t, replace(:email, '{}', t::text), '!', true FROM generate_series(1, :tenants) t"
+    ), {"email": SEED_EMAIL, "tenants": tenants})
+    conn.execute(text(
+        "INSERT INTO suppliers (name, user_id) "
+        f"SELECT 'Supplier ' || s, u.id FROM users u CROSS JOIN generate_series(1, 10) s WHERE {seeded}"
+    ))
+    # roughly one product in eight at or below its low-stock threshold, a few out of stock
+    conn.execute(text(
+        "INSERT INTO products (name, sku, price, quantity, low_stock_threshold, supplier_id, user_id, last_sold_at) "
+        "SELECT 'Product ' || g, 'SKU-' || lpad(g::text, 6, '0'), 100 + (g * 37) % 5000, (g * 13) % 160, 10 + g % 10, "
+        "(SELECT s.id FROM suppliers s WHERE s.user_id = u.id ORDER BY s.id OFFSET g % 10 LIMIT 1), u.id, "
+        "now() - (g % 400) * interval '1 day' "
+        f"FROM users u CROSS JOIN generate_series(1, :products) g WHERE {seeded}"
+    ), {"products": products})
+    product_rows = (
+        f"FROM products p JOIN users u ON u.id = p.user_id CROSS JOIN generate_series(1, :sales) s WHERE {seeded}"
+    )
+    spread = "now() - ((s * 7919 + p.id * 104729) % (:hours)) * interval '1 hour'"
+    params = {"sales": sales, "hours": months * 30 * 24}
+    conn.execute(text(
+        "INSERT INTO product_sales (product_id, user_id, quantity, sale_price, sale_date) "
+        f"SELECT p.id, p.user_id, 1 + s % 5, p.price / 100.0, {spread} AS at {product_rows} ORDER BY at"
+    ), params)
+    conn.execute(text(
+        "INSERT INTO stock_movements (product_id, user_id, movement_type, quantity_change, quantity_before, "
+        "quantity_after, reference_type, transaction_date, created_at) "
+        f"SELECT p.id, p.user_id, 'sale', -(1 + s % 5), 1000, 999 - s % 5, 'sale', {spread} AS at, {spread} "
+        f"{product_rows} ORDER BY at"
+    ), params)
+    conn.execute(text(
+        "INSERT INTO purchase_orders (user_id, supplier_id, product_id, quantity_ordered, status, order_date, notify_by_email) "
+        "SELECT u.id, p.supplier_id, p.id, 50, "
+        "CASE WHEN o % 20 = 0 THEN 'cancelled' WHEN o % 7 = 0 THEN 'pending' ELSE 'completed' END, "
+        "now() - o * interval '1 day', false "
+        "FROM users u CROSS JOIN generate_series(1, :orders) o "
+        "JOIN LATERAL (SELECT id, supplier_id FROM products WHERE user_id = u.id ORDER BY id OFFSET o % 500 LIMIT 1) p ON true "
+        f"WHERE {seeded}"
+    ), {"orders": orders})
+    for table in ('users', 'suppliers', 'products', 'product_sales', 'stock_movements', 'purchase_orders'):
+        conn.execute(text(f"ANALYZE {table}"))
+    return tenants
+
+
+def _reads(statement: str, table: str) -> bool:
+    return statement.lstrip().upper().startswith('SELECT') and re.search(rf'\b(FROM|JOIN)\s+{table}\b', statement) is not None
+
+
+def _plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from _plan_nodes(child)
+
+
+def _scans_of(plan: dict, table: str) -> List[dict]:
+    """Plan nodes reading `table` (or one of its partitions)."""
+    return [
+        node for node in _plan_nodes(plan)
+        if node.get('Relation Name') == table or (node.get('Relation Name') or '').startswith(f"{table}_")
+    ]
+
+
+def _uses_index(node: dict, index: str) -> bool:
+    name = node.get('Index Name') or ''
+    return name == index or name.startswith(f"{index}_")
+
+
+def _evaluate(check: PlanCheck, table: str, statement: str, plan: dict, structural: bool) -> List[str]:
+    """Problems with one statement's plan."""
+    problems = []
+    scans = _scans_of(plan, table)
+    forbidden = sorted({node['Node Type'] for node in scans if node['Node Type'] in check.forbidden_nodes})
+    if forbidden:
+        problems.append(f"{', '.join(forbidden)} on {table}")
+    read = {node['Relation Name'] for node in scans}
+    if check.max_partitions is not None and len(read) > check.max_partitions:
+        problems.append(f"reads {len(read)} partitions of {table} (at most {check.max_partitions})")
+    if not structural and plan['Total Cost'] > check.max_cost:
+        problems.append(f"estimated cost {plan['Total Cost']:.0f} exceeds {check.max_cost:.0f}")
+    return [f"{check.name}: {problem}\n    {' '.join(statement.split())}" for problem in problems]
+
+
+async def _sample(db: AsyncSession):
+    stmt = select(models.Product.user_id).where(models.Product.sku.is_not(None)).group_by(
+        models.Product.user_id
+    ).order_by(func.count().desc()).limit(1)
+    user_id = (await db.execute(stmt)).scalar()
+    if user_id is None:
+        raise RuntimeError("No products with a SKU found")
+    user = await db.get(models.User, user_id)
+    stmt = select(models.Product).where(
+        models.Product.user_id == user_id, models.Product.sku.is_not(None)
+    ).order_by(models.Product.id).limit(1)
+    product = (await db.execute(stmt)).scalars().first()
+    return user, product
+
+
+def load_thresholds(path: str, checks: Sequence[PlanCheck] = CHECKS) -> List[PlanCheck]:
+    """Checks with max_cost / max_partitions overridden from a JSON file keyed by check name."""
+    with open(path) as f:
+        overrides = json.load(f)
+    unknown = set(overrides) - {check.name for check in checks}
+    if unknown:
+        raise ValueError(f"Unknown checks in {path}: {', '.join(sorted(unknown))}")
+    return [check._replace(**overrides.get(check.name, {})) for check in checks]
+
+
+def _foreign_users(conn: Connection) -> int:
+    return conn.execute(text(
+        "SELECT count(*) FROM users WHERE email NOT LIKE 'plan-check-%@example.invalid'"
+    )).scalar()
+
+
+async def _prepare() -> Optional[str]:
+    """Create the schema and seed it; returns why the database must not be used, if it must not."""
+    engine = create_async_engine(PLAN_CHECK_DATABASE_URL)
+    try:
+        if engine.dialect.name != 'postgresql':
+            return "PLAN_CHECK_DATABASE_URL must point at Postgres"
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(partitions.ensure_partitions)
+            if await conn.run_sync(_foreign_users):
+                return "PLAN_CHECK_DATABASE_URL holds real users; point it at a disposable database"
+            await conn.run_sync(seed)
+        return None
+    finally:
+        await engine.dispose()
+
+
+@pytest.fixture(scope='module')
+def plan_database():
+    refused = asyncio.run(_prepare())
+    if refused:
+        pytest.skip(refused)
+    return PLAN_CHECK_DATABASE_URL
+
+
+async def _run_check(url: str, check: PlanCheck, structural: bool) -> List[str]:
+    """Run one check and return a description of each failure (empty when it passes)."""
+    engine = create_async_engine(url)
+    recorded = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        recorded.append((statement, parameters))
+
+    failures = []
+    try:
+        async with async_sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)() as db:
+            user, product = await _sample(db)
+            event.listen(engine.sync_engine, 'before_cursor_execute', record)
+            try:
+                await check.call(db, user, product)
+            finally:
+                event.remove(engine.sync_engine, 'before_cursor_execute', record)
+            await db.rollback()
+
+        async with engine.connect() as conn:
+            if structural:
+                await conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+            for table, index in check.indexes.items():
+                statements = [(s, p) for s, p in recorded if _reads(s, table)]
+                if not statements:
+                    failures.append(f"{check.name}: no query read {table}")
+                    continue
+                indexed = index is None
+                condition = check.index_conditions.get(table)
+                bounded = condition is None
+                for statement, parameters in statements:
+                    result = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+                    raw = result.scalar()
+                    plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]['Plan']
+                    indexed = indexed or any(_uses_index(node, index) for node in _scans_of(plan, table))
+                    bounded = bounded or any(
+                        re.search(condition, node.get('Index Cond') or '') for node in _scans_of(plan, table)
+                    )
+                    failures.extend(_evaluate(check, table, statement, plan, structural))
+                if not indexed:
+                    failures.append(f"{check.name}: no query read {table} through {index}")
+                if not bounded:
+                    failures.append(f"{check.name}: no Index Cond on {table} matches {condition}")
+            await conn.rollback()
+    finally:
+        await engine.dispose()
+    return failures
+
+
+@pytest.mark.parametrize('check', load_thresholds(PLAN_CHECK_THRESHOLDS) if PLAN_CHECK_THRESHOLDS else CHECKS, ids=lambda check: check.name)
+def test_query_plan(plan_database, check):
+    failures = asyncio.run(_run_check(plan_database, check, STRUCTURAL))
+    assert not failures, '\n'.join(failures)
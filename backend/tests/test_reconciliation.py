@@ -0,0 +1,56 @@
+"""Stock-ledger reconciliation against product quantities."""
+import asyncio
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app import models, reconciliation
+
+
+def _reconcile(engine, user_id, fix=False):
+    async def run():
+        async with async_sessionmaker(bind=engine, expire_on_commit=False)() as db:
+            # the test's movements are only moments old
+            return await reconciliation.reconcile(db, user_id, fix=fix, settle_seconds=0)
+
+    return asyncio.run(run())
+
+
+def _set_quantity(engine, product_id, quantity):
+    """Change a quantity behind the ledger's back."""
+    async def run():
+        async with async_sessionmaker(bind=engine)() as db:
+            await db.execute(update(models.Product).where(models.Product.id == product_id).values(quantity=quantity))
+            await db.commit()
+
+    asyncio.run(run())
+
+
+def test_drift_is_reported_and_fixed(engine, client, headers):
+    response = client.post('/products/', json={'name': 'Reconciled', 'sku': 'Reconciled', 'price': 100, 'quantity': 5}, headers=headers)
+    assert response.status_code == 200, response.text
+    product = response.json()
+    user_id = product['user_id']
+    response = client.post('/sales/', params={'product_id': product['id']}, json={'quantity': 2}, headers=headers)
+    assert response.status_code == 200, response.text
+
+    report = _reconcile(engine, user_id)
+    assert report['checked_movements'] >= 1
+    assert (report['chain_breaks'], report['drift']) == ([], [])
+
+    _set_quantity(engine, product['id'], 10)
+    report = _reconcile(engine, user_id)
+    # nothing new in the ledger, but the quantity no longer matches it
+    assert report['checked_movements'] == 0
+    assert [(d['product_id'], d['quantity'], d['ledger_quantity'], d['difference'], d['fixed']) for d in report['drift']] == [
+        (product['id'], 10, 3, 7, False),
+    ]
+
+    report = _reconcile(engine, user_id, fix=True)
+    assert [d['fixed'] for d in report['drift']] == [True]
+    movements = client.get(f"/products/{product['id']}/stock-movements", headers=headers).json()
+    assert [(m['quantity_before'], m['quantity_after']) for m in movements if m['reference_type'] == 'reconciliation'] == [(3, 10)]
+
+    report = _reconcile(engine, user_id)
+    assert report['checked_movements'] == 1
+    assert (report['chain_breaks'], report['drift']) == ([], [])
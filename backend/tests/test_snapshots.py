@@ -0,0 +1,14 @@
+"""Stock as of a past time."""
+
+
+def test_products_created_later_are_left_out(client, headers):
+    response = client.post('/products/', json={'name': 'New', 'sku': 'NEW', 'price': 100, 'quantity': 7}, headers=headers)
+    assert response.status_code == 200, response.text
+    product_id = response.json()['id']
+
+    before = client.get('/products/stock-as-of', params={'at': '2000-01-01T00:00:00Z'}, headers=headers)
+    assert before.status_code == 200, before.text
+    assert before.json() == []
+
+    after = client.get('/products/stock-as-of', params={'at': '2100-01-01T00:00:00Z'}, headers=headers)
+    assert [(row['product_id'], row['quantity']) for row in after.json()] == [(product_id, 7)]
@@ -0,0 +1,75 @@
+"""Delta sync: paging, tombstones and cursors that only move forward."""
+from app import sync
+
+
+def _product(client, headers, name, quantity=0):
+    response = client.post('/products/', json={'name': name, 'sku': name, 'price': 100, 'quantity': quantity}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _changes(client, headers, since=None, limit=500):
+    params = {'limit': limit}
+    if since is not None:
+        params['since'] = since
+    response = client.get('/sync/', params=params, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _assert_not_behind(cursor, previous):
+    positions, earlier = sync.decode_cursor(cursor), sync.decode_cursor(previous)
+    for feed, position in earlier.items():
+        assert positions[feed] >= position
+
+
+def test_pages_cover_every_row_once(client, headers):
+    created = {_product(client, headers, f'Paged {n}')['id'] for n in range(5)}
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        changes = _changes(client, headers, cursor, limit=2)
+        assert len(changes['products']) <= 2
+        seen += [product['id'] for product in changes['products']]
+        if cursor is not None:
+            _assert_not_behind(changes['cursor'], cursor)
+        cursor, pages = changes['cursor'], pages + 1
+        if not changes['has_more']:
+            break
+    assert sorted(seen) == sorted(created)
+    assert pages == 3
+
+    # nothing changed: an empty page and the same positions
+    changes = _changes(client, headers, cursor)
+    assert (changes['products'], changes['deleted'], changes['has_more']) == ([], [], False)
+    assert sync.decode_cursor(changes['cursor']) == sync.decode_cursor(cursor)
+
+
+def test_changes_and_deletions_after_the_cursor(client, headers):
+    edited = _product(client, headers, 'Edited')
+    deleted = _product(client, headers, 'Deleted')
+    bulk_deleted = _product(client, headers, 'Bulk deleted')
+    supplier = client.post('/suppliers/', json={'name': 'Deleted supplier'}, headers=headers).json()
+    cursor = _changes(client, headers)['cursor']
+
+    assert client.put(f"/products/{edited['id']}", json={'price': 150}, headers=headers).status_code == 200
+    assert client.delete(f"/products/{deleted['id']}", headers=headers).status_code == 200
+    response = client.post('/products/bulk-delete', json={'product_ids': [bulk_deleted['id']]}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert client.delete(f"/suppliers/{supplier['id']}", headers=headers).status_code == 200
+
+    changes = _changes(client, headers, cursor)
+    assert [(product['id'], product['price']) for product in changes['products']] == [(edited['id'], 150)]
+    assert changes['suppliers'] == []
+    assert sorted((row['entity'], row['entity_id']) for row in changes['deleted']) == sorted([
+        ('product', deleted['id']), ('product', bulk_deleted['id']), ('supplier', supplier['id']),
+    ])
+    _assert_not_behind(changes['cursor'], cursor)
+
+    changes = _changes(client, headers, changes['cursor'])
+    assert (changes['products'], changes['deleted']) == ([], [])
+
+
+def test_invalid_cursor_is_rejected(client, headers):
+    response = client.get('/sync/', params={'since': 'not a cursor'}, headers=headers)
+    assert response.status_code == 400
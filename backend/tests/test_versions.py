@@ -0,0 +1,59 @@
+"""Read-your-writes through the shared cache backend.
+
+RedisBackend applies version bumps in tasks started by the commit hook. The client
+below stands in for redis.asyncio with a delay on every write, so a response sent
+before its bumps land would let the following read hit the pre-write cache entry.
+"""
+import asyncio
+
+import pytest
+
+from app import cache
+
+
+class SlowRedis:
+    """The subset of redis.asyncio.Redis RedisBackend uses, with slow writes."""
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.data = {}
+
+    async def get(self, name):
+        return self.data.get(name)
+
+    async def mget(self, names):
+        return [self.data.get(name) for name in names]
+
+    async def set(self, name, value, px=None, nx=False):
+        await asyncio.sleep(self.delay)
+        if nx and name in self.data:
+            return None
+        self.data[name] = value.encode() if isinstance(value, str) else value
+        return True
+
+
+@pytest.fixture
+def shared_backend(client):
+    cache.set_backend(cache.RedisBackend(SlowRedis()))
+    yield
+    cache.set_backend(cache.InProcessBackend())
+
+
+def test_read_after_write_sees_the_write(client, headers, shared_backend):
+    first = client.get('/suppliers/', headers=headers)
+    assert first.status_code == 200
+    assert first.json() == []
+
+    created = client.post('/suppliers/', json={'name': 'Fresh'}, headers=headers)
+    assert created.status_code == 200, created.text
+
+    revalidated = client.get('/suppliers/', headers={**headers, 'If-None-Match': first.headers['ETag']})
+    assert revalidated.status_code == 200
+    assert [s['name'] for s in revalidated.json()] == ['Fresh']
+
+
+def test_in_process_backend_refuses_several_workers(monkeypatch):
+    monkeypatch.setattr(cache, 'CACHE_URL', None)
+    monkeypatch.setenv('WEB_CONCURRENCY', '4')
+    with pytest.raises(RuntimeError):
+        cache._default_backend()